@@ -1,16 +1,38 @@
 import os
+import json
+import hmac
+import signal
+import asyncio
 import logging
 import html
 import threading
 import http.server
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
+from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, TypeHandler, filters
 from dotenv import load_dotenv
 from database.db_manager import db
 from utils.keyboards import main_menu_keyboard
+from utils.http_server import HTTPServer, Response
+from utils.update_processor import PerUserUpdateProcessor
+from utils.metrics import metrics
+from utils.tracing import tracer, TracedHTTPXRequest
+from utils.update_log import UpdateRecorder
 
 load_dotenv()
 
+# "polling" (default) or "webhook". Webhook mode serves Telegram updates and the
+# health check from one asyncio HTTP server inside the bot's event loop.
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Updates from different users are processed in parallel, each user's in order
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 64))
+# Updates a user may have waiting behind their running one; further taps are dropped
+MAX_PENDING_UPDATES_PER_USER = int(os.getenv("MAX_PENDING_UPDATES_PER_USER", 20))
+# Opt-in anonymized update log for tools/replay.py (".gz" paths are compressed)
+UPDATE_LOG_PATH = os.getenv("UPDATE_LOG_PATH")
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
 # Enable logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 # Silence frequent httpx logs
@@ -20,6 +42,13 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 def run_heartbeat():
     class HeartbeatHandler(http.server.SimpleHTTPRequestHandler):
         def do_GET(self):
+            if self.path == "/metrics":
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+                self.end_headers()
+                self.wfile.write(body)
+                return
             self.send_response(200)
             self.end_headers()
             self.wfile.write(b"Bot is alive!")
@@ -32,9 +61,6 @@ def run_heartbeat():
     print(f"Heartbeat server started on port {port}")
     server.serve_forever()
 
-# Start heartbeat in a separate thread
-threading.Thread(target=run_heartbeat, daemon=True).start()
-
 from handlers.menu_handler import show_categories, handle_callback
 from handlers.daily_v2_handler import start_daily_practice
 print(">>> v1.2.0 CURRICULUM ACTIVE <<<")
@@ -42,8 +68,10 @@ print("DEBUG HANDLERS:", os.listdir('handlers'))
 from handlers.profile_handler import show_profile
 from handlers.practice_handler import handle_answer
 from handlers.add_topic_handler import add_topic_conv
+from handlers.search_handler import search
 from telegram.ext import CallbackQueryHandler
 
+@metrics.timed("handler_seconds", handler="start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     db_ok = db.register_user(user.id, user.username, user.first_name, user.last_name)
@@ -59,6 +87,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(welcome_msg, reply_markup=main_menu_keyboard(), parse_mode='HTML')
 
+@metrics.timed("handler_seconds", handler="message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     
@@ -69,6 +98,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif text == "My Profile 👤":
         await show_profile(update, context)
 
+@metrics.timed("handler_seconds", handler="db_status")
 async def db_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     conn = db.get_connection()
     status = "Connected ✅" if conn else "Disconnected ❌"
@@ -78,9 +108,9 @@ async def db_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = (
         f"🖥️ <b>Database Status:</b>\n"
         f"Connectivity: {status}\n"
-        f"Type: {db.db_type}\n"
+        f"Type: PostgreSQL\n"
         f"Category Count: {cat_count}\n"
-        f"Schema Path: aptitude_practice"
+        f"Schema Path: {db.schema}"
     )
     await update.message.reply_text(msg, parse_mode='HTML')
 
@@ -91,6 +121,8 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     
     # Log the error
     logging.error("Exception while handling an update:", exc_info=context.error)
+    # Failed updates are always kept by the trace sampler
+    tracer.record_error(context.error)
     
     # Collect traceback
     tb_list = traceback.format_exception(None, context.error, context.error.__traceback__)
@@ -118,16 +150,88 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         except Exception as e:
             logging.error(f"Failed to send error message to Telegram: {e}")
 
-if __name__ == '__main__':
-    application = ApplicationBuilder().token(os.getenv("TELEGRAM_BOT_TOKEN")).build()
+def build_application():
+    builder = ApplicationBuilder().token(os.getenv("TELEGRAM_BOT_TOKEN"))
+    builder = builder.concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES, MAX_PENDING_UPDATES_PER_USER))
+    # Point at a local Bot API stand-in (tools/fake_telegram.py) for benchmarks
+    if os.getenv("TELEGRAM_API_BASE_URL"):
+        builder = builder.base_url(os.getenv("TELEGRAM_API_BASE_URL"))
+    if tracer.enabled:
+        # Record outbound Bot API calls as spans (same pool size PTB uses by default)
+        builder = builder.request(TracedHTTPXRequest(connection_pool_size=256))
+    application = builder.build()
     
+    if UPDATE_LOG_PATH:
+        recorder = UpdateRecorder(UPDATE_LOG_PATH, os.getenv("UPDATE_LOG_SALT"))
+        application.add_handler(TypeHandler(Update, recorder.handle), group=-1)
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('db_status', db_status))
+    application.add_handler(CommandHandler('search', search))
     application.add_handler(add_topic_conv)
     application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
     application.add_handler(CallbackQueryHandler(handle_callback))
     
     application.add_error_handler(error_handler)
+    return application
+
+async def run_webhook(application):
+    port = int(os.environ.get("PORT", 10000))
+    secret = os.getenv("WEBHOOK_SECRET")
+    if not secret:
+        # Without it anyone who finds the URL can post updates as any user
+        raise SystemExit("WEBHOOK_SECRET must be set in webhook mode")
+    # Render exposes the public URL of the service as RENDER_EXTERNAL_URL
+    public_url = os.getenv("WEBHOOK_URL") or os.getenv("RENDER_EXTERNAL_URL")
+
+    async def health(request):
+        return Response(200, "Bot is alive!")
+
+    async def metrics_page(request):
+        return Response(200, metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+    async def receive_update(request):
+        token = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token.encode(), secret.encode()):
+            return Response(403, "Forbidden")
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return Response(400, "Bad Request")
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return Response(200)
+
+    server = HTTPServer("0.0.0.0", port)
+    server.route("GET", "/", health)
+    server.route("GET", "/metrics", metrics_page)
+    server.route("POST", WEBHOOK_PATH, receive_update)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with application:
+        await application.start()
+        await server.start()
+        print(f"Webhook server started on port {port}")
+        if public_url:
+            await application.bot.set_webhook(
+                url=public_url.rstrip("/") + WEBHOOK_PATH,
+                secret_token=secret,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await stop_event.wait()
+        await server.stop()
+        await application.stop()
+
+if __name__ == '__main__':
+    application = build_application()
     
-    print("Bot is starting...")
-    application.run_polling()
+    if BOT_MODE == "webhook":
+        print("Bot is starting (webhook)...")
+        asyncio.run(run_webhook(application))
+    else:
+        # Heartbeat in a separate thread to keep Render awake while polling
+        threading.Thread(target=run_heartbeat, daemon=True).start()
+        print("Bot is starting...")
+        application.run_polling()
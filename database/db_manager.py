@@ -2,15 +2,112 @@ import os
 import json
 import psycopg2
 import logging
-from psycopg2.extras import RealDictCursor
+import sys
+import time
+import random
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, Json
 from dotenv import load_dotenv
+from database.seen_index import SeenIndex
+from database.recent_questions import RecentQuestionRing
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.tracing import tracer
 
 load_dotenv()
 
+DEFAULT_DAILY_GOAL = 10
+
+# Schema holding the bot's tables; tools/synth_db.py loads benchmark data into others
+DB_SCHEMA = os.getenv("DB_SCHEMA", "aptitude_practice")
+
+# Top the bank up in the background once a user has fewer than this many
+# unseen stored questions left for the (pattern, difficulty).
+QUESTION_REUSE_MIN_UNSEEN = int(os.getenv("QUESTION_REUSE_MIN_UNSEEN", 3))
+
+# SM-2 scheduling constants used by update_user_progress. reschedule_srs.py can
+# fit new values, write them to a JSON file and re-derive existing schedules;
+# point SRS_PARAMS_FILE at that file to use them online as well.
+DEFAULT_SRS_PARAMS = {
+    "min_easiness": 1.3,
+    "easiness_bonus": 0.1,
+    "easiness_linear": 0.08,
+    "easiness_quadratic": 0.02,
+    "first_interval": 1,
+    "second_interval": 6,
+    "lapse_interval": 1,
+    "fast_answer_seconds": 90,
+}
+
+def load_srs_params(path=None):
+    params = dict(DEFAULT_SRS_PARAMS)
+    path = path or os.getenv("SRS_PARAMS_FILE")
+    if path:
+        try:
+            with open(path, "r") as f:
+                params.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to load SRS params from {path}: {e}")
+    return params
+
+SRS_PARAMS = load_srs_params()
+
+def easiness_delta(quality, params=None):
+    """SM-2 easiness-factor change for an answer of quality 0-5."""
+    params = params or SRS_PARAMS
+    miss = 5 - quality
+    return params['easiness_bonus'] - miss * (params['easiness_linear'] + miss * params['easiness_quadratic'])
+
+# Rows per page of the topic and pattern menus
+MENU_PAGE_SIZE = int(os.getenv("MENU_PAGE_SIZE", 8))
+
+# Review urgency for a due user_progress row (aliased `up`): how overdue it is
+# relative to its interval, plus how weak the pattern is (low mastery, low
+# easiness factor). Each term is roughly on a 0..1 scale.
+SRS_PRIORITY_SQL = """(
+    EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - up.next_review_at)) / 86400.0 / GREATEST(up.srs_interval, 1)
+    + (1.0 - up.mastery_score)
+    + (2.5 - up.easiness_factor)
+)"""
+# Due-review order shared by get_srs_due_patterns and defer_srs_backlog. Ties are
+# common (same deferred date, easiness and mastery), so they are broken the same
+# way in both, or a pattern could be queued today and also pushed to a later day.
+SRS_ORDER_SQL = f"{SRS_PRIORITY_SQL} DESC, up.next_review_at, up.id"
+
+# Columns that make up a servable question dict (same keys the generator returns)
+QUESTION_COLUMNS = "q.id, q.pattern_id, q.question_text, q.options, q.correct_option_index, q.explanation, q.difficulty"
+
+# A pattern's searchable text; matches the idx_patterns_text_trgm expression in schema.sql
+PATTERN_TEXT_SQL = "(p.name || ' ' || COALESCE(p.description, ''))"
+
+# Marks "not cached" so a cached None (no progress row yet) still counts as a hit
+_MISSING = object()
+
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, schema=None):
         self.conn_url = os.getenv("DATABASE_URL")
+        self.schema = schema or DB_SCHEMA
         self.conn = None
+        self.seen_index = SeenIndex(int(os.getenv("SEEN_INDEX_MAX_USERS", 5000)))
+        # (pattern_id, difficulty) -> ids of stored questions, warmed on first use
+        self._bank_ids = TTLCache(maxsize=int(os.getenv("BANK_IDS_CACHE_SIZE", 2000)), ttl=3600, name="bank_ids")
+        # (user_id, pattern_id) -> user_progress row (or None), written through by update_user_progress and
+        # invalidated by defer_srs_backlog. Per process: rows written elsewhere (reschedule_srs.py, manual SQL)
+        # are only seen here once their entries expire after PROGRESS_CACHE_TTL. Only reads may be stale:
+        # update_user_progress upserts against the stored row and never consults this cache.
+        self.progress_cache = TTLCache(
+            maxsize=int(os.getenv("PROGRESS_CACHE_SIZE", 20000)),
+            ttl=int(os.getenv("PROGRESS_CACHE_TTL", 900)),
+            name="user_progress"
+        )
+        self.pattern_difficulty_cache = TTLCache(maxsize=5000, ttl=3600, name="pattern_difficulty")
+        # Stored question bodies read by id (bank hits, explanations), which users share; queued questions
+        # stay in their session's pool (handlers/session.py)
+        self.question_cache = TTLCache(maxsize=int(os.getenv("QUESTION_CACHE_SIZE", 5000)), ttl=3600, name="questions")
+        self.recent_questions = RecentQuestionRing(
+            size=int(os.getenv("RECENT_QUESTIONS_PER_PATTERN", 50)),
+            max_patterns=int(os.getenv("RECENT_QUESTIONS_MAX_PATTERNS", 2000))
+        )
 
     def get_connection(self):
         # Check if connection exists and is alive
@@ -30,17 +127,36 @@ class DatabaseManager:
         if should_reconnect:
             logging.info("Re-establishing database connection...")
             try:
-                self.conn = psycopg2.connect(self.conn_url, cursor_factory=RealDictCursor)
-                with self.conn.cursor() as cur:
-                    cur.execute("CREATE SCHEMA IF NOT EXISTS aptitude_practice")
-                    cur.execute("SET search_path TO aptitude_practice, public")
-                    self.conn.commit()
+                with tracer.span("db.connect"):
+                    self.conn = self.open_connection()
             except Exception as e:
                 logging.error(f"Failed to connect to Postgres: {e}")
                 self.conn = None
         return self.conn
 
-    def execute_query(self, query, params=None, retries=1):
+    def open_connection(self):
+        """Open a fresh connection with the bot schema on the search path."""
+        conn = psycopg2.connect(self.conn_url, cursor_factory=RealDictCursor)
+        with conn.cursor() as cur:
+            schema = sql.Identifier(self.schema)
+            cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(schema))
+            cur.execute(sql.SQL("SET search_path TO {}, public").format(schema))
+            conn.commit()
+        return conn
+
+    def execute_query(self, query, params=None, retries=1, name=None):
+        if not (metrics.enabled or tracer.enabled):
+            return self._execute(query, params, retries)
+        # Label latency by the calling method unless a name is given
+        name = name or sys._getframe(1).f_code.co_name
+        started = time.perf_counter()
+        try:
+            with tracer.span("db.query", query=name):
+                return self._execute(query, params, retries)
+        finally:
+            metrics.observe("db_query_seconds", time.perf_counter() - started, query=name)
+
+    def _execute(self, query, params, retries):
         for attempt in range(retries + 1):
             conn = self.get_connection()
             if not conn:
@@ -68,6 +184,16 @@ class DatabaseManager:
                 return None
         return None
 
+    def clear_caches(self):
+        """Forget everything cached in-process so the next calls hit the database."""
+        self.seen_index = SeenIndex(self.seen_index.max_users)
+        self._bank_ids.clear()
+        self.progress_cache.clear()
+        self.pattern_difficulty_cache.clear()
+        self.question_cache.clear()
+        ring = self.recent_questions
+        self.recent_questions = RecentQuestionRing(ring.size, ring.excerpt_chars, ring.max_patterns)
+
     def init_db(self):
         schema_path = os.path.join(os.path.dirname(__file__), "schema.sql")
         with open(schema_path, "r") as f:
@@ -101,6 +227,84 @@ class DatabaseManager:
     def get_patterns(self, topic_id):
         return self.execute_query("SELECT * FROM patterns WHERE topic_id = %s", (topic_id,))
 
+    def _keyset_page(self, table, parent_column, parent_id, after_id, before_id, limit):
+        """One page of `table` rows under a parent, ordered by id, starting after
+        `after_id` (or ending before `before_id`, for the previous page). Only
+        the menu columns are read. Returns {"items", "has_prev", "has_next"}
+        or None on a database error."""
+        columns = f"id, {parent_column}, name"
+        if before_id is not None:
+            query = f"SELECT {columns} FROM {table} WHERE {parent_column} = %s AND id < %s ORDER BY id DESC LIMIT %s"
+            res = self.execute_query(query, (parent_id, before_id, limit + 1), name=f"{table}_page")
+            if res is None:
+                return None
+            return {"items": [dict(r) for r in res[:limit]][::-1], "has_prev": len(res) > limit, "has_next": True}
+
+        query = f"SELECT {columns} FROM {table} WHERE {parent_column} = %s AND id > %s ORDER BY id LIMIT %s"
+        res = self.execute_query(query, (parent_id, after_id or 0, limit + 1), name=f"{table}_page")
+        if res is None:
+            return None
+        has_prev = False
+        if after_id:
+            earlier = f"SELECT 1 FROM {table} WHERE {parent_column} = %s AND id <= %s LIMIT 1"
+            has_prev = bool(self.execute_query(earlier, (parent_id, after_id), name=f"{table}_page"))
+        return {"items": [dict(r) for r in res[:limit]], "has_prev": has_prev, "has_next": len(res) > limit}
+
+    def get_topics_page(self, category_id, after_id=None, limit=MENU_PAGE_SIZE, before_id=None):
+        return self._keyset_page("topics", "category_id", category_id, after_id, before_id, limit)
+
+    def get_patterns_page(self, topic_id, after_id=None, limit=MENU_PAGE_SIZE, before_id=None):
+        return self._keyset_page("patterns", "topic_id", topic_id, after_id, before_id, limit)
+
+    def get_topic_category(self, topic_id):
+        res = self.execute_query("SELECT category_id FROM topics WHERE id = %s", (topic_id,))
+        return res[0]['category_id'] if res else None
+
+    def get_pattern_info(self, pattern_id):
+        """A pattern with its topic and category names, as the generator's batch input needs it."""
+        query = """
+        SELECT p.id, p.topic_id, p.name, p.description, p.difficulty_level, t.name as topic_name,
+               c.name as category_name
+        FROM patterns p
+        JOIN topics t ON p.topic_id = t.id
+        LEFT JOIN categories c ON t.category_id = c.id
+        WHERE p.id = %s
+        """
+        res = self.execute_query(query, (pattern_id,))
+        return dict(res[0]) if res else None
+
+    def search_patterns(self, text, limit=10, topic_id=None):
+        """Patterns whose name is trigram-similar to `text`, or whose name and
+        description contain a close match for it, best first. Each row has a
+        0-1 `score`."""
+        topic_filter = "AND p.topic_id = %s" if topic_id is not None else ""
+        query = f"""
+        SELECT p.id, p.topic_id, p.name, p.description, t.name as topic_name,
+               GREATEST(similarity(p.name, %s), word_similarity(%s, {PATTERN_TEXT_SQL})) as score
+        FROM patterns p
+        JOIN topics t ON p.topic_id = t.id
+        WHERE (p.name %% %s OR %s <%% {PATTERN_TEXT_SQL}) {topic_filter}
+        ORDER BY score DESC, p.id
+        LIMIT %s
+        """
+        params = (text, text, text, text) + ((topic_id,) if topic_id is not None else ()) + (limit,)
+        res = self.execute_query(query, params)
+        return [dict(r) for r in res] if res is not None else None
+
+    def search_questions(self, text, limit=10):
+        """Stored questions containing a close match for `text`, best first, with their pattern name."""
+        query = """
+        SELECT q.id, q.pattern_id, q.question_text, p.name as pattern_name,
+               word_similarity(%s, q.question_text) as score
+        FROM questions q
+        JOIN patterns p ON q.pattern_id = p.id
+        WHERE %s <%% q.question_text
+        ORDER BY score DESC, q.id
+        LIMIT %s
+        """
+        res = self.execute_query(query, (text, text, limit))
+        return [dict(r) for r in res] if res is not None else None
+
     def unlock_pattern(self, pattern_id):
         self.execute_query("UPDATE patterns SET is_unlocked = %s WHERE id = %s", (True, pattern_id))
 
@@ -108,83 +312,226 @@ class DatabaseManager:
         query = """
         INSERT INTO questions (pattern_id, question_text, options, correct_option_index, explanation, difficulty)
         VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id
         """
-        # psycopg2 handles dicts/lists for JSONB columns automatically
-        self.execute_query(query, (pattern_id, question_text, options, correct_index, explanation, difficulty))
+        # Lists would be adapted as Postgres arrays, so wrap options for the JSONB column
+        res = self.execute_query(query, (pattern_id, question_text, Json(options), correct_index, explanation, difficulty))
+        if not res:
+            return None
+        question_id = res[0]['id']
+        self.recent_questions.append(pattern_id, question_text)
+        bank = self._bank_ids.get((pattern_id, difficulty))
+        if bank is not None:
+            bank.append(question_id)
+        return question_id
+
+    def save_explanation(self, question_id, explanation):
+        """Store an explanation written on demand (LAZY_EXPLANATIONS) for the next user who asks."""
+        res = self.execute_query("UPDATE questions SET explanation = %s WHERE id = %s", (explanation, question_id))
+        self.question_cache.pop(question_id)
+        return res is not None
+
+    def cache_question(self, question):
+        """Keep a question body the caller already has, so get_question needn't read it back."""
+        if question.get('id'):
+            self.question_cache.set(question['id'], dict(question))
+
+    def get_question(self, question_id):
+        cached = self.question_cache.get(question_id)
+        if cached is not None:
+            return dict(cached)
+        res = self.execute_query(f"SELECT {QUESTION_COLUMNS} FROM questions q WHERE q.id = %s", (question_id,))
+        if not res:
+            return None
+        self.cache_question(dict(res[0]))
+        return dict(res[0])
+
+    def _get_bank_ids(self, pattern_id, difficulty):
+        key = (pattern_id, difficulty)
+        ids = self._bank_ids.get(key)
+        if ids is None:
+            res = self.execute_query("SELECT id FROM questions WHERE pattern_id = %s AND difficulty = %s", key)
+            if res is None:
+                return []
+            ids = [r['id'] for r in res]
+            self._bank_ids.set(key, ids)
+        return ids
+
+    def _ensure_seen_loaded(self, user_id):
+        if self.seen_index.is_loaded(user_id):
+            return True
+        res = self.execute_query("SELECT question_id FROM user_question_history WHERE user_id = %s", (user_id,))
+        if res is None:
+            return False
+        self.seen_index.load(user_id, [r['question_id'] for r in res])
+        return True
+
+    def mark_question_seen(self, user_id, question_id):
+        self.seen_index.add(user_id, question_id)
+
+    def get_unseen_question(self, user_id, pattern_id, difficulty):
+        """Pick a stored question for (pattern, difficulty) the user has not seen.
+
+        Returns (question, unseen_left). The question is None only when there is
+        no unseen one; callers compare unseen_left with QUESTION_REUSE_MIN_UNSEEN
+        to decide when to top the bank up. The chosen question is marked seen
+        right away so a batch never gets it twice.
+        """
+        if not self._ensure_seen_loaded(user_id):
+            return None, 0
+
+        unseen = [qid for qid in self._get_bank_ids(pattern_id, difficulty) if not self.seen_index.contains(user_id, qid)]
+        if not unseen:
+            return None, 0
+
+        question = self.get_question(random.choice(unseen))
+        if not question:
+            return None, len(unseen)
+        self.mark_question_seen(user_id, question['id'])
+        return question, len(unseen) - 1
+
+    def record_question_attempt(self, user_id, question_id, pattern_id, is_correct):
+        query = """
+        INSERT INTO user_question_history (user_id, question_id, pattern_id, last_correct)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id, question_id) DO UPDATE SET
+            attempts = user_question_history.attempts + 1,
+            last_correct = EXCLUDED.last_correct,
+            answered_at = CURRENT_TIMESTAMP
+        """
+        self.execute_query(query, (user_id, question_id, pattern_id, is_correct))
+        self.mark_question_seen(user_id, question_id)
+
+    def get_review_question(self, user_id, pattern_id, difficulty):
+        """A stored question for an SRS review: the user's oldest miss on the
+        pattern first, otherwise any one they have not seen at `difficulty`."""
+        query = f"""
+        SELECT {QUESTION_COLUMNS}
+        FROM user_question_history h
+        JOIN questions q ON q.id = h.question_id
+        WHERE h.user_id = %s AND h.pattern_id = %s AND h.last_correct = FALSE
+        ORDER BY h.answered_at ASC
+        LIMIT 1
+        """
+        res = self.execute_query(query, (user_id, pattern_id))
+        if res:
+            return dict(res[0])
+
+        question, _ = self.get_unseen_question(user_id, pattern_id, difficulty)
+        return question
+
+    def get_seen_question(self, user_id, pattern_id):
+        """The stored question of the pattern the user answered longest ago."""
+        query = f"""
+        SELECT {QUESTION_COLUMNS}
+        FROM user_question_history h
+        JOIN questions q ON q.id = h.question_id
+        WHERE h.user_id = %s AND h.pattern_id = %s
+        ORDER BY h.answered_at ASC
+        LIMIT 1
+        """
+        res = self.execute_query(query, (user_id, pattern_id))
+        return dict(res[0]) if res else None
 
     def get_recent_questions(self, pattern_id, limit=50):
-        query = "SELECT question_text FROM questions WHERE pattern_id = %s ORDER BY created_at DESC LIMIT %s"
-        res = self.execute_query(query, (pattern_id, limit))
-        return [r['question_text'] for r in res] if res else []
+        """Excerpts of the pattern's most recent questions, newest first."""
+        if not self.recent_questions.is_warm(pattern_id):
+            ring = self.recent_questions
+            query = "SELECT LEFT(question_text, %s) as excerpt FROM questions WHERE pattern_id = %s ORDER BY created_at DESC LIMIT %s"
+            res = self.execute_query(query, (ring.excerpt_chars, pattern_id, ring.size))
+            if res is None:
+                return []
+            ring.warm(pattern_id, [r['excerpt'] for r in res])
+        return self.recent_questions.recent(pattern_id, limit)
+
+    def get_progress(self, user_id, pattern_id):
+        """The user_progress row for (user, pattern), or None if there is none yet."""
+        key = (user_id, pattern_id)
+        row = self.progress_cache.get(key, _MISSING)
+        if row is not _MISSING:
+            return row
+
+        res = self.execute_query("SELECT * FROM user_progress WHERE user_id = %s AND pattern_id = %s", key)
+        if res is None:
+            return None # Query failed, don't cache
+        row = dict(res[0]) if res else None
+        self.progress_cache.set(key, row)
+        return row
+
+    def get_pattern_difficulty(self, pattern_id):
+        level = self.pattern_difficulty_cache.get(pattern_id)
+        if level is not None:
+            return level
+
+        res = self.execute_query("SELECT difficulty_level FROM patterns WHERE id = %s", (pattern_id,))
+        if not res:
+            return 2
+        level = res[0]['difficulty_level'] or 2
+        self.pattern_difficulty_cache.set(pattern_id, level)
+        return level
+
+    def _cache_progress(self, user_id, pattern_id, res):
+        if res:
+            self.progress_cache.set((user_id, pattern_id), dict(res[0]))
+        else:
+            self.progress_cache.pop((user_id, pattern_id))
 
     def update_user_progress(self, user_id, pattern_id, is_correct, performance_score, time_taken=0.0):
-        progress = self.execute_query("SELECT * FROM user_progress WHERE user_id = %s AND pattern_id = %s", (user_id, pattern_id))
-        
-        if not progress:
-            res = self.execute_query("SELECT difficulty_level FROM patterns WHERE id = %s", (pattern_id,))
-            base_diff = res[0]['difficulty_level'] if res else 2
-            
-            next_diff = base_diff
-            if is_correct and time_taken < 90: next_diff = min(5, base_diff + 1)
-            elif not is_correct: next_diff = max(1, base_diff - 1)
-
-            query = """
-            INSERT INTO user_progress (user_id, pattern_id, mastery_score, total_attempts, correct_attempts, last_practiced_at, avg_time_seconds, last_difficulty_level)
-            VALUES (%s, %s, %s, 1, %s, CURRENT_TIMESTAMP, %s, %s)
-            """
-            self.execute_query(query, (user_id, pattern_id, 0.1 if is_correct else 0.0, 1 if is_correct else 0, time_taken, next_diff))
+        """
+        Records an answer in one upsert. The first answer inserts the row; later ones apply
+        SM-2 to the stored row, not the cached one, so a row written by another process is
+        never duplicated or overwritten with stale values.
+        """
+        if not is_correct:
+            step = -1
+        elif time_taken < SRS_PARAMS['fast_answer_seconds']:
+            step = 1
         else:
-            p = progress[0]
-            q = performance_score
-            old_ef = p['easiness_factor']
-            new_ef = max(1.3, old_ef + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02)))
-            
-            new_avg_time = (p['avg_time_seconds'] * p['total_attempts'] + time_taken) / (p['total_attempts'] + 1)
-            
-            current_diff = p['last_difficulty_level'] or 1
-            if is_correct:
-                if time_taken < 90:
-                    new_diff = min(5, current_diff + 1)
-                else:
-                    new_diff = current_diff
-            else:
-                new_diff = max(1, current_diff - 1)
-
-            if is_correct:
-                if p['total_attempts'] == 0:
-                    new_interval = 1
-                elif p['total_attempts'] == 1:
-                    new_interval = 6
-                else:
-                    new_interval = round(p['srs_interval'] * new_ef)
-            else:
-                new_interval = 1
-            
-            query = """
-            UPDATE user_progress SET
-                total_attempts = total_attempts + 1,
-                correct_attempts = correct_attempts + %s,
-                last_practiced_at = CURRENT_TIMESTAMP,
-                next_review_at = CURRENT_TIMESTAMP + (%s * interval '1 day'),
-                srs_interval = %s,
-                easiness_factor = %s,
-                mastery_score = %s,
-                avg_time_seconds = %s,
-                last_difficulty_level = %s
-            WHERE id = %s
-            """
-            new_mastery = min(1.0, (p['correct_attempts'] + (1 if is_correct else 0)) / (p['total_attempts'] + 1))
-            params = (1 if is_correct else 0, new_interval, new_interval, new_ef, new_mastery, new_avg_time, new_diff, p['id'])
-            
-            self.execute_query(query, params)
+            step = 0
+
+        new_ef = "GREATEST(%(min_ef)s, up.easiness_factor + %(ef_delta)s)"
+        new_interval = f"""
+            CASE WHEN %(correct)s = 0 THEN %(lapse_interval)s
+                 WHEN up.total_attempts = 0 THEN %(first_interval)s
+                 WHEN up.total_attempts = 1 THEN %(second_interval)s
+                 ELSE ROUND(up.srs_interval * {new_ef})::int END"""
+        query = f"""
+        INSERT INTO user_progress AS up (user_id, pattern_id, mastery_score, total_attempts, correct_attempts, last_practiced_at, avg_time_seconds, last_difficulty_level)
+        VALUES (%(user_id)s, %(pattern_id)s, %(first_mastery)s, 1, %(correct)s, CURRENT_TIMESTAMP, %(time_taken)s, %(first_difficulty)s)
+        ON CONFLICT (user_id, pattern_id) DO UPDATE SET
+            total_attempts = up.total_attempts + 1,
+            correct_attempts = up.correct_attempts + %(correct)s,
+            last_practiced_at = CURRENT_TIMESTAMP,
+            next_review_at = CURRENT_TIMESTAMP + ({new_interval}) * interval '1 day',
+            srs_interval = {new_interval},
+            easiness_factor = {new_ef},
+            mastery_score = LEAST(1.0, (up.correct_attempts + %(correct)s)::float / (up.total_attempts + 1)),
+            avg_time_seconds = (up.avg_time_seconds * up.total_attempts + %(time_taken)s) / (up.total_attempts + 1),
+            last_difficulty_level = LEAST(5, GREATEST(1, COALESCE(NULLIF(up.last_difficulty_level, 0), 1) + %(step)s))
+        RETURNING *
+        """
+        params = {
+            "user_id": user_id,
+            "pattern_id": pattern_id,
+            "correct": 1 if is_correct else 0,
+            "time_taken": time_taken,
+            "step": step,
+            "first_mastery": 0.1 if is_correct else 0.0,
+            "first_difficulty": min(5, max(1, self.get_pattern_difficulty(pattern_id) + step)),
+            "min_ef": SRS_PARAMS['min_easiness'],
+            "ef_delta": easiness_delta(performance_score),
+            "first_interval": SRS_PARAMS['first_interval'],
+            "second_interval": SRS_PARAMS['second_interval'],
+            "lapse_interval": SRS_PARAMS['lapse_interval'],
+        }
+        res = self.execute_query(query, params)
+        self._cache_progress(user_id, pattern_id, res)
 
     def get_current_difficulty(self, user_id, pattern_id):
-        res = self.execute_query("SELECT last_difficulty_level FROM user_progress WHERE user_id = %s AND pattern_id = %s", (user_id, pattern_id))
-        if res and res[0]['last_difficulty_level']:
-            return res[0]['last_difficulty_level']
-        
-        res = self.execute_query("SELECT difficulty_level FROM patterns WHERE id = %s", (pattern_id,))
-        return res[0]['difficulty_level'] if res else 2
+        p = self.get_progress(user_id, pattern_id)
+        if p and p['last_difficulty_level']:
+            return p['last_difficulty_level']
+        return self.get_pattern_difficulty(pattern_id)
 
     def add_pattern(self, topic_id, name, description, difficulty, user_id=None):
         query = """
@@ -229,16 +576,92 @@ class DatabaseManager:
         """
         return self.execute_query(query, (user_id,))
 
-    def get_srs_due_patterns(self, user_id):
-        """Patterns due for SRS review."""
+    def get_profile_stats(self, user_id):
+        """Totals over the user's progress rows; the sums are None before any practice."""
+        query = """
+        SELECT
+            COUNT(*) as total_patterns,
+            SUM(total_attempts) as total_attempts,
+            SUM(correct_attempts) as total_correct,
+            AVG(mastery_score) as avg_mastery,
+            AVG(avg_time_seconds) as avg_time
+        FROM user_progress
+        WHERE user_id = %s
+        """
+        res = self.execute_query(query, (user_id,))
+        return dict(res[0]) if res else None
+
+    def count_active_cycles(self, user_id):
+        """Patterns the user added in the last 9 days."""
+        query = """
+        SELECT COUNT(*) as count
+        FROM user_added_patterns
+        WHERE user_id = %s AND added_at >= CURRENT_TIMESTAMP - interval '9 days'
+        """
+        res = self.execute_query(query, (user_id,))
+        return res[0]['count'] if res else 0
+
+    def get_weak_topics(self, user_id, limit=3):
+        """The user's lowest-mastery progress rows with their topic names."""
         query = """
-        SELECT p.*, t.name as topic_name, up.mastery_score, up.avg_time_seconds
+        SELECT t.name, up.mastery_score, up.last_difficulty_level
+        FROM user_progress up
+        JOIN patterns p ON up.pattern_id = p.id
+        JOIN topics t ON p.topic_id = t.id
+        WHERE up.user_id = %s
+        ORDER BY up.mastery_score ASC
+        LIMIT %s
+        """
+        return self.execute_query(query, (user_id, limit)) or []
+
+    def get_daily_goal(self, user_id):
+        res = self.execute_query("SELECT daily_goal FROM users WHERE user_id = %s", (user_id,))
+        if res and res[0]['daily_goal']:
+            return res[0]['daily_goal']
+        return DEFAULT_DAILY_GOAL
+
+    def get_srs_due_patterns(self, user_id, limit=None):
+        """Patterns due for SRS review, most urgent first (see SRS_PRIORITY_SQL)."""
+        query = f"""
+        SELECT p.*, t.name as topic_name, up.mastery_score, up.avg_time_seconds,
+               {SRS_PRIORITY_SQL} as priority
         FROM user_progress up
         JOIN patterns p ON up.pattern_id = p.id
         JOIN topics t ON p.topic_id = t.id
         WHERE up.user_id = %s AND up.next_review_at <= CURRENT_TIMESTAMP
+        ORDER BY {SRS_ORDER_SQL}
+        LIMIT %s
         """
-        return self.execute_query(query, (user_id,))
+        return self.execute_query(query, (user_id, limit))
+
+    def defer_srs_backlog(self, user_id, daily_cap):
+        """Spread due reviews beyond today's cap over the following days.
+
+        Reviews ranked past `daily_cap` are pushed forward in chunks of
+        `daily_cap` per day, in priority order, so the backlog left after a
+        break is worked off at a bounded daily rate. Returns the number of
+        deferred reviews; none without a positive cap.
+        """
+        if not daily_cap or daily_cap <= 0:
+            return 0
+        query = f"""
+        WITH ranked AS (
+            SELECT up.id, ROW_NUMBER() OVER (ORDER BY {SRS_ORDER_SQL}) as rn
+            FROM user_progress up
+            WHERE up.user_id = %s AND up.next_review_at <= CURRENT_TIMESTAMP
+        )
+        UPDATE user_progress up
+        SET next_review_at = CURRENT_TIMESTAMP + (((ranked.rn - 1) / %s) * interval '1 day')
+        FROM ranked
+        WHERE up.id = ranked.id AND ranked.rn > %s
+        RETURNING up.id, up.user_id, up.pattern_id
+        """
+        res = self.execute_query(query, (user_id, daily_cap, daily_cap))
+        if not isinstance(res, list):
+            return 0
+        for row in res:
+            self.progress_cache.pop((row['user_id'], row['pattern_id']))
+        return len(res)
 
     def get_unpracticed_patterns(self, user_id):
         """Patterns that are unlocked but have no user progress yet."""
@@ -0,0 +1,53 @@
+import hashlib
+from collections import deque, OrderedDict
+
+class RecentQuestionRing:
+    """Fixed-size ring of recent question excerpts per pattern.
+
+    Holds a short fingerprint and an excerpt for the last `size` questions of
+    each pattern, so building an avoid list is a memory read and memory per
+    pattern is bounded. Rings are warmed from the DB once per pattern and then
+    appended to as questions are saved; only the `max_patterns` most recently
+    used patterns keep a ring, the others are warmed again on next use.
+    """
+
+    def __init__(self, size=50, excerpt_chars=200, max_patterns=2000):
+        self.size = size
+        self.excerpt_chars = excerpt_chars
+        self.max_patterns = max_patterns
+        self._rings = OrderedDict()
+
+    def fingerprint(self, text):
+        # Of the excerpt only, as warm() gets excerpts from the DB and append() full texts
+        normalized = " ".join(text[:self.excerpt_chars].lower().split())
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+    def is_warm(self, pattern_id):
+        if pattern_id in self._rings:
+            self._rings.move_to_end(pattern_id)
+            return True
+        return False
+
+    def warm(self, pattern_id, texts):
+        """Fill a pattern's ring from texts ordered newest first."""
+        self._rings[pattern_id] = deque(maxlen=self.size)
+        self._rings.move_to_end(pattern_id)
+        while len(self._rings) > self.max_patterns:
+            self._rings.popitem(last=False)
+        for text in reversed(texts):
+            self.append(pattern_id, text)
+
+    def append(self, pattern_id, text):
+        ring = self._rings.get(pattern_id)
+        if ring is None:
+            return
+        fp = self.fingerprint(text)
+        if any(entry[0] == fp for entry in ring):
+            return
+        ring.append((fp, text[:self.excerpt_chars]))
+
+    def recent(self, pattern_id, limit=None):
+        """Excerpts newest first."""
+        ring = self._rings.get(pattern_id, ())
+        excerpts = [entry[1] for entry in reversed(ring)]
+        return excerpts[:limit] if limit else excerpts
@@ -66,6 +66,42 @@ CREATE TABLE IF NOT EXISTS user_progress (
     last_difficulty_level INT DEFAULT 1
 );
 
+-- One progress row per (user, pattern); update_user_progress upserts on it. Duplicates left by
+-- earlier concurrent first answers are dropped first, keeping the most-practised row.
+DELETE FROM user_progress a USING user_progress b
+WHERE a.user_id = b.user_id AND a.pattern_id = b.pattern_id
+  AND (COALESCE(a.total_attempts, 0), a.id) < (COALESCE(b.total_attempts, 0), b.id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_user_pattern ON user_progress (user_id, pattern_id);
+
+-- Supports the per-user SRS due-queue lookup
+CREATE INDEX IF NOT EXISTS idx_user_progress_due ON user_progress (user_id, next_review_at);
+
+-- Per-user answer history per stored question (seen / missed lookups for reviews)
+CREATE TABLE IF NOT EXISTS user_question_history (
+    user_id BIGINT REFERENCES users(user_id),
+    question_id INT REFERENCES questions(id),
+    pattern_id INT REFERENCES patterns(id),
+    attempts INT DEFAULT 1,
+    last_correct BOOLEAN,
+    answered_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, question_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_uqh_missed ON user_question_history (user_id, pattern_id, answered_at) WHERE last_correct = FALSE;
+CREATE INDEX IF NOT EXISTS idx_questions_pattern_difficulty ON questions (pattern_id, difficulty);
+
+-- Keyset pagination of the topic and pattern menus (get_topics_page / get_patterns_page)
+CREATE INDEX IF NOT EXISTS idx_topics_category_id ON topics (category_id, id);
+CREATE INDEX IF NOT EXISTS idx_patterns_topic_id ON patterns (topic_id, id);
+
+-- Trigram similarity search over the curriculum and question bank (/search, near-duplicate patterns).
+-- In public so every schema on the search path (see DB_SCHEMA, tools/synth_db.py) can use it.
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+CREATE INDEX IF NOT EXISTS idx_patterns_name_trgm ON patterns USING GIN (name gin_trgm_ops);
+-- Same expression as PATTERN_TEXT_SQL in db_manager.py, or the planner can't use it
+CREATE INDEX IF NOT EXISTS idx_patterns_text_trgm ON patterns USING GIN ((name || ' ' || COALESCE(description, '')) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_questions_text_trgm ON questions USING GIN (question_text gin_trgm_ops);
+
 -- Tracking when a user adds a pattern for the 9-day rule
 CREATE TABLE IF NOT EXISTS user_added_patterns (
     id SERIAL PRIMARY KEY,
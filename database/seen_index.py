@@ -0,0 +1,85 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Ids are split into chunks of 2**CHUNK_SHIFT by their high bits, as in roaring bitmaps
+CHUNK_SHIFT = 16
+CHUNK_MASK = (1 << CHUNK_SHIFT) - 1
+# Past this many ids a chunk's sorted array would outgrow a bitmap of the chunk
+ARRAY_MAX = (1 << CHUNK_SHIFT) // 16
+BITMAP_BYTES = (1 << CHUNK_SHIFT) // 8
+
+class SeenIndex:
+    """Per-user set of seen question ids.
+
+    Each user's ids are kept roaring-style: a dict from the id's high bits to a
+    chunk holding its low 16 bits, either a sorted array('H') (2 bytes per id,
+    bisect lookups) or, once it holds more than ARRAY_MAX ids, an 8 KiB bitmap.
+    A sparse history over a large bank costs about 2 bytes per id plus a small
+    header per touched chunk, well under a set of ints. Only the most recently
+    used users are kept; evicted users are rebuilt from user_question_history
+    on their next lookup.
+    """
+
+    def __init__(self, max_users=5000):
+        self.max_users = max_users
+        self._users = OrderedDict()
+
+    def is_loaded(self, user_id):
+        if user_id in self._users:
+            self._users.move_to_end(user_id)
+            return True
+        return False
+
+    def load(self, user_id, question_ids):
+        grouped = {}
+        for qid in question_ids:
+            grouped.setdefault(qid >> CHUNK_SHIFT, set()).add(qid & CHUNK_MASK)
+        chunks = {}
+        for key, lows in grouped.items():
+            chunk = array('H', sorted(lows))
+            chunks[key] = _to_bitmap(chunk) if len(chunk) > ARRAY_MAX else chunk
+        self._users[user_id] = chunks
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def add(self, user_id, question_id):
+        chunks = self._users.get(user_id)
+        if chunks is None:
+            return
+        key, low = question_id >> CHUNK_SHIFT, question_id & CHUNK_MASK
+        chunk = chunks.get(key)
+        if chunk is None:
+            chunks[key] = array('H', [low])
+        elif isinstance(chunk, bytearray):
+            chunk[low >> 3] |= 1 << (low & 7)
+        else:
+            i = bisect_left(chunk, low)
+            if i < len(chunk) and chunk[i] == low:
+                return
+            chunk.insert(i, low)
+            if len(chunk) > ARRAY_MAX:
+                chunks[key] = _to_bitmap(chunk)
+
+    def contains(self, user_id, question_id):
+        chunks = self._users.get(user_id)
+        if not chunks:
+            return False
+        chunk = chunks.get(question_id >> CHUNK_SHIFT)
+        if chunk is None:
+            return False
+        low = question_id & CHUNK_MASK
+        if isinstance(chunk, bytearray):
+            return bool(chunk[low >> 3] >> (low & 7) & 1)
+        i = bisect_left(chunk, low)
+        return i < len(chunk) and chunk[i] == low
+
+    def discard_user(self, user_id):
+        self._users.pop(user_id, None)
+
+def _to_bitmap(lows):
+    bitmap = bytearray(BITMAP_BYTES)
+    for low in lows:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bitmap
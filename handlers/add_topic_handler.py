@@ -2,7 +2,14 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKe
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 from database.db_manager import db
 from llm.generator import generator
+from llm.restructure_cache import restructure_cache
+from utils.metrics import metrics
+import asyncio
 import html
+import os
+
+# Name similarity (0-1) at which a new pattern counts as a near-duplicate of one in its topic
+DUPLICATE_SIMILARITY = float(os.getenv("PATTERN_DUPLICATE_SIMILARITY", 0.6))
 
 # States
 SELECT_CATEGORY, SELECT_TOPIC, INPUT_PATTERN, CONFIRM_RESTRUCTURING = range(4)
@@ -57,16 +64,46 @@ async def topic_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return INPUT_PATTERN
 
+@metrics.timed("handler_seconds", handler="add_topic_pattern")
 async def pattern_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     raw_text = update.message.text
-    await update.message.reply_text("Restructuring your input... ⏳")
+    context.user_data['add_topic_raw'] = raw_text
+    context.user_data.pop('duplicate_checked', None)
     
-    restructured, error = generator.restructure_pattern(raw_text)
+    # Same description as an earlier submission, or close to a pattern the topic already has
+    outcome, found = restructure_cache.lookup(raw_text, context.user_data['add_topic_id'])
+    if outcome == "suggested":
+        context.user_data['suggested_pattern_id'] = found['id']
+        msg = (
+            f"🔎 <b>This topic already has a similar pattern:</b>\n\n"
+            f"<b>Name:</b> {html.escape(found['name'])}\n"
+            f"<b>Description:</b> {html.escape(found.get('description') or '')}\n\n"
+            "Practice this one, or create yours anyway?"
+        )
+        keyboard = [
+            [InlineKeyboardButton("Use existing ✅", callback_data="use_existing")],
+            [InlineKeyboardButton("Create new ➕", callback_data="restructure_anyway")],
+            [InlineKeyboardButton("Cancel ❌", callback_data="cancel_add")]
+        ]
+        await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+        return CONFIRM_RESTRUCTURING
+    if outcome == "hit":
+        return await show_restructured(update.message, context, found)
+    return await restructure(update.message, context, raw_text)
+
+async def restructure(message, context, raw_text):
+    await message.reply_text("Restructuring your input... ⏳")
+    
+    restructured, error = await asyncio.to_thread(generator.restructure_pattern, raw_text)
     
     if error:
-        await update.message.reply_text(f"❌ Error during restructuring: {error}\n\nPlease try describing it again.")
+        await message.reply_text(f"❌ Error during restructuring: {error}\n\nPlease try describing it again.")
         return INPUT_PATTERN
     
+    restructure_cache.store(raw_text, restructured)
+    return await show_restructured(message, context, restructured)
+
+async def show_restructured(message, context, restructured):
     context.user_data['temp_pattern'] = restructured
     
     msg = (
@@ -84,15 +121,37 @@ async def pattern_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(msg, reply_markup=reply_markup, parse_mode='HTML')
+    await message.reply_text(msg, reply_markup=reply_markup, parse_mode='HTML')
     return CONFIRM_RESTRUCTURING
 
+@metrics.timed("handler_seconds", handler="add_topic_confirm")
 async def confirm_restructuring(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     if query.data == "confirm_pattern":
         p = context.user_data['temp_pattern']
+        # UNIQUE(topic_id, name) only catches exact names; ask once if a close one exists
+        if not context.user_data.get('duplicate_checked'):
+            context.user_data['duplicate_checked'] = True
+            similar = db.search_patterns(p['name'], limit=1, topic_id=context.user_data['add_topic_id'])
+            if similar and similar[0]['score'] >= DUPLICATE_SIMILARITY:
+                existing = similar[0]
+                metrics.inc("pattern_near_duplicates_total")
+                context.user_data['suggested_pattern_id'] = existing['id']
+                keyboard = [
+                    [InlineKeyboardButton("Use existing ✅", callback_data="use_existing")],
+                    [InlineKeyboardButton("Add anyway ➕", callback_data="confirm_pattern")],
+                    [InlineKeyboardButton("Cancel ❌", callback_data="cancel_add")]
+                ]
+                await query.message.edit_text(
+                    f"⚠️ <b>This topic already has a similar pattern:</b>\n\n"
+                    f"<b>{html.escape(existing['name'])}</b>\n{html.escape(existing['description'] or '')}\n\n"
+                    f"Add '{html.escape(p['name'])}' anyway?",
+                    reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML'
+                )
+                return CONFIRM_RESTRUCTURING
+
         pattern_id = db.add_pattern(
             context.user_data['add_topic_id'],
             p['name'],
@@ -119,8 +178,28 @@ async def confirm_restructuring(update: Update, context: ContextTypes.DEFAULT_TY
         return ConversationHandler.END
         
     elif query.data == "retry_pattern":
+        # Rejected, so the same wording shouldn't get the same answer from the cache
+        restructure_cache.forget(context.user_data.get('add_topic_raw'))
+        context.user_data.pop('duplicate_checked', None)
         await query.message.edit_text("Please describe the pattern again with more detail.")
         return INPUT_PATTERN
+
+    elif query.data == "use_existing":
+        pattern_id = context.user_data.pop('suggested_pattern_id', None)
+        selected = context.user_data.setdefault('selected_patterns', [])
+        if pattern_id and pattern_id not in selected:
+            selected.append(pattern_id)
+        await query.message.edit_text(
+            "✅ Added to your selection. Start it from <b>Custom Practice 🛠️</b>.", parse_mode='HTML'
+        )
+        return ConversationHandler.END
+
+    elif query.data == "restructure_anyway":
+        context.user_data.pop('suggested_pattern_id', None)
+        # Already turned down the similar pattern; don't ask again on confirm
+        context.user_data['duplicate_checked'] = True
+        await query.message.edit_reply_markup(None)
+        return await restructure(query.message, context, context.user_data['add_topic_raw'])
         
     else:
         await query.message.edit_text("Action canceled.")
@@ -136,7 +215,9 @@ add_topic_conv = ConversationHandler(
         SELECT_CATEGORY: [CallbackQueryHandler(category_choice, pattern="^addcat_")],
         SELECT_TOPIC: [CallbackQueryHandler(topic_choice, pattern="^addtopic_")],
         INPUT_PATTERN: [MessageHandler(filters.TEXT & (~filters.COMMAND), pattern_input)],
-        CONFIRM_RESTRUCTURING: [CallbackQueryHandler(confirm_restructuring, pattern="^(confirm_pattern|retry_pattern|cancel_add)$")]
+        CONFIRM_RESTRUCTURING: [CallbackQueryHandler(
+            confirm_restructuring, pattern="^(confirm_pattern|retry_pattern|cancel_add|use_existing|restructure_anyway)$"
+        )]
     },
     fallbacks=[CommandHandler('cancel', cancel)]
 )
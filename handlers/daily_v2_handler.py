@@ -1,12 +1,23 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from database.db_manager import db
-from llm.generator import generator
 from utils.keyboards import question_keyboard
+from handlers.question_pool import (
+    take_from_bank, pattern_batch_info, save_generated, start_prefetch, await_prefetch, record_question_sent,
+    generation_deadline, generate_batch, fallback_questions, begin_generation, end_generation, abandon_prefetch,
+    bank_questions,
+)
+from handlers.session import start_session, get_session
+from utils.metrics import metrics
+from utils.tracing import tracer
 import random
 import html
 import time
-import asyncio
+import os
+
+# "bank": serve SRS reviews from stored questions (missed first, then unseen)
+# and only generate when the bank has nothing; "generate": always use the LLM.
+SRS_REVIEW_SOURCE = os.getenv("SRS_REVIEW_SOURCE", "bank")
 
 async def start_daily_practice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -16,8 +27,11 @@ async def start_daily_practice(update: Update, context: ContextTypes.DEFAULT_TYP
 
     # 1. Fetch 9-Day New Patterns
     new_patterns = db.get_new_patterns_in_cycle(user_id)
-    # 2. Fetch SRS Due Patterns
-    srs_patterns = db.get_srs_due_patterns(user_id)
+    # 2. Fetch SRS Due Patterns (most urgent first, capped at the user's daily goal)
+    review_cap = db.get_daily_goal(user_id)
+    srs_patterns = db.get_srs_due_patterns(user_id, limit=review_cap)
+    # Anything past the cap is spread over the following days
+    deferred_reviews = db.defer_srs_backlog(user_id, review_cap)
     # 3. Fetch Unpracticed Unlocked Patterns (Base foundational patterns)
     unpracticed_patterns = db.get_unpracticed_patterns(user_id)
     
@@ -48,6 +62,8 @@ async def start_daily_practice(update: Update, context: ContextTypes.DEFAULT_TYP
         for p in srs_patterns:
             plan_text += f"• {html.escape(p['name'])}: 1 question\n"
             queue.append(p['id'])
+        if deferred_reviews:
+            plan_text += f"<i>+{deferred_reviews} more reviews spread over the next days</i>\n"
 
     if unpracticed_patterns:
         if new_patterns or srs_patterns: plan_text += "\n"
@@ -61,22 +77,18 @@ async def start_daily_practice(update: Update, context: ContextTypes.DEFAULT_TYP
             
     plan_text += f"\nTotal Questions: <b>{len(queue)}</b>"
     
-    # Store in context
-    context.user_data['daily_queue'] = queue
-    context.user_data['session_score'] = 0
-    context.user_data['session_total_target'] = len(queue)
-    context.user_data['session_current_index'] = 0
-    # Clear any existing pools to ensure the new flat format is used
-    context.user_data['daily_pool'] = []
-    context.user_data['custom_pool'] = []
-    context.user_data['is_daily'] = True
+    # Replaces any previous session, and with it its pool
+    start_session(context, "daily", target=len(queue), queue=queue,
+                  review_patterns=[p['id'] for p in srs_patterns or []])
     
     keyboard = [[InlineKeyboardButton("Start Practice 🚀", callback_data="start_daily_session")]]
     await update.message.reply_text(plan_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
-async def _fill_daily_pool(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Helper to fill the daily question pool in background or foreground."""
-    queue = context.user_data.get('daily_queue', [])
+@tracer.traced("fill_daily_pool")
+async def _fill_daily_pool(update: Update, session, deadline_at=None):
+    """Helper to fill the daily question pool in background or foreground. With
+    a deadline (foreground), falls back to questions that need no LLM call."""
+    queue = session.queue
     if not queue:
         return True, None # Nothing to fill
         
@@ -85,51 +97,65 @@ async def _fill_daily_pool(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     batch_size = min(5, len(queue))
     selected_for_batch = [queue.pop(0) for _ in range(batch_size)]
-    context.user_data['daily_queue'] = queue
+    tracer.annotate(pattern_ids=selected_for_batch)
     
-    batch_patterns_info = []
+    pool = session.pool
+    review_patterns = session.review_patterns
+    to_generate = []
     for pid in selected_for_batch:
-        res = db.execute_query("SELECT p.id, p.name, p.description, t.name as topic_name FROM patterns p JOIN topics t ON p.topic_id = t.id WHERE p.id = %s", (pid,))
-        if res:
-            p = res[0]
-            current_diff = db.get_current_difficulty(user_id, pid)
-            batch_patterns_info.append({
-                'id': p['id'],
-                'name': p['name'],
-                'topic_name': p['topic_name'],
-                'description': p['description'],
-                'difficulty': current_diff,
-                'avoid_questions': db.get_recent_questions(p['id'])
-            })
-
-    questions, error_msg = generator.generate_batch(batch_patterns_info, count=batch_size)
+        if SRS_REVIEW_SOURCE == "bank" and pid in review_patterns:
+            review_patterns.remove(pid)
+            stored = db.get_review_question(user_id, pid, db.get_current_difficulty(user_id, pid))
+            if stored:
+                pool.append(stored)
+                continue
+        to_generate.append(pid)
+
+    metrics.inc("questions_served_total", len(selected_for_batch) - len(to_generate), source="review")
+    if len(to_generate) < len(selected_for_batch):
+        print(f"DEBUG: Served {len(selected_for_batch) - len(to_generate)} SRS reviews from the question bank")
+    to_generate = take_from_bank(user_id, to_generate, pool)
+    if not to_generate:
+        return True, None
+
+    batch_patterns_info = [info for info in (pattern_batch_info(user_id, pid) for pid in to_generate) if info]
+
+    # Runs the blocking LLM call off the event loop so other users keep being served
+    batch = begin_generation(session, to_generate)
+    questions, error_msg = await generate_batch(batch_patterns_info, deadline_at, flow="daily")
+    if batch['abandoned']:
+        # The user was already served fallbacks for these patterns
+        bank_questions(questions, to_generate[0])
+        return True, None
+    end_generation(session, batch)
     if not questions:
+        if deadline_at is not None:
+            fallback, to_generate = fallback_questions(user_id, to_generate, "daily")
+            pool.extend(fallback)
         # Put items back in queue if generation failed
-        context.user_data['daily_queue'] = selected_for_batch + context.user_data['daily_queue']
-        return False, error_msg
+        session.queue[:0] = to_generate
+        return bool(pool), error_msg
         
-    pool = context.user_data.get('daily_pool', [])
     for q in questions:
-        p_id = q.get('pattern_id') or selected_for_batch[0]
-        db.save_question(
-            p_id,
-            q['question_text'],
-            q['options'],
-            q['correct_option_index'],
-            q['explanation'],
-            q.get('difficulty', 3)
-        )
-        # Add the question directly without wrapping it in a 'data' key
+        save_generated(user_id, q, to_generate[0])
         pool.append(q)
-    context.user_data['daily_pool'] = pool
     return True, None
 
 async def trigger_daily_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print("!!! TRACE ATTEMPT: trigger_daily_question in V2 HANDLER called !!!")
-    queue = context.user_data.get('daily_queue', [])
-    pool = context.user_data.get('daily_pool', [])
-    total = context.user_data.get('session_total_target', 0)
-    current_idx = context.user_data.get('session_current_index', 0) + 1
+    # The user gets a question by the deadline one way or another
+    session = get_session(context, "daily")
+    if session is None:
+        await context.bot.send_message(update.effective_chat.id, "This session has ended. Open Daily Practice to start a new one.")
+        return
+    deadline_at = generation_deadline()
+    if not session.pool:
+        if not await await_prefetch(session, deadline_at):
+            session.queue[:0] = abandon_prefetch(session, update.effective_user.id)
+    queue = session.queue
+    pool = session.pool
+    total = session.target
+    current_idx = session.index + 1
     
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
@@ -138,43 +164,40 @@ async def trigger_daily_question(update: Update, context: ContextTypes.DEFAULT_T
 
     if not pool and not queue:
         # Session Complete
-        score = context.user_data.get('session_score', 0)
         await context.bot.send_message(
             chat_id,
-            f"🏁 <b>Daily Practice Complete!</b>\n\nScore: <b>{score}/{total}</b>\nBoom! You're getting better every day. 🔥",
+            f"🏁 <b>Daily Practice Complete!</b>\n\nScore: <b>{session.score}/{total}</b>\nBoom! You're getting better every day. 🔥",
             parse_mode='HTML'
         )
-        context.user_data['is_daily'] = False
         return
 
     # If pool is empty, generate a batch synchronously
     if not pool:
         status_msg = await context.bot.send_message(chat_id, f"<i>Batch generating {min(5, len(queue))} questions... ⏳</i>", parse_mode='HTML')
-        success, error_msg = await _fill_daily_pool(update, context)
+        success, error_msg = await _fill_daily_pool(update, session, deadline_at)
         await status_msg.delete()
 
         if not success:
             await context.bot.send_message(chat_id, f"❌ <b>Batch Generation Failed:</b>\n\n{html.escape(str(error_msg) or 'Unknown Error')}", parse_mode='HTML')
             return
-        
-        pool = context.user_data.get('daily_pool', [])
 
-    # Serve from pool
-    q_data = pool.pop(0)
-    context.user_data['daily_pool'] = pool
+    # Serve from pool (its body is loaded only now)
+    q_data = pool.next_question()
+    if q_data is None:
+        await context.bot.send_message(chat_id, "❌ <b>Batch Generation Failed:</b>\n\nQuestions could not be loaded.", parse_mode='HTML')
+        return
     pattern_id = q_data.get('pattern_id')
 
     # PREFETCH: If pool is now empty but more items in queue, start fetching next batch
-    if not pool and context.user_data.get('daily_queue'):
+    if not pool and session.queue:
         print("DEBUG: Prefetching next daily batch in background...")
-        asyncio.create_task(_fill_daily_pool(update, context))
-
-    context.user_data['current_question'] = q_data
-    context.user_data['current_pattern_id'] = pattern_id
-    context.user_data['q_start_time'] = time.time()
+        start_prefetch(session, _fill_daily_pool(update, session))
     
     safe_question = html.escape(q_data['question_text'])
     safe_options = [html.escape(opt) for opt in q_data['options']]
     
     msg = f"<b>Question {current_idx}/{total}:</b>\n\n{safe_question}"
-    await context.bot.send_message(chat_id, msg, reply_markup=question_keyboard(safe_options), parse_mode='HTML')
+    started_at = time.time()
+    sent = await context.bot.send_message(chat_id, msg, reply_markup=question_keyboard(safe_options), parse_mode='HTML')
+    session.show(q_data, pattern_id, sent.message_id, started_at)
+    record_question_sent(session, len(pool))
@@ -1,8 +1,12 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from database.db_manager import db
-from utils.keyboards import category_keyboard, topic_keyboard, pattern_keyboard
-from handlers.practice_handler import start_custom_practice, handle_answer
+from utils.keyboards import category_keyboard, topic_keyboard, pattern_keyboard, page_query
+from handlers.practice_handler import start_custom_practice, handle_answer, show_explanation
+from utils.dedupe import is_duplicate_tap
+from utils.metrics import metrics
+from handlers.question_pool import mark_session_start
+from handlers.session import get_session
 
 async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     categories = db.get_categories()
@@ -13,15 +17,42 @@ async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text("Choose a GMAT category:", reply_markup=category_keyboard(categories))
 
+async def show_topics(query, category_id, token=None):
+    page = db.get_topics_page(category_id, **page_query(token))
+    if page is not None and not page['items'] and token:
+        page = db.get_topics_page(category_id) # Stale token, e.g. topics were removed
+    if page is None:
+        await query.message.edit_text("Database connection issue. Please try again.")
+        return
+    await query.message.edit_text("Select a Topic:", reply_markup=topic_keyboard(page, category_id))
+
+async def show_patterns(query, context, topic_id, token=None):
+    page = db.get_patterns_page(topic_id, **page_query(token))
+    if page is not None and not page['items'] and token:
+        page = db.get_patterns_page(topic_id)
+    if page is None:
+        await query.message.edit_text("Database connection issue. Please try again.")
+        return
+    selected_ids = context.user_data.get('selected_patterns', [])
+    await query.message.edit_text("Select Question Patterns:", reply_markup=pattern_keyboard(page, topic_id, selected_ids))
+
+@metrics.timed("handler_seconds", handler="callback")
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     data = query.data
 
+    # Session-start buttons kick off LLM batches, so ignore double taps
+    if data in ("start_practice_session", "retest_session", "start_daily_session") and is_duplicate_tap(query):
+        return
+
     if data.startswith("cat_"):
         cat_id = int(data.split('_')[1])
-        topics = db.get_topics(cat_id)
-        await query.message.edit_text("Select a Topic:", reply_markup=topic_keyboard(topics))
+        await show_topics(query, cat_id)
+
+    elif data.startswith("tpage_"):
+        _, cat_id, token = data.split('_')
+        await show_topics(query, int(cat_id), token)
 
     elif data == "back_to_cats":
         categories = db.get_categories()
@@ -29,19 +60,20 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif data.startswith("topic_"):
         topic_id = int(data.split('_')[1])
-        patterns = db.get_patterns(topic_id)
-        selected_ids = context.user_data.get('selected_patterns', [])
-        await query.message.edit_text("Select Question Patterns:", reply_markup=pattern_keyboard(patterns, selected_ids))
+        await show_patterns(query, context, topic_id)
+
+    elif data.startswith("ppage_"):
+        _, topic_id, token = data.split('_')
+        await show_patterns(query, context, int(topic_id), token)
 
     elif data.startswith("back_to_topics_"):
         # This needs a bit of logic to get the category_id from the topic_id
         # For simplicity, let's just show categories again or fetch cat_id
         topic_id_str = data.split('_')[-1]
         if topic_id_str:
-            res = db.execute_query("SELECT category_id FROM topics WHERE id = %s", (int(topic_id_str),))
-            if res:
-                topics = db.get_topics(res[0]['category_id'])
-                await query.message.edit_text("Select a Topic:", reply_markup=topic_keyboard(topics))
+            category_id = db.get_topic_category(int(topic_id_str))
+            if category_id:
+                await show_topics(query, category_id)
                 return
         categories = db.get_categories()
         await query.message.edit_text("Choose a GMAT category:", reply_markup=category_keyboard(categories))
@@ -50,6 +82,8 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parts = data.split('_')
         pattern_id = int(parts[1])
         topic_id = int(parts[2])
+        # Redraw the page the button was on; /search buttons carry none, so start at the pattern
+        token = parts[3] if len(parts) > 3 else f"a{pattern_id - 1}"
         
         if 'selected_patterns' not in context.user_data:
             context.user_data['selected_patterns'] = []
@@ -59,9 +93,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             context.user_data['selected_patterns'].append(pattern_id)
             
-        patterns = db.get_patterns(topic_id)
-        selected_ids = context.user_data['selected_patterns']
-        await query.message.edit_text("Select Question Patterns:", reply_markup=pattern_keyboard(patterns, selected_ids))
+        await show_patterns(query, context, topic_id, token)
 
     elif data == "start_practice_session":
         selected_ids = context.user_data.get('selected_patterns', [])
@@ -76,7 +108,13 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif data == "start_daily_session":
         from handlers.daily_v2_handler import trigger_daily_question
+        session = get_session(context, "daily")
+        if session:
+            mark_session_start(session)
         await trigger_daily_question(update, context)
 
     elif data.startswith("ans_"):
         await handle_answer(update, context)
+
+    elif data.startswith("explain_"):
+        await show_explanation(update, context)
@@ -1,27 +1,30 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from database.db_manager import db
-from llm.generator import generator
-from utils.keyboards import question_keyboard, main_menu_keyboard, session_complete_keyboard
+from utils.keyboards import question_keyboard, main_menu_keyboard, session_complete_keyboard, explanation_keyboard
+from handlers.question_pool import (
+    take_from_bank, pattern_batch_info, save_generated, start_prefetch, await_prefetch, mark_session_start, record_question_sent,
+    generation_deadline, generate_batch, fallback_questions, begin_generation, end_generation, abandon_prefetch,
+    bank_questions, explanation_for,
+)
+from handlers.session import start_session, get_session
+from utils.dedupe import is_duplicate_answer, is_duplicate_tap, forget_tap
+from utils.tracing import tracer
 import json
 import html
 import random
-import asyncio
 
 async def start_custom_practice(update: Update, context: ContextTypes.DEFAULT_TYPE, pattern_ids: list):
     # Initialize session
-    context.user_data['session_patterns'] = pattern_ids
-    context.user_data['session_score'] = 0
-    context.user_data['session_total_target'] = 20
-    context.user_data['session_current_index'] = 0
-    context.user_data['custom_pool'] = [] # Pool for batched questions
+    session = start_session(context, "custom", target=20, pattern_ids=pattern_ids)
+    mark_session_start(session)
     
     # Selection Summary
     pattern_names = []
     for pid in pattern_ids:
-        rows = db.execute_query("SELECT name FROM patterns WHERE id = %s", (pid,))
-        if rows:
-            pattern_names.append(rows[0]['name'])
+        p = db.get_pattern_info(pid)
+        if p:
+            pattern_names.append(p['name'])
     
     summary_text = "📋 <b>Your Selection:</b>\n"
     summary_text += "\n".join([f"• {html.escape(name)}" for name in pattern_names])
@@ -34,11 +37,13 @@ async def start_custom_practice(update: Update, context: ContextTypes.DEFAULT_TY
 
 import time
 
-async def _fill_custom_pool(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Internal helper to fill the question pool via LLM batch."""
-    pattern_ids = context.user_data.get('session_patterns', [])
+@tracer.traced("fill_custom_pool")
+async def _fill_custom_pool(update: Update, session, deadline_at=None):
+    """Internal helper to fill the question pool via LLM batch. With a deadline
+    (a user is waiting), falls back to questions that need no LLM call."""
+    pattern_ids = list(session.pattern_ids)
     if not pattern_ids:
-        return
+        return False, "No patterns selected"
         
     # Prepare patterns for the batch (try to be diverse)
     selected_for_batch = []
@@ -48,38 +53,44 @@ async def _fill_custom_pool(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Cycle through available patterns to fill 5 slots
         selected_for_batch = (pattern_ids * (5 // len(pattern_ids) + 1))[:5]
         
-    batch_patterns_info = []
+    tracer.annotate(pattern_ids=selected_for_batch)
     user_id = update.effective_user.id
-    for pid in selected_for_batch:
-        res = db.execute_query("SELECT p.id, p.name, p.description, p.difficulty_level, t.name as topic_name FROM patterns p JOIN topics t ON p.topic_id = t.id WHERE p.id = %s", (pid,))
-        if res:
-            p = res[0]
-            current_diff = db.get_current_difficulty(user_id, pid)
-            batch_patterns_info.append({
-                'id': p['id'],
-                'name': p['name'],
-                'topic_name': p['topic_name'],
-                'description': p['description'],
-                'difficulty': current_diff,
-                'avoid_questions': db.get_recent_questions(p['id'])
-            })
-    
-    questions, error = generator.generate_batch(batch_patterns_info, count=5)
+    to_generate = take_from_bank(user_id, selected_for_batch, session.pool)
+    if not to_generate:
+        return True, None
+
+    batch_patterns_info = [info for info in (pattern_batch_info(user_id, pid) for pid in to_generate) if info]
+    
+    # Runs the blocking LLM call off the event loop so other users keep being served
+    batch = begin_generation(session, to_generate)
+    questions, error = await generate_batch(batch_patterns_info, deadline_at, flow="custom")
+    if batch['abandoned']:
+        # The user was already served fallbacks for these patterns
+        bank_questions(questions, to_generate[0])
+        return True, None
+    end_generation(session, batch)
     if questions:
-        # Add to existing pool if any (unlikely to have any due to logic, but safer)
-        if 'custom_pool' not in context.user_data:
-            context.user_data['custom_pool'] = []
-        context.user_data['custom_pool'].extend(questions)
+        # Saved now, so the pool only has to keep their ids
+        for q in questions:
+            save_generated(user_id, q, to_generate[0])
+        session.pool.extend(questions)
         return True, None
-    return False, error
+    if deadline_at is not None:
+        fallback, _ = fallback_questions(user_id, to_generate, "custom")
+        session.pool.extend(fallback)
+    return bool(session.pool), error
 
 async def trigger_next_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    current_count = context.user_data.get('session_current_index', 0)
-    target_count = context.user_data.get('session_total_target', 5)
+    session = get_session(context, "custom")
+    if session is None:
+        await context.bot.send_message(update.effective_chat.id, "This session has ended. Pick your topics again to start a new one.")
+        return
+    current_count = session.index
+    target_count = session.target
     
     if current_count >= target_count:
         # Session Complete logic...
-        score = context.user_data.get('session_score', 0)
+        score = session.score
         final_msg = (
             f"🏁 <b>Session Complete!</b>\n\n"
             f"Your Final Score: <b>{score}/{target_count}</b>\n\n"
@@ -89,65 +100,64 @@ async def trigger_next_question(update: Update, context: ContextTypes.DEFAULT_TY
         await context.bot.send_message(chat_id, final_msg, reply_markup=session_complete_keyboard(), parse_mode='HTML')
         return
 
-    # Check question pool
-    pool = context.user_data.get('custom_pool', [])
+    # Check question pool; the user gets a question by the deadline one way or another
+    deadline_at = generation_deadline()
+    if not session.pool:
+        if not await await_prefetch(session, deadline_at):
+            abandon_prefetch(session, update.effective_user.id)
+    pool = session.pool
     if not pool:
         # Generate batch of 5 synchronously
         chat_id = update.effective_chat.id
         status_msg = await context.bot.send_message(chat_id, "<i>Generating a batch of questions... ⏳</i>", parse_mode='HTML')
         
-        success, error = await _fill_custom_pool(update, context)
+        success, error = await _fill_custom_pool(update, session, deadline_at)
         await status_msg.delete()
         
         if not success:
             await context.bot.send_message(chat_id, f"❌ <b>Batch Generation Error:</b>\n\n{html.escape(error or 'Empty response')}", parse_mode='HTML')
             return
-        
-        pool = context.user_data.get('custom_pool', [])
 
-    # Get next question from pool
-    q_data = pool.pop(0)
-    context.user_data['custom_pool'] = pool # Update pool in context
+    # Get next question from pool (its body is loaded only now)
+    q_data = pool.next_question()
+    if q_data is None:
+        await context.bot.send_message(update.effective_chat.id, "❌ <b>Batch Generation Error:</b>\n\nQuestions could not be loaded.", parse_mode='HTML')
+        return
     
     # Check if we should prefetch (if pool is empty and we have more questions to go)
     if not pool and (current_count + 1 < target_count):
         print("DEBUG: Prefetching next batch in background...")
-        asyncio.create_task(_fill_custom_pool(update, context))
+        start_prefetch(session, _fill_custom_pool(update, session))
     
-    # Save to context for answer checking
-    context.user_data['current_question'] = q_data
     # Use pattern_id from LLM response if provided, else fallback to random from session
-    pattern_id = q_data.get('pattern_id') or random.choice(context.user_data['session_patterns'])
-    context.user_data['current_pattern_id'] = pattern_id
+    pattern_id = q_data.get('pattern_id') or random.choice(session.pattern_ids)
     
     safe_question = html.escape(q_data['question_text'])
     safe_options = [html.escape(opt) for opt in q_data['options']]
-    
-    # Save to DB for uniqueness tracking
-    db.save_question(
-        pattern_id, 
-        q_data['question_text'], 
-        q_data['options'], 
-        q_data['correct_option_index'], 
-        q_data['explanation'], 
-        q_data.get('difficulty', 3)
-    )
 
     msg = f"<b>Question {current_count + 1}:</b>\n\n{safe_question}"
     chat_id = update.effective_chat.id
-    context.user_data['q_start_time'] = time.time() # Record start time
-    await context.bot.send_message(chat_id, msg, reply_markup=question_keyboard(safe_options), parse_mode='HTML')
+    started_at = time.time() # Record start time
+    sent = await context.bot.send_message(chat_id, msg, reply_markup=question_keyboard(safe_options), parse_mode='HTML')
+    # Remembered for answer checking
+    session.show(q_data, pattern_id, sent.message_id, started_at)
+    record_question_sent(session, len(pool))
 
 async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
+    session = get_session(context)
+    # Drop double taps / redelivered callbacks before touching the DB or generator
+    if is_duplicate_answer(query, session.message_id if session else None):
+        return
+    
     # Calculate time taken
-    start_time = context.user_data.get('q_start_time', time.time())
+    start_time = (session and session.question_started_at) or time.time()
     time_taken = time.time() - start_time
     
     user_ans = int(query.data.split('_')[1])
-    q_data = context.user_data.get('current_question')
+    q_data = session.current_question() if session else None
     print(f"DEBUG: handle_answer current_question: {bool(q_data)}")
     
     if not q_data:
@@ -158,16 +168,14 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     correct_option = q_data['options'][q_data['correct_option_index']]
     
     if is_correct:
-        context.user_data.setdefault('session_score', 0)
-        context.user_data['session_score'] += 1
+        session.score += 1
         res_msg = "✅ <b>Correct!</b>"
     else:
         res_msg = f"❌ <b>Incorrect.</b>\n\nCorrect Answer: {html.escape(str(correct_option))}"
     
-    context.user_data.setdefault('session_current_index', 0)
-    context.user_data['session_current_index'] += 1
+    session.index += 1
     
-    pattern_id = context.user_data.get('current_pattern_id')
+    pattern_id = session.current_pattern_id
     print(f"DEBUG: handle_answer pattern_id: {pattern_id}, is_correct: {is_correct}")
     
     # Update DB Progress (SRS)
@@ -183,22 +191,58 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception as db_err:
             print(f"DEBUG: db.update_user_progress error: {db_err}")
             await query.message.reply_text(f"⚠️ <b>Database Error:</b> {html.escape(str(db_err))}", parse_mode='HTML')
+        if q_data.get('id'):
+            db.record_question_attempt(update.effective_user.id, q_data['id'], pattern_id, is_correct)
     else:
         print("DEBUG: Missing current_pattern_id in session")
     
-    explanation = f"\n\n<b>Explanation:</b>\n{html.escape(q_data['explanation'])}"
+    if q_data.get('explanation'):
+        explanation = f"\n\n<b>Explanation:</b>\n{html.escape(q_data['explanation'])}"
+        reply_markup = None
+    else:
+        # Generated without one (LAZY_EXPLANATIONS): written only if the user asks
+        explanation = ""
+        reply_markup = explanation_keyboard(q_data['id']) if q_data.get('id') else None
     time_msg = f"\n\n⏱️ <b>Time taken:</b> {time_taken:.1f}s"
     
     # Send feedback
     try:
-        await query.message.edit_text(f"{res_msg}{time_msg}{explanation}", parse_mode='HTML')
+        await query.message.edit_text(f"{res_msg}{time_msg}{explanation}", reply_markup=reply_markup, parse_mode='HTML')
     except Exception:
         # Fallback if text is too long or other issues
-        await query.message.reply_text(f"{res_msg}{time_msg}{explanation}", parse_mode='HTML')
+        await query.message.reply_text(f"{res_msg}{time_msg}{explanation}", reply_markup=reply_markup, parse_mode='HTML')
     
     # Auto trigger next
-    if context.user_data.get('is_daily'):
+    if session.is_daily:
         from handlers.daily_v2_handler import trigger_daily_question
         await trigger_daily_question(update, context)
     else:
         await trigger_next_question(update, context)
+
+async def show_explanation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """'Show explanation' under an answered question. Writing one can take
+    seconds, so it runs in the background rather than holding up the user's
+    next answer."""
+    query = update.callback_query
+    if is_duplicate_tap(query):
+        return
+    question = db.get_question(int(query.data.split('_')[1]))
+    if not question:
+        await query.message.reply_text("That question is no longer available.")
+        return
+    context.application.create_task(_send_explanation(query, question))
+
+async def _send_explanation(query, question):
+    with tracer.span("send_explanation", question_id=question['id']):
+        text, error = await explanation_for(question)
+        if error or not text:
+            print(f"DEBUG: explanation for question {question['id']} failed: {error}")
+            forget_tap(query)
+            await query.message.reply_text("⚠️ Couldn't write the explanation right now, please try again.")
+            return
+        explanation = f"<b>Explanation:</b>\n{html.escape(text)}"
+        try:
+            # Append to the feedback message; the button goes away
+            await query.message.edit_text(f"{query.message.text_html}\n\n{explanation}", parse_mode='HTML')
+        except Exception:
+            await query.message.reply_text(explanation, parse_mode='HTML')
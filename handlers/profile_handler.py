@@ -1,8 +1,10 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from database.db_manager import db
+from utils.metrics import metrics
 import html
 
+@metrics.timed("handler_seconds", handler="profile")
 async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     first_name = html.escape(update.effective_user.first_name)
@@ -14,26 +16,10 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Get overall accuracy, mastery and time
-    stats = db.execute_query("""
-        SELECT 
-            COUNT(*) as total_patterns,
-            SUM(total_attempts) as total_attempts,
-            SUM(correct_attempts) as total_correct,
-            AVG(mastery_score) as avg_mastery,
-            AVG(avg_time_seconds) as avg_time
-        FROM user_progress 
-        WHERE user_id = %s
-    """, (user_id,))
-    
-    s = stats[0] if stats else None
+    s = db.get_profile_stats(user_id)
     
     # Get active 9-day cycles
-    active_cycles = db.execute_query("""
-        SELECT COUNT(*) as count 
-        FROM user_added_patterns 
-        WHERE user_id = %s AND added_at >= datetime('now', '-9 days')
-    """, (user_id,))
-    cycle_count = active_cycles[0]['count'] if active_cycles else 0
+    cycle_count = db.count_active_cycles(user_id)
 
     # If no practice records, total_attempts will be None
     if not s or s['total_attempts'] is None or s['total_attempts'] == 0:
@@ -43,15 +29,7 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     accuracy = (s['total_correct'] / s['total_attempts']) * 100 if s['total_attempts'] > 0 else 0
     
     # Get weak topics (top 3 with lowest mastery) + their current level
-    weak_topics = db.execute_query("""
-        SELECT t.name, up.mastery_score, up.last_difficulty_level
-        FROM user_progress up
-        JOIN patterns p ON up.pattern_id = p.id
-        JOIN topics t ON p.topic_id = t.id
-        WHERE up.user_id = %s
-        ORDER BY up.mastery_score ASC
-        LIMIT 3
-    """, (user_id,))
+    weak_topics = db.get_weak_topics(user_id, limit=3)
     
     weak_msg = "\n".join([f"- {html.escape(t['name'])}: <b>{round(t['mastery_score']*100)}%</b> (Lvl {t['last_difficulty_level'] or 1})" for t in weak_topics])
     
@@ -0,0 +1,267 @@
+import os
+import math
+import time
+import random
+import asyncio
+from database.db_manager import db, QUESTION_REUSE_MIN_UNSEEN
+from llm.generator import generator
+from utils.metrics import metrics, SIZE_BUCKETS
+from utils.tracing import tracer
+
+# Seconds a user waits for generation before being served a fallback question; 0 waits indefinitely
+GENERATION_DEADLINE = float(os.getenv("GENERATION_DEADLINE", 4))
+
+# Generation calls that outlived their deadline; kept referenced until their result is banked
+_late_calls = set()
+# Explanations being written, by question id, so users asking at once share one LLM call
+_explaining = {}
+# Patterns with a background bank top-up in flight, so concurrent sessions don't start another
+_topping_up = set()
+
+def pattern_batch_info(user_id, pattern_id):
+    """The generator.generate_batch entry for a pattern at the user's difficulty, or None."""
+    p = db.get_pattern_info(pattern_id)
+    if not p:
+        return None
+    return {
+        'id': p['id'],
+        'name': p['name'],
+        'topic_name': p['topic_name'],
+        'category_name': p.get('category_name'),
+        'description': p['description'],
+        'difficulty': db.get_current_difficulty(user_id, pattern_id),
+        'avoid_questions': db.get_recent_questions(p['id'])
+    }
+
+def take_from_bank(user_id, pattern_ids, pool):
+    """Serve a stored question the user hasn't seen for each pattern that has
+    one, and top the bank up in the background for patterns running low.
+    Returns the pattern ids that need generation."""
+    to_generate, running_low = [], []
+    for pid in pattern_ids:
+        stored, unseen_left = db.get_unseen_question(user_id, pid, db.get_current_difficulty(user_id, pid))
+        if stored:
+            pool.append(stored)
+            if unseen_left < QUESTION_REUSE_MIN_UNSEEN:
+                running_low.append(pid)
+        else:
+            to_generate.append(pid)
+
+    served = len(pattern_ids) - len(to_generate)
+    tracer.annotate(bank_hits=served, bank_misses=len(to_generate))
+    metrics.inc("questions_served_total", served, source="bank")
+    if served:
+        print(f"DEBUG: Served {served}/{len(pattern_ids)} questions from the shared question bank")
+    if running_low:
+        top_up_bank(user_id, running_low)
+    return to_generate
+
+def top_up_bank(user_id, pattern_ids):
+    """Generate questions for the patterns in the background and bank them,
+    so the user's next sessions still find unseen ones."""
+    pattern_ids = [pid for pid in dict.fromkeys(pattern_ids) if pid not in _topping_up]
+    patterns_info = [info for info in (pattern_batch_info(user_id, pid) for pid in pattern_ids) if info]
+    if not patterns_info:
+        return
+    _topping_up.update(pattern_ids)
+    metrics.inc("bank_top_ups_total", len(patterns_info))
+    call = asyncio.ensure_future(asyncio.to_thread(generator.generate_batch, patterns_info, count=len(patterns_info)))
+    _late_calls.add(call)
+    call.add_done_callback(lambda c: _topping_up.difference_update(pattern_ids))
+    call.add_done_callback(lambda c: _bank_late_result(c, patterns_info[0]['id']))
+
+def save_generated(user_id, q, fallback_pattern_id):
+    """Store a freshly generated question so it can be reused by other users."""
+    pattern_id = q['pattern_id'] = q.get('pattern_id') or fallback_pattern_id
+    q['id'] = db.save_question(
+        pattern_id,
+        q['question_text'],
+        q['options'],
+        q['correct_option_index'],
+        q['explanation'],
+        q.get('difficulty', 3)
+    )
+    if q['id']:
+        db.mark_question_seen(user_id, q['id'])
+    return q['id']
+
+def bank_questions(questions, fallback_pattern_id):
+    """Store generated questions nobody is waiting for, so later sessions can serve them."""
+    saved = 0
+    for q in questions:
+        pattern_id = q.get('pattern_id') or fallback_pattern_id
+        if db.save_question(pattern_id, q['question_text'], q['options'], q['correct_option_index'],
+                            q['explanation'], q.get('difficulty', 3)):
+            saved += 1
+    metrics.inc("generation_late_banked_total", saved)
+    return saved
+
+def generation_deadline():
+    """Event-loop time by which a waiting user must get a question (inf when disabled)."""
+    if GENERATION_DEADLINE <= 0:
+        return math.inf
+    return asyncio.get_running_loop().time() + GENERATION_DEADLINE
+
+def _remaining(deadline_at):
+    return max(0.0, deadline_at - asyncio.get_running_loop().time())
+
+def _bank_late_result(call, fallback_pattern_id):
+    _late_calls.discard(call)
+    if call.cancelled() or call.exception():
+        return
+    questions, _ = call.result()
+    if questions:
+        bank_questions(questions, fallback_pattern_id)
+
+async def generate_batch(patterns_info, deadline_at=None, flow=None):
+    """generator.generate_batch off the event loop.
+
+    With a deadline (from generation_deadline()) stop waiting when it passes:
+    the call carries on and its questions go to the bank, and this returns
+    ([], error) so the caller can serve fallbacks.
+    """
+    call = asyncio.ensure_future(asyncio.to_thread(generator.generate_batch, patterns_info, count=len(patterns_info)))
+    if deadline_at is None or deadline_at == math.inf:
+        return await call
+    try:
+        return await asyncio.wait_for(asyncio.shield(call), _remaining(deadline_at))
+    except asyncio.TimeoutError:
+        metrics.inc("generation_deadline_missed_total", flow=flow)
+        tracer.annotate(deadline_missed=True)
+        _late_calls.add(call)
+        call.add_done_callback(lambda c: _bank_late_result(c, patterns_info[0]['id']))
+        return [], f"Generation took longer than {GENERATION_DEADLINE:g}s"
+
+def _hybrid_for_topic(pattern_id, siblings=True):
+    info = db.get_pattern_info(pattern_id)
+    if not info:
+        return None
+    candidates = [p for p in db.get_patterns(info['topic_id']) or [] if generator._get_hybrid_type(p['name'])]
+    # The pattern itself when it has a generator, else (with `siblings`) another in the same topic
+    pattern = next((p for p in candidates if p['id'] == pattern_id), None)
+    if pattern is None and siblings and candidates:
+        pattern = random.choice(candidates)
+    if pattern is None:
+        return None
+    return {**generator.generate_hybrid(pattern['name']), 'pattern_id': pattern['id']}
+
+def _fallback_for(user_id, pattern_id, siblings_last):
+    """(question, source) for one pattern, or (None, "none")."""
+    stored, _ = db.get_unseen_question(user_id, pattern_id, db.get_current_difficulty(user_id, pattern_id))
+    if stored:
+        return stored, "bank"
+    hybrid = _hybrid_for_topic(pattern_id, siblings=not siblings_last)
+    if hybrid is None:
+        seen = db.get_seen_question(user_id, pattern_id)
+        if seen:
+            return seen, "seen"
+        if siblings_last:
+            hybrid = _hybrid_for_topic(pattern_id)
+    if hybrid is None:
+        return None, "none"
+    save_generated(user_id, hybrid, pattern_id)
+    return hybrid, "hybrid"
+
+def fallback_questions(user_id, pattern_ids, flow):
+    """Questions that need no LLM call, one per pattern where possible: an
+    unseen stored question, a hybrid question from the same topic, or the
+    stored question the user saw longest ago. Answers are credited to the
+    question's pattern, so in the daily flow, where each queued pattern is
+    due, a sibling's hybrid question comes only after the pattern's own seen
+    one. Returns (questions, pattern ids nothing was found for)."""
+    questions, missing = [], []
+    for pid in pattern_ids:
+        question, source = _fallback_for(user_id, pid, siblings_last=flow == "daily")
+        metrics.inc("generation_fallback_total", source=source, flow=flow)
+        if question:
+            questions.append(question)
+        else:
+            missing.append(pid)
+    tracer.annotate(fallbacks=len(questions))
+    return questions, missing
+
+async def _write_explanation(question):
+    text, error = await asyncio.to_thread(generator.generate_explanation, question)
+    if text:
+        db.save_explanation(question['id'], text)
+    return text, error
+
+async def explanation_for(question):
+    """The question's explanation: the stored one, or (for questions generated
+    without one) one written now and saved for everyone who asks later.
+    Returns (text, error)."""
+    if question.get('explanation'):
+        metrics.inc("explanations_served_total", source="stored")
+        return question['explanation'], None
+    qid = question['id']
+    call = _explaining.get(qid)
+    source = "coalesced" if call else "generated"
+    if call is None:
+        call = _explaining[qid] = asyncio.ensure_future(_write_explanation(question))
+        call.add_done_callback(lambda c: _explaining.pop(qid, None))
+    # Shielded so one user's cancelled update doesn't cancel the others' wait
+    text, error = await asyncio.shield(call)
+    metrics.inc("explanations_served_total", source=source if text else "failed")
+    return text, error
+
+def start_prefetch(session, fill_coroutine):
+    """Fill the pool in the background; remembered so the next question can wait for it."""
+    session.prefetch_task = asyncio.create_task(_traced_prefetch(fill_coroutine))
+
+async def _traced_prefetch(fill_coroutine):
+    # Outlives the update that started it, so it is exported as its own trace
+    with tracer.trace("prefetch"):
+        return await fill_coroutine
+
+async def await_prefetch(session, deadline_at=None):
+    """Wait for an in-flight background fill instead of starting a second one
+    (its queue items are already taken, so the queue alone looks finished).
+    Returns False if it is still running at the deadline."""
+    task = session.prefetch_task
+    if not task or task.done():
+        return True
+    if deadline_at is None or deadline_at == math.inf:
+        await task
+        return True
+    try:
+        await asyncio.wait_for(asyncio.shield(task), _remaining(deadline_at))
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+def begin_generation(session, pattern_ids):
+    """Register a fill's LLM batch so a waiting user can take over its patterns
+    (see abandon_prefetch); pair with end_generation."""
+    batch = {'patterns': list(pattern_ids), 'abandoned': False}
+    session.generating = batch
+    return batch
+
+def abandon_prefetch(session, user_id):
+    """The background fill missed the deadline: serve fallbacks for its
+    patterns now; the fill banks its questions when they arrive. Returns
+    the patterns nothing was found for."""
+    metrics.inc("generation_deadline_missed_total", flow=session.flow)
+    batch, session.generating = session.generating, None
+    if not batch:
+        return []
+    batch['abandoned'] = True
+    questions, missing = fallback_questions(user_id, batch['patterns'], session.flow)
+    session.pool.extend(questions)
+    return missing
+
+def end_generation(session, batch):
+    if session.generating is batch:
+        session.generating = None
+
+def mark_session_start(session):
+    """Start the clock for the time-to-first-question metric."""
+    session.started_at = time.perf_counter()
+
+def record_question_sent(session, pool_depth):
+    """Record how many questions were left buffered and, for the first question
+    of a session, how long the user waited for it."""
+    flow = session.flow
+    metrics.observe("question_pool_depth", pool_depth, buckets=SIZE_BUCKETS, flow=flow)
+    started, session.started_at = session.started_at, None
+    if started is not None:
+        metrics.observe("time_to_first_question_seconds", time.perf_counter() - started, flow=flow)
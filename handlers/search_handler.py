@@ -0,0 +1,52 @@
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from database.db_manager import db
+from utils.metrics import metrics
+import html
+import os
+
+# Results shown per section of /search
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", 5))
+# Shorter queries have too few trigrams to rank anything
+MIN_QUERY_CHARS = 3
+EXCERPT_CHARS = 80
+
+def excerpt(text, limit=EXCERPT_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def render_results(query_text, patterns, questions):
+    """Message text and keyboard for /search results. Each pattern gets a
+    button that selects it and opens its topic, as the pattern menu does."""
+    lines = [f"🔎 <b>Results for</b> \"{html.escape(query_text)}\""]
+    if patterns:
+        lines.append("\n<b>Patterns:</b>")
+        lines += [f"• {html.escape(p['name'])} <i>({html.escape(p['topic_name'])})</i>" for p in patterns]
+    if questions:
+        lines.append("\n<b>Questions:</b>")
+        lines += [f"• {html.escape(excerpt(q['question_text']))} <i>({html.escape(q['pattern_name'])})</i>" for q in questions]
+    if not patterns and not questions:
+        lines.append("\nNothing similar found. Try other words.")
+
+    keyboard = [
+        [InlineKeyboardButton(f"Practice: {excerpt(p['name'], 40)}", callback_data=f"togglepattern_{p['id']}_{p['topic_id']}")]
+        for p in patterns or []
+    ]
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard) if keyboard else None
+
+@metrics.timed("handler_seconds", handler="search")
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query_text = " ".join(context.args or []).strip()
+    if len(query_text) < MIN_QUERY_CHARS:
+        await update.message.reply_text("Usage: /search <words>, e.g. /search work rate")
+        return
+
+    patterns = db.search_patterns(query_text, limit=SEARCH_RESULTS)
+    questions = db.search_questions(query_text, limit=SEARCH_RESULTS)
+    if patterns is None and questions is None:
+        await update.message.reply_text("❌ <b>Database Error:</b> search is unavailable right now.", parse_mode='HTML')
+        return
+
+    metrics.inc("search_total", result="hit" if patterns or questions else "empty")
+    text, reply_markup = render_results(query_text, patterns, questions)
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
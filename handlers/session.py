@@ -0,0 +1,111 @@
+import weakref
+
+QUESTION_FIELDS = ("id", "pattern_id", "question_text", "options", "correct_option_index", "explanation", "difficulty")
+
+class PooledQuestion:
+    """A queued question's body, without the per-key overhead of a dict."""
+    __slots__ = QUESTION_FIELDS + ("__weakref__",)
+
+    def __init__(self, question):
+        for field in QUESTION_FIELDS:
+            setattr(self, field, question.get(field))
+        self.options = tuple(self.options or ())
+
+    def as_dict(self):
+        question = {field: getattr(self, field) for field in QUESTION_FIELDS}
+        question['options'] = list(self.options)
+        return question
+
+# Stored questions queued by any session, by id: users drawing the same one from
+# the bank share a record, which goes away once no pool holds it
+_pooled = weakref.WeakValueDictionary()
+
+class QuestionPool:
+    """Questions queued for a session.
+
+    Bodies stay in the pool, so serving one needs no DB read, but as
+    PooledQuestion records rather than dicts, and a stored question is kept
+    once however many pools hold it.
+    """
+    __slots__ = ("_items",)
+
+    def __init__(self):
+        self._items = [] # A few questions at most, so a list is smaller than a deque
+
+    def append(self, question):
+        qid = question.get('id')
+        record = _pooled.get(qid) if qid else None
+        if record is None:
+            record = PooledQuestion(question)
+            if qid:
+                _pooled[qid] = record
+        self._items.append(record)
+
+    def extend(self, questions):
+        for q in questions:
+            self.append(q)
+
+    def next_question(self):
+        """The next question's body; None when empty."""
+        if not self._items:
+            return None
+        return self._items.pop(0).as_dict()
+
+    def __len__(self):
+        return len(self._items)
+
+class PracticeSession:
+    """State of one daily or custom practice session, in user_data['session'].
+
+    Holds pattern ids, the question pool and small counters under fixed
+    slots; the question on screen is kept whole until it is answered.
+    Starting a session
+    replaces the previous one, so a prefetch still running for the old
+    session can't leak questions into the new one.
+    """
+    __slots__ = (
+        "flow", "pattern_ids", "queue", "review_patterns", "pool", "score", "index", "target",
+        "current", "current_pattern_id", "message_id", "question_started_at",
+        "started_at", "prefetch_task", "generating",
+    )
+
+    def __init__(self, flow, target, pattern_ids=(), queue=(), review_patterns=()):
+        self.flow = flow # "daily" or "custom"
+        self.pattern_ids = tuple(pattern_ids) # Custom: the selected patterns
+        self.queue = list(queue) # Daily: pattern ids still to batch, one per question
+        self.review_patterns = list(review_patterns) # Daily: SRS reviews served from the bank
+        self.pool = QuestionPool()
+        self.score = 0
+        self.index = 0 # Questions answered
+        self.target = target
+        self.current = None # The question on screen
+        self.current_pattern_id = None
+        self.message_id = None
+        self.question_started_at = None
+        self.started_at = None # perf_counter at session start, until the first question is sent
+        self.prefetch_task = None # Background pool fill, see question_pool.start_prefetch
+        self.generating = None # LLM batch a waiting user may take over, see question_pool.begin_generation
+
+    @property
+    def is_daily(self):
+        return self.flow == "daily"
+
+    def show(self, question, pattern_id, message_id, started_at):
+        self.current = question
+        self.current_pattern_id = pattern_id
+        self.message_id = message_id
+        self.question_started_at = started_at
+
+    def current_question(self):
+        return self.current
+
+def start_session(context, flow, target, **kwargs):
+    session = context.user_data['session'] = PracticeSession(flow, target, **kwargs)
+    return session
+
+def get_session(context, flow=None):
+    """The user's session, or None if there is none (of `flow`, when given)."""
+    session = context.user_data.get('session')
+    if session is None or (flow and session.flow != flow):
+        return None
+    return session
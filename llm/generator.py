@@ -1,16 +1,142 @@
 import os
+import time
 import random
 import json
-from groq import Groq
+import logging
 from dotenv import load_dotenv
 from llm.hybrid_gen import hybrid_generator
+from llm.prompts import prompt_builder
+from llm.providers import provider_from_env
+from llm.resilience import ResilientProvider
+from llm.routing import ModelRouter
+from utils.metrics import metrics, SIZE_BUCKETS, TOKEN_BUCKETS
+from utils.tracing import tracer
 
 load_dotenv()
 
+# Generate LLM questions without explanations; generate_explanation writes one when a user asks
+LAZY_EXPLANATIONS = os.getenv("LAZY_EXPLANATIONS", "0") == "1"
+
+def check_question(q, explained=True):
+    """Raise ValueError unless `q` is a servable MCQ dict (`explained=False`
+    for lazily generated questions, which come without an explanation)."""
+    if not isinstance(q, dict):
+        raise ValueError("question is not an object")
+    if not isinstance(q.get("question_text"), str) or not q["question_text"].strip():
+        raise ValueError("missing question_text")
+    options = q.get("options")
+    if not isinstance(options, list) or len(options) != 4:
+        raise ValueError("options must be a list of 4")
+    index = q.get("correct_option_index")
+    if not isinstance(index, int) or not 0 <= index < 4:
+        raise ValueError("correct_option_index out of range")
+    if explained and not isinstance(q.get("explanation"), str):
+        raise ValueError("missing explanation")
+
+def _mcq_checker(explained=True):
+    def check(content):
+        check_question(json.loads(content), explained)
+    return check
+
+def _batch_checker(pattern_ids, explained=True):
+    def check(content):
+        data = json.loads(content)
+        questions = data.get("questions") if isinstance(data, dict) else data
+        if not isinstance(questions, list):
+            raise ValueError("no questions array")
+        for q in questions:
+            check_question(q, explained)
+        if sorted(q.get("pattern_id") for q in questions) != sorted(pattern_ids):
+            raise ValueError("pattern ids don't match the request")
+    return check
+
+def _check_restructure(content):
+    data = json.loads(content)
+    if not isinstance(data, dict) or not data.get("name") or not data.get("description"):
+        raise ValueError("missing name or description")
+
+def _check_explanation(content):
+    data = json.loads(content)
+    if not isinstance(data, dict) or not isinstance(data.get("explanation"), str) or not data["explanation"].strip():
+        raise ValueError("missing explanation")
+
+def _unexplained(q):
+    """Lazily generated question: no explanation until someone asks for one."""
+    if isinstance(q, dict):
+        q["explanation"] = q.get("explanation") or None
+    return q
+
 class QuestionGenerator:
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.model = "openai/gpt-oss-120b" # Latest model
+    def __init__(self, provider=None, prompts=None, router=None, lazy_explanations=None):
+        # LLM_PROVIDER=local swaps Groq for the offline stand-in in llm/providers.py;
+        # retries, hedging and the circuit breaker (llm/resilience.py) wrap either
+        self.provider = provider or ResilientProvider(provider_from_env())
+        # Budgeted prompt construction (PROMPT_TOKEN_BUDGET), see llm/prompts.py
+        self.prompts = prompts or prompt_builder
+        # Per-request model choice (LLM_SMALL_MODEL etc.), see llm/routing.py
+        self.router = router or ModelRouter(large_model=self.provider.model)
+        self.lazy_explanations = LAZY_EXPLANATIONS if lazy_explanations is None else lazy_explanations
+
+    @property
+    def model(self):
+        return self.provider.model
+
+    def _complete(self, task, prompt, model=None):
+        """Run one JSON chat completion for a built Prompt and record its latency and token usage."""
+        model = model or self.model
+        if prompt.trimmed:
+            metrics.inc("prompt_trimmed_total", task=task, level=str(prompt.trim_level))
+        started = time.perf_counter()
+        with tracer.span("llm.request", task=task, model=model, prompt_tokens_estimate=prompt.tokens,
+                         trim_level=prompt.trim_level) as span:
+            try:
+                completion = self.provider.complete(prompt.system, prompt.user, model=model)
+            except Exception:
+                metrics.inc("llm_errors_total", task=task, model=model)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.observe("llm_request_seconds", elapsed, task=task, model=model)
+
+        if completion.completion_tokens is not None:
+            span.set(prompt_tokens=completion.prompt_tokens, completion_tokens=completion.completion_tokens)
+            metrics.inc("llm_tokens_total", completion.prompt_tokens, kind="prompt", task=task)
+            metrics.inc("llm_tokens_total", completion.completion_tokens, kind="completion", task=task)
+            metrics.observe("llm_prompt_tokens", completion.prompt_tokens, buckets=TOKEN_BUCKETS, task=task)
+            metrics.observe("llm_completion_tokens", completion.completion_tokens, buckets=TOKEN_BUCKETS, task=task)
+        # Usage comes from the API response; the estimate shows how far the budget's heuristic is off
+        logging.info(
+            f"LLM {task} on {model}: {elapsed:.2f}s prompt_tokens={completion.prompt_tokens} "
+            f"(estimated {prompt.tokens}, trim level {prompt.trim_level}) completion_tokens={completion.completion_tokens}"
+        )
+        return completion.content
+
+    def _routed(self, task, prompt, check, difficulty=None, categories=()):
+        """Content from the routed model. Output from the small model that fails
+        `check` (or an API error) is retried once on the large model, whose
+        output is returned unchecked as before routing existed."""
+        model = self.router.choose(task, difficulty, categories)
+        if model != self.router.large_model:
+            started = time.perf_counter()
+            try:
+                content = self._complete(task, prompt, model)
+                check(content)
+            except Exception as e:
+                self.router.observe(model, task, difficulty, failed=True)
+                metrics.inc("llm_fallback_total", task=task, reason=type(e).__name__)
+                logging.warning(f"LLM {task} on {model} failed ({e}), retrying on {self.router.large_model}")
+            else:
+                self.router.observe(model, task, difficulty, time.perf_counter() - started)
+                return content
+
+        started = time.perf_counter()
+        try:
+            content = self._complete(task, prompt, self.router.large_model)
+        except Exception:
+            self.router.observe(self.router.large_model, task, difficulty, failed=True)
+            raise
+        self.router.observe(self.router.large_model, task, difficulty, time.perf_counter() - started)
+        return content
 
     def _get_hybrid_type(self, pattern_name):
         """Map exact pattern names to hybrid generator methods (case-insensitive)."""
@@ -39,7 +165,14 @@ class QuestionGenerator:
             return "applied_percentages"
         return None
 
-    def generate_mcq(self, topic_name, pattern_name, pattern_description, difficulty, avoid_questions=None):
+    def generate_hybrid(self, pattern_name):
+        """A template question for a hybrid pattern, or None if the pattern has no generator."""
+        hybrid_type = self._get_hybrid_type(pattern_name)
+        if hybrid_type is None:
+            return None
+        return getattr(hybrid_generator, f"generate_{hybrid_type}")()
+
+    def generate_mcq(self, topic_name, pattern_name, pattern_description, difficulty, avoid_questions=None, category_name=None):
         # Check for Hybrid Patterns first
         hybrid_type = self._get_hybrid_type(pattern_name)
         if hybrid_type == "mixed_fraction":
@@ -65,76 +198,37 @@ class QuestionGenerator:
         elif hybrid_type == "applied_percentages":
             return hybrid_generator.generate_applied_percentages(), None
 
-        if not os.getenv("GROQ_API_KEY"):
+        if not self.provider.ready:
             return None, "Groq API key is missing. Please check your .env file."
 
-        avoid_text = ""
-        if avoid_questions:
-            avoid_text = "\n\nCRITICAL: Avoid generating these exact scenarios or questions. I have already used them:\n" + "\n".join([f"- {q[:500]}" for q in avoid_questions])
-
-        prompt = f"""
-        You are a GMAT and CAT (Common Admission Test) Master Tutor. 
-        Your task is to generate a high-quality, exam-standard Multiple Choice Question (MCQ).
-        
-        Topic: {topic_name}
-        Pattern: {pattern_name}
-        Description: {pattern_description}
-        Target Difficulty: {difficulty}/5
-
-        EXAM STANDARDS:
-        1. Use complex, multi-step reasoning similar to official GMAT/CAT questions.
-        2. Ensure distractors (wrong options) are plausible and based on common student errors.
-        3. The explanation MUST be deep, covering the logic of the correct answer and a refutation of all wrong answers.
-        
-        Rules:
-        1. Always provide exactly 4 options (A, B, C, D).
-        2. Output format MUST be a valid JSON object with the following keys:
-           "question_text": "text",
-           "options": ["A", "B", "C", "D"],
-           "correct_option_index": 0-3,
-           "explanation": "detailed reasoning",
-           "difficulty": integer 1-5
-        
-        {avoid_text}
+        explained = not self.lazy_explanations
+        prompt = self.prompts.mcq(topic_name, pattern_name, pattern_description, difficulty, avoid_questions, explained)
         
-        Response should ONLY be the JSON object.
-        """
-        
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional GMAT tutor assistant. You output only structured JSON.",
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=self.model,
-                response_format={"type": "json_object"},
-            )
-            
-            content = chat_completion.choices[0].message.content
+        with tracer.span("generate_mcq", pattern=pattern_name, difficulty=difficulty, avoid=len(avoid_questions or [])):
             try:
-                result = json.loads(content)
-                return result, None
-            except json.JSONDecodeError:
-                return None, f"LLM returned invalid JSON logic. Content: {content[:200]}..."
+                content = self._routed("mcq", prompt, _mcq_checker(explained), difficulty, [category_name])
+                try:
+                    result = json.loads(content)
+                    return result if explained else _unexplained(result), None
+                except json.JSONDecodeError as e:
+                    tracer.record_error(e)
+                    return None, f"LLM returned invalid JSON logic. Content: {content[:200]}..."
 
-        except Exception as e:
-            error_msg = f"Groq API Error: {str(e)}"
-            if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                error_msg += f" | Details: {e.response.text}"
-            return None, error_msg
+            except Exception as e:
+                tracer.record_error(e)
+                error_msg = f"Groq API Error: {str(e)}"
+                if hasattr(e, 'response') and hasattr(e.response, 'text'):
+                    error_msg += f" | Details: {e.response.text}"
+                return None, error_msg
 
     def generate_batch(self, patterns_info, count=5):
         """
         patterns_info: List of dicts with {topic_name, name, description, difficulty, avoid_questions, id}
+                       and optionally category_name, used for model routing
         """
         results = []
         ai_patterns = []
+        metrics.observe("generation_batch_size", len(patterns_info), buckets=SIZE_BUCKETS)
         
         # Split into Hybrid and AI
         for p in patterns_info:
@@ -164,98 +258,59 @@ class QuestionGenerator:
             else:
                 ai_patterns.append(p)
 
+        metrics.inc("questions_generated_total", len(results), source="hybrid")
         if not ai_patterns:
             return results, None
 
-        if not os.getenv("GROQ_API_KEY"):
+        if not self.provider.ready:
             return results, "Groq API key is missing."
 
-        patterns_text = ""
-        for p in ai_patterns:
-            avoid_text = ""
-            if p.get('avoid_questions'):
-                avoid_text = "\n   - Avoid these previous scenarios: " + ", ".join([q[:200] for q in p['avoid_questions']])
-            
-            patterns_text += f"""
---- PATTERN ID: {p['id']} ---
-Topic: {p['topic_name']}
-Pattern: {p['name']}
-Description: {p['description']}
-Difficulty: {p['difficulty']}/5{avoid_text}
-"""
-
-        prompt = f"""
-        You are a GMAT and CAT (Common Admission Test) Master Tutor. 
-        Your task is to generate exactly {len(ai_patterns)} unique, high-quality, exam-standard MCQs.
-        
-        CRITICAL INSTRUCTIONS:
-        1. For EACH Pattern ID listed below, you must generate EXACTLY ONE original question.
-        2. EXAM STANDARDS: Use complex, multi-step reasoning. Ensure distractors are plausible and based on common student errors.
-        3. EXPLANATIONS: Provide deep reasoning for the correct answer and clear refutations for all wrong options.
-
-        PATTERNS TO USE:
-        {patterns_text}
-
-        Rules:
-        1. Always provide 4 options (A, B, C, D).
-        2. Output format MUST be a valid JSON object with a key "questions" containing an array of objects.
-        
-        Each object should have:
-           "question_text": "text",
-           "options": ["A", "B", "C", "D"],
-           "correct_option_index": 0-3 Integer,
-           "explanation": "detailed reasoning",
-           "difficulty": integer 1-5,
-           "pattern_id": integer (MUST MATCH THE PATTERN ID FROM THE LIST ABOVE)
-        """
+        explained = not self.lazy_explanations
+        prompt = self.prompts.batch(ai_patterns, explained)
         
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a professional GMAT tutor assistant. You output only structured JSON arrays."},
-                    {"role": "user", "content": prompt}
-                ],
-                model=self.model,
-                response_format={"type": "json_object"}, 
-            )
-            content = chat_completion.choices[0].message.content
-            batch_res = json.loads(content)
+        span_attributes = {"pattern_ids": [p['id'] for p in ai_patterns], "batch_size": len(ai_patterns),
+                           "hybrid": len(results), "explained": explained}
+        with tracer.span("generate_batch", **span_attributes):
+            try:
+                content = self._routed(
+                    "batch", prompt, _batch_checker([p['id'] for p in ai_patterns], explained),
+                    max(p['difficulty'] for p in ai_patterns), [p.get('category_name') for p in ai_patterns]
+                )
+                batch_res = json.loads(content)
             
-            if isinstance(batch_res, dict) and "questions" in batch_res:
-                results.extend(batch_res["questions"])
-            elif isinstance(batch_res, list):
-                results.extend(batch_res)
+                hybrid_count = len(results)
+                generated = []
+                if isinstance(batch_res, dict) and "questions" in batch_res:
+                    generated = batch_res["questions"]
+                elif isinstance(batch_res, list):
+                    generated = batch_res
+                results.extend(generated if explained else [_unexplained(q) for q in generated])
+                metrics.inc("questions_generated_total", len(results) - hybrid_count, source="llm")
             
-            return results, None
-        except Exception as e:
-            return results, str(e)
+                return results, None
+            except Exception as e:
+                tracer.record_error(e)
+                return results, str(e)
+
+    def generate_explanation(self, question):
+        """Explanation for a question generated without one. Returns (text, error)."""
+        if not self.provider.ready:
+            return None, "Groq API key is missing."
+
+        prompt = self.prompts.explanation(question)
+        with tracer.span("generate_explanation", question_id=question.get('id')):
+            try:
+                content = self._routed("explain", prompt, _check_explanation, question.get('difficulty'))
+                return json.loads(content)["explanation"], None
+            except Exception as e:
+                tracer.record_error(e)
+                return None, str(e)
 
     def restructure_pattern(self, raw_text):
-        prompt = f"""
-        A student wants to add a new GMAT practice pattern, but their description is messy.
-        Restructure it into a professional GMAT pattern name and a concise description.
-        Also, estimate the difficulty level from 1 to 5.
-        
-        User Input: "{raw_text}"
-        
-        Rules:
-        1. "name": Professional, short name for the concept.
-        2. "description": 1-2 sentences explaining what the pattern covers.
-        3. "difficulty": 1-5 integer.
-        
-        Output format: JSON object with keys "name", "description", "difficulty".
-        """
+        prompt = self.prompts.restructure(raw_text)
         
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a GMAT curriculum expert. Output only structured JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                model=self.model,
-                response_format={"type": "json_object"},
-            )
-            content = chat_completion.choices[0].message.content
+            content = self._routed("restructure", prompt, _check_restructure)
             return json.loads(content), None
         except Exception as e:
             return None, str(e)
@@ -30,7 +30,8 @@ class HybridGenerator:
         # Distractors
         options = [correct]
         while len(options) < 4:
-            w = max(1, whole + random.randint(-2, 2))
+            # +3 keeps four distinct wholes when denom is 2 and the remainder can't vary
+            w = max(1, whole + random.randint(-2, 3))
             r = max(1, rem + random.randint(-3, 3)) % denom
             if r == 0: r = 1
             opt = f"{w}({r}/{denom})"
@@ -445,7 +446,9 @@ class HybridGenerator:
                 alt = ":".join(map(str, parts))
                 if alt not in options: options.append(alt)
                 else: 
-                    alt = f"{parts[0]+1}:{parts[1]+1}" + (f":{parts[2]+1}" if len(parts)>2 else "")
+                    # Bump one term; shuffling alone can't make distractors for ratios like 1:1:1
+                    parts[random.randrange(len(parts))] += random.randint(1, 2)
+                    alt = ":".join(map(str, parts))
                     if alt not in options: options.append(alt)
             elif "%" in correct:
                 val = float(correct.replace("%", ""))
@@ -574,7 +577,7 @@ class HybridGenerator:
             else:
                 val = float(correct)
                 alt_val = val + random.choice([-20, -10, 10, 20, -val*0.1, val*0.1])
-                alt_val = max(1, alt_val)
+                alt_val = max(1.0, alt_val)
                 alt = str(int(alt_val)) if alt_val.is_integer() else str(round(alt_val, 2))
                 if alt not in options: options.append(alt)
         
@@ -687,7 +690,9 @@ class HybridGenerator:
             else:
                 val = float(correct)
                 alt_val = val + random.choice([-20, -10, 10, 20, -min(10, val*0.1), min(10, val*0.1), 1, -1])
-                alt_val = max(0, alt_val)
+                if val >= 0:
+                    # Float bound: int has no is_integer() before Python 3.12
+                    alt_val = max(0.0, alt_val)
                 alt = str(int(alt_val)) if alt_val.is_integer() else str(round(alt_val, 4))
                 if alt not in options: options.append(alt)
         
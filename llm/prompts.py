@@ -0,0 +1,176 @@
+import os
+from llm.providers import estimate_tokens
+
+# Max estimated tokens (system + user message) per request; 0 disables trimming
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 3000))
+
+# Static instructions go in the system message, so every request of a task
+# starts with the same prefix (cacheable by the API) and only the
+# pattern-specific part varies.
+MCQ_TEMPLATE = """You are a professional GMAT and CAT (Common Admission Test) tutor. You output only structured JSON.
+Generate one high-quality, exam-standard Multiple Choice Question (MCQ) for the pattern in the user message.
+
+EXAM STANDARDS:
+1. Use complex, multi-step reasoning similar to official GMAT/CAT questions.
+2. Distractors (wrong options) must be plausible and based on common student errors.{explanation_rule}
+
+RULES:
+1. Always provide exactly 4 options (A, B, C, D).
+2. Respond ONLY with a JSON object with the keys:
+   "question_text": "text",
+   "options": ["A", "B", "C", "D"],
+   "correct_option_index": 0-3,{explanation_key}
+   "difficulty": integer 1-5
+3. Never reuse a scenario listed under "Avoid"."""
+
+BATCH_TEMPLATE = """You are a professional GMAT and CAT (Common Admission Test) tutor. You output only structured JSON arrays.
+Generate unique, high-quality, exam-standard MCQs for the patterns in the user message.
+
+CRITICAL INSTRUCTIONS:
+1. For EACH Pattern ID listed, generate EXACTLY ONE original question.
+2. EXAM STANDARDS: Use complex, multi-step reasoning. Distractors must be plausible and based on common student errors.
+3. Never reuse a scenario listed under a pattern's "Avoid".{explanation_rule}
+
+RULES:
+1. Always provide 4 options (A, B, C, D).
+2. Respond ONLY with a JSON object with a key "questions" holding an array of objects, each with:
+   "question_text": "text",
+   "options": ["A", "B", "C", "D"],
+   "correct_option_index": 0-3 Integer,{explanation_key}
+   "difficulty": integer 1-5,
+   "pattern_id": integer (MUST MATCH THE PATTERN ID IT WAS GENERATED FOR)"""
+
+MCQ_SYSTEM = MCQ_TEMPLATE.format(
+    explanation_rule="\n3. The explanation MUST be deep: the logic of the correct answer and a refutation of every wrong answer.",
+    explanation_key='\n   "explanation": "detailed reasoning",',
+)
+BATCH_SYSTEM = BATCH_TEMPLATE.format(
+    explanation_rule="\n4. EXPLANATIONS: Deep reasoning for the correct answer and clear refutations of all wrong options.",
+    explanation_key='\n   "explanation": "detailed reasoning",',
+)
+# LAZY_EXPLANATIONS: no explanation is asked for up front, roughly halving
+# completion tokens; EXPLAIN_SYSTEM writes one when a user asks for it
+MCQ_SYSTEM_LAZY = MCQ_TEMPLATE.format(explanation_rule="", explanation_key="")
+BATCH_SYSTEM_LAZY = BATCH_TEMPLATE.format(explanation_rule="", explanation_key="")
+
+EXPLAIN_SYSTEM = """You are a professional GMAT and CAT (Common Admission Test) tutor. You output only structured JSON.
+Explain the multiple choice question in the user message to a student who just answered it.
+Give deep reasoning for the correct answer and a clear refutation of every wrong option.
+Respond ONLY with a JSON object with the key "explanation": "detailed reasoning"."""
+
+RESTRUCTURE_SYSTEM = """You are a GMAT curriculum expert. Output only structured JSON.
+A student describes a new practice pattern, often messily. Restructure it into:
+1. "name": Professional, short name for the concept.
+2. "description": 1-2 sentences explaining what the pattern covers.
+3. "difficulty": 1-5 integer estimate.
+Output format: JSON object with keys "name", "description", "difficulty"."""
+
+# Successively tighter limits tried until a prompt fits the budget:
+# (avoid items kept per pattern, chars per avoid item, chars per description); None = unlimited
+TRIM_LEVELS = [
+    (None, 200, None),
+    (20, 160, None),
+    (10, 120, 600),
+    (5, 80, 300),
+    (3, 60, 200),
+    (0, 0, 120),
+]
+
+def shorten(text, limit):
+    """Collapse whitespace and cut at a word boundary to at most `limit` chars."""
+    text = " ".join(str(text or "").split())
+    if limit is None or len(text) <= limit:
+        return text
+    cut = text[:max(0, limit - 1)]
+    # Prefer a word boundary unless that would drop much of the allowance
+    head = cut.rsplit(" ", 1)[0]
+    return (head if len(head) >= len(cut) * 0.8 else cut) + "…"
+
+class Prompt:
+    """A built request: the messages plus what fitting it to the budget cost."""
+    __slots__ = ("system", "user", "tokens", "trim_level")
+
+    def __init__(self, system, user, trim_level=0):
+        self.system = system
+        self.user = user
+        self.tokens = estimate_tokens(system) + estimate_tokens(user)
+        self.trim_level = trim_level
+
+    @property
+    def trimmed(self):
+        return self.trim_level > 0
+
+class PromptBuilder:
+    """Builds generation prompts within a per-request token budget.
+
+    Avoid lists (newest first) are cut to fewer, shorter excerpts before
+    pattern descriptions are shortened; the static instructions are never
+    touched.
+    """
+
+    def __init__(self, token_budget=None):
+        self.token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+
+    @staticmethod
+    def _avoid_lines(avoid_questions, max_items, max_chars):
+        if not avoid_questions or max_items == 0:
+            return []
+        items = avoid_questions if max_items is None else avoid_questions[:max_items]
+        return [shorten(q, max_chars) for q in items]
+
+    def _fit(self, system, render):
+        """The first TRIM_LEVELS rendering of `render(level)` that fits, else the tightest."""
+        for level, limits in enumerate(TRIM_LEVELS):
+            prompt = Prompt(system, render(*limits), level)
+            if not self.token_budget or prompt.tokens <= self.token_budget:
+                return prompt
+        return prompt
+
+    def mcq(self, topic_name, pattern_name, description, difficulty, avoid_questions=None, explained=True):
+        def render(max_items, max_chars, max_description):
+            lines = [
+                f"Topic: {topic_name}",
+                f"Pattern: {pattern_name}",
+                f"Description: {shorten(description, max_description)}",
+                f"Target Difficulty: {difficulty}/5",
+            ]
+            avoid = self._avoid_lines(avoid_questions, max_items, max_chars)
+            if avoid:
+                lines.append("Avoid (already used):")
+                lines += [f"- {q}" for q in avoid]
+            return "\n".join(lines)
+        return self._fit(MCQ_SYSTEM if explained else MCQ_SYSTEM_LAZY, render)
+
+    def batch(self, patterns, explained=True):
+        def render(max_items, max_chars, max_description):
+            blocks = [f"Generate exactly {len(patterns)} questions, one per pattern below."]
+            for p in patterns:
+                block = (
+                    f"--- PATTERN ID: {p['id']} ---\n"
+                    f"Topic: {p['topic_name']}\n"
+                    f"Pattern: {p['name']}\n"
+                    f"Description: {shorten(p['description'], max_description)}\n"
+                    f"Difficulty: {p['difficulty']}/5"
+                )
+                avoid = self._avoid_lines(p.get('avoid_questions'), max_items, max_chars)
+                if avoid:
+                    block += "\nAvoid: " + " | ".join(avoid)
+                blocks.append(block)
+            return "\n\n".join(blocks)
+        return self._fit(BATCH_SYSTEM if explained else BATCH_SYSTEM_LAZY, render)
+
+    def restructure(self, raw_text):
+        def render(max_items, max_chars, max_description):
+            return f'User Input: "{shorten(raw_text, max_description)}"'
+        return self._fit(RESTRUCTURE_SYSTEM, render)
+
+    def explanation(self, question):
+        labels = "ABCD"
+        def render(max_items, max_chars, max_description):
+            lines = [f"Question: {question['question_text']}", "Options:"]
+            lines += [f"{labels[i]}. {option}" for i, option in enumerate(question['options'])]
+            lines.append(f"Correct answer: {labels[question['correct_option_index']]}")
+            return "\n".join(lines)
+        return self._fit(EXPLAIN_SYSTEM, render)
+
+prompt_builder = PromptBuilder()
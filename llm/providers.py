@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import namedtuple
+from groq import Groq
+from llm.routing import LARGE_MODEL
+
+# What a provider returns for one chat completion
+Completion = namedtuple("Completion", ["content", "prompt_tokens", "completion_tokens"])
+
+PATTERN_ID_RE = re.compile(r"PATTERN ID: (\d+)")
+OPTION_RE = re.compile(r"^([A-D])\. (.*)$", re.MULTILINE)
+CORRECT_RE = re.compile(r"^Correct answer: ([A-D])$", re.MULTILINE)
+
+class RateLimitError(Exception):
+    """Raised by the local provider to mimic an HTTP 429 from the API."""
+    status_code = 429
+
+def estimate_tokens(text):
+    # Rough English average, good enough for usage accounting
+    return max(1, len(text) // 4)
+
+class GroqProvider:
+    """Chat completions from the Groq API in JSON mode."""
+    name = "groq"
+
+    def __init__(self, model="openai/gpt-oss-120b", max_retries=0):
+        self.model = model
+        # Retries, with hedging and a circuit breaker, are done by llm/resilience.py
+        self.max_retries = max_retries
+        self._client = None
+
+    @property
+    def ready(self):
+        return bool(os.getenv("GROQ_API_KEY"))
+
+    @property
+    def client(self):
+        # Created on first use so importing the generator doesn't need a key
+        if self._client is None:
+            self._client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=self.max_retries)
+        return self._client
+
+    def complete(self, system_prompt, prompt, model=None):
+        chat_completion = self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            model=model or self.model,
+            response_format={"type": "json_object"},
+        )
+        usage = getattr(chat_completion, "usage", None)
+        return Completion(
+            chat_completion.choices[0].message.content,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+        )
+
+class LocalProvider:
+    """Deterministic offline stand-in returning schema-valid question JSON.
+
+    Content comes from a seeded RNG, so the same seed and call sequence give
+    the same questions. `latency`/`jitter` (seconds) sleep before answering,
+    plus `token_latency` per completion token to model decode time;
+    `malformed_rate` truncates the JSON and `rate_limit_rate` raises
+    RateLimitError, to exercise the batching and retry paths.
+    """
+    name = "local"
+    ready = True
+
+    def __init__(self, seed=None, latency=0.0, jitter=0.0, malformed_rate=0.0, rate_limit_rate=0.0, model="local",
+                 token_latency=0.0):
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.malformed_rate = malformed_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock() # The generator is called from worker threads
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            seed=int(os.environ["LOCAL_LLM_SEED"]) if os.getenv("LOCAL_LLM_SEED") else None,
+            latency=float(os.getenv("LOCAL_LLM_LATENCY", 0)),
+            jitter=float(os.getenv("LOCAL_LLM_JITTER", 0)),
+            malformed_rate=float(os.getenv("LOCAL_LLM_MALFORMED_RATE", 0)),
+            rate_limit_rate=float(os.getenv("LOCAL_LLM_RATE_LIMIT_RATE", 0)),
+            token_latency=float(os.getenv("LOCAL_LLM_TOKEN_LATENCY", 0)),
+        )
+
+    @staticmethod
+    def explain(question_text, options, correct_index):
+        """A deep-style explanation: the correct answer, then a refutation of each distractor."""
+        labels = "ABCD"
+        parts = [f"{question_text} The correct answer is {labels[correct_index]} ({options[correct_index]}): "
+                 "work through the calculation step by step and check the result against the question."]
+        for i, option in enumerate(options):
+            if i != correct_index:
+                parts.append(f"{labels[i]} ({option}) is wrong: it is what a common slip gives, such as a dropped "
+                             "carry or a skipped step, so it fails that check.")
+        return " ".join(parts)
+
+    def question(self, pattern_id=None, difficulty=3, explained=True):
+        rng = self.rng
+        a, b = rng.randint(2, 99), rng.randint(2, 99)
+        answer = a * b
+        options = [answer, answer + rng.randint(1, 9), answer - rng.randint(1, 9), answer + 10 * rng.randint(1, 5)]
+        rng.shuffle(options)
+        question = {
+            "question_text": f"What is {a} x {b}?",
+            "options": [str(o) for o in options],
+            "correct_option_index": options.index(answer),
+            "difficulty": difficulty,
+        }
+        if explained:
+            question["explanation"] = self.explain(question["question_text"], question["options"], question["correct_option_index"])
+        if pattern_id is not None:
+            question["pattern_id"] = pattern_id
+        return question
+
+    def respond(self, system_prompt, prompt):
+        """The task the prompt asks for ("batch", "mcq", "explain" or "restructure") and its answer."""
+        if "curriculum expert" in system_prompt:
+            return "restructure", {"name": "Synthetic Pattern", "description": "Generated locally.", "difficulty": 3}
+        if "Explain the multiple choice question" in system_prompt:
+            question_text = prompt.splitlines()[0].removeprefix("Question: ")
+            options = [text for _, text in OPTION_RE.findall(prompt)]
+            correct = CORRECT_RE.search(prompt)
+            return "explain", {"explanation": self.explain(question_text, options, "ABCD".index(correct.group(1)))}
+        # Lazy-explanation prompts don't ask for one
+        explained = '"explanation"' in system_prompt
+        pattern_ids = [int(pid) for pid in PATTERN_ID_RE.findall(prompt)]
+        if pattern_ids:
+            return "batch", {"questions": [self.question(pid, explained=explained) for pid in pattern_ids]}
+        return "mcq", self.question(explained=explained)
+
+    def complete(self, system_prompt, prompt, model=None):
+        # Every model name gets the same stand-in answers
+        with self._lock:
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            rate_limited = self.rng.random() < self.rate_limit_rate
+            malformed = self.rng.random() < self.malformed_rate
+            _, payload = self.respond(system_prompt, prompt)
+        content = json.dumps(payload)
+        delay += self.token_latency * estimate_tokens(content)
+        if delay:
+            time.sleep(delay)
+        if rate_limited:
+            raise RateLimitError("Rate limit reached (local stand-in)")
+
+        if malformed:
+            content = content[:len(content) // 2]
+        return Completion(content, estimate_tokens(system_prompt) + estimate_tokens(prompt), estimate_tokens(content))
+
+def provider_from_env():
+    """LLM_PROVIDER=groq (default) or local."""
+    name = os.getenv("LLM_PROVIDER", "groq")
+    if name == "local":
+        return LocalProvider.from_env()
+    if name == "groq":
+        return GroqProvider(model=LARGE_MODEL)
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from groq import APIConnectionError
+from utils.metrics import metrics
+from utils.tracing import tracer
+
+# Extra attempts after a retryable failure (429, 5xx, connection errors)
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+# Full-jitter backoff: attempt n sleeps uniform(0, min(cap, base * 2**n)) seconds
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", 4))
+# Send a duplicate request once the first has run longer than this percentile of recent latencies
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+# At most this share of requests may be hedged, so a slow upstream isn't hit with double load; 0 disables
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", 0.1))
+# Trip the breaker when this share of the last BREAKER_WINDOW calls failed...
+BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", 0.5))
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 10
+# ...and reject calls for this many seconds before letting a trial call through
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the breaker is open."""
+
+def is_retryable(error):
+    if isinstance(error, (APIConnectionError, ConnectionError, TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+class CircuitBreaker:
+    """Closed -> open when the recent error rate spikes -> half-open after a
+    cooldown (one trial call) -> closed again on success."""
+
+    def __init__(self, name, error_rate=BREAKER_ERROR_RATE, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.clock = clock
+        self.outcomes = deque(maxlen=window)
+        self.state = "closed"
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and self.clock() - self.opened_at >= self.cooldown:
+                self._set_state("half_open")
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_running = False
+                if ok:
+                    self.outcomes.clear()
+                    self._set_state("closed")
+                else:
+                    self._open()
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+                self._open()
+
+    def _open(self):
+        self.opened_at = self.clock()
+        self._set_state("open")
+        logging.warning(f"LLM circuit breaker for {self.name} opened for {self.cooldown:g}s")
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.set_gauge("llm_circuit_open", 1 if state == "open" else 0, model=self.name)
+
+class ResilientProvider:
+    """Wraps a provider's complete() with retries, hedging and a circuit breaker.
+
+    Each call makes up to 1 + LLM_RETRIES attempts with jittered backoff
+    between retryable failures. Within an attempt, a second identical request
+    is sent if the first outlives the recent p95 latency (hedging), and
+    whichever succeeds first wins. Breakers and latency windows are per
+    model, so a failing small model doesn't block the large one.
+    """
+
+    def __init__(self, provider, retries=LLM_RETRIES, hedge_percentile=LLM_HEDGE_PERCENTILE,
+                 hedge_max_ratio=LLM_HEDGE_MAX_RATIO, max_workers=32, sleep=time.sleep):
+        self.provider = provider
+        self.retries = retries
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_ratio = hedge_max_ratio
+        self.sleep = sleep
+        self.breakers = {}
+        self.latencies = {}
+        self.counts = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    @property
+    def name(self):
+        return self.provider.name
+
+    @property
+    def model(self):
+        return self.provider.model
+
+    @property
+    def ready(self):
+        return self.provider.ready
+
+    def breaker(self, model):
+        with self._lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(model)
+                self.latencies[model] = deque(maxlen=LATENCY_WINDOW)
+            return self.breakers[model]
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+
+    def hedge_delay(self, model):
+        """Seconds to wait before hedging, or None when hedging isn't allowed now."""
+        with self._lock:
+            samples = list(self.latencies.get(model, ()))
+            over_budget = self.counts["hedges"] >= self.hedge_max_ratio * max(1, self.counts["calls"])
+        if not self.hedge_max_ratio or over_budget or len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        samples.sort()
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+
+    def _timed(self, model, system_prompt, prompt):
+        started = time.perf_counter()
+        completion = self.provider.complete(system_prompt, prompt, model=model)
+        with self._lock:
+            self.latencies[model].append(time.perf_counter() - started)
+        return completion
+
+    def _attempt(self, model, system_prompt, prompt, call_stats):
+        """One attempt, possibly hedged. Returns a completion or raises the last error."""
+        primary = self._pool.submit(self._timed, model, system_prompt, prompt)
+        futures = {primary}
+        delay = self.hedge_delay(model)
+        if delay is not None:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self._count("hedges")
+                call_stats["hedged"] = True
+                metrics.inc("llm_hedges_total", model=model)
+                futures.add(self._pool.submit(self._timed, model, system_prompt, prompt))
+
+        error = None
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    completion = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is not primary:
+                    self._count("hedge_wins")
+                    call_stats["hedge_won"] = True
+                    metrics.inc("llm_hedge_wins_total", model=model)
+                # The loser, if any, finishes in the background and is ignored
+                return completion
+        raise error
+
+    def complete(self, system_prompt, prompt, model=None):
+        model = model or self.provider.model
+        breaker = self.breaker(model)
+        self._count("calls")
+        call_stats = {"attempts": 0, "hedged": False, "hedge_won": False}
+        try:
+            for attempt in range(self.retries + 1):
+                if not breaker.allow():
+                    self._count("rejected")
+                    metrics.inc("llm_circuit_rejections_total", model=model)
+                    raise CircuitOpenError(f"LLM circuit open for {model}, serving fallbacks")
+                call_stats["attempts"] += 1
+                self._count("attempts")
+                try:
+                    completion = self._attempt(model, system_prompt, prompt, call_stats)
+                except Exception as e:
+                    breaker.record(False)
+                    if attempt == self.retries or not is_retryable(e):
+                        raise
+                    self._count("retries")
+                    metrics.inc("llm_retries_total", model=model, error=type(e).__name__)
+                    self.sleep(random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt)))
+                    continue
+                breaker.record(True)
+                return completion
+        finally:
+            metrics.observe("llm_attempts_per_call", call_stats["attempts"], buckets=(1, 2, 3, 4, 5), model=model)
+            tracer.annotate(**call_stats)
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.counts, "breakers": {model: b.state for model, b in self.breakers.items()}}
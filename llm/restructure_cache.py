@@ -0,0 +1,59 @@
+import os
+import re
+import hashlib
+from database.db_manager import db
+from utils.cache import TTLCache
+from utils.metrics import metrics
+
+# Restructured patterns kept per normalized input
+RESTRUCTURE_CACHE_SIZE = int(os.getenv("RESTRUCTURE_CACHE_SIZE", 2000))
+RESTRUCTURE_CACHE_TTL = int(os.getenv("RESTRUCTURE_CACHE_TTL", 86400))
+# pg_trgm score (0-1, see db.search_patterns) above which an existing pattern is suggested instead of calling the LLM; 0 disables
+SUGGEST_SIMILARITY = float(os.getenv("RESTRUCTURE_SUGGEST_SIMILARITY", 0.5))
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+def normalize(text):
+    """Lowercase words only, so case, punctuation and spacing don't change the key."""
+    return " ".join(_NON_WORD_RE.sub(" ", str(text or "").lower()).split())
+
+class RestructureCache:
+    """Sits in front of generator.restructure_pattern in the add-topic flow.
+
+    `lookup` first tries an exact hit on the normalized input, then asks
+    db.search_patterns (pg_trgm, the same index the near-duplicate check on
+    confirm uses) for a pattern in the topic close enough to offer instead;
+    only when both miss does the caller pay for an LLM call and `store` its
+    result.
+    """
+
+    def __init__(self, maxsize=RESTRUCTURE_CACHE_SIZE, ttl=RESTRUCTURE_CACHE_TTL, suggest_similarity=SUGGEST_SIMILARITY):
+        self.results = TTLCache(maxsize=maxsize, ttl=ttl, name="restructure")
+        self.suggest_similarity = suggest_similarity
+
+    @staticmethod
+    def key(raw_text):
+        return hashlib.sha1(normalize(raw_text).encode()).hexdigest()
+
+    def lookup(self, raw_text, topic_id=None):
+        """("hit", restructured) | ("suggested", pattern) | ("miss", None)."""
+        cached = self.results.get(self.key(raw_text))
+        if cached is not None:
+            metrics.inc("restructure_cache_total", result="hit")
+            return "hit", dict(cached)
+        if self.suggest_similarity and topic_id is not None:
+            similar = db.search_patterns(raw_text, limit=1, topic_id=topic_id)
+            if similar and similar[0]['score'] >= self.suggest_similarity:
+                metrics.inc("restructure_cache_total", result="suggested")
+                return "suggested", similar[0]
+        metrics.inc("restructure_cache_total", result="miss")
+        return "miss", None
+
+    def store(self, raw_text, restructured):
+        self.results.set(self.key(raw_text), dict(restructured))
+
+    def forget(self, raw_text):
+        """Drop a result the user rejected, so describing it the same way again asks the LLM afresh."""
+        self.results.pop(self.key(raw_text))
+
+restructure_cache = RestructureCache()
@@ -0,0 +1,107 @@
+import os
+import threading
+
+LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", "openai/gpt-oss-120b")
+# Empty disables routing: everything goes to the large model
+SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "openai/gpt-oss-20b")
+# Highest question difficulty the small model is trusted with
+SMALL_MAX_DIFFICULTY = int(os.getenv("LLM_SMALL_MAX_DIFFICULTY", 2))
+# Pattern categories always sent to the large model regardless of difficulty (comma-separated, case-insensitive)
+LARGE_ONLY_CATEGORIES = {c.strip().lower() for c in os.getenv("LLM_LARGE_ONLY_CATEGORIES", "").split(",") if c.strip()}
+# Tasks the small model handles whatever the difficulty
+SMALL_TASKS = {"restructure"}
+
+# The small model is skipped while its smoothed failure rate is above this...
+MAX_ERROR_RATE = float(os.getenv("LLM_SMALL_MAX_ERROR_RATE", 0.3))
+# ...or while it is not actually faster than the large one on the same task and difficulty
+# (once both have this many calls there)
+MIN_CALLS_FOR_LATENCY = 10
+# Every Nth eligible request goes to the model not chosen: the small one while it is
+# skipped, so it can recover, otherwise the large one, so it has latency to compare with
+PROBE_EVERY = 20
+EWMA_ALPHA = 0.2
+
+class ModelStats:
+    """Exponentially weighted latency and failure rate of one model (or one model on one band)."""
+    __slots__ = ("latency", "error_rate", "calls")
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+
+    def observe(self, seconds=None, failed=False):
+        self.calls += 1
+        self.error_rate += EWMA_ALPHA * ((1.0 if failed else 0.0) - self.error_rate)
+        if seconds is not None and not failed:
+            self.latency = seconds if self.latency is None else self.latency + EWMA_ALPHA * (seconds - self.latency)
+
+class ModelRouter:
+    """Chooses the model for a generation request.
+
+    Restructuring and easy questions (difficulty <= SMALL_MAX_DIFFICULTY,
+    outside LARGE_ONLY_CATEGORIES) go to the small model while it stays healthy;
+    everything else, and any retry after the small model's output failed
+    validation, goes to the large model. Failures are tracked per model and
+    latency per model and band (task and difficulty), so the small model is
+    only compared with the large one on the same kind of request.
+    """
+
+    def __init__(self, large_model=LARGE_MODEL, small_model=SMALL_MODEL, small_max_difficulty=SMALL_MAX_DIFFICULTY,
+                 large_only_categories=None):
+        self.large_model = large_model
+        self.small_model = small_model or None
+        self.small_max_difficulty = small_max_difficulty
+        self.large_only_categories = LARGE_ONLY_CATEGORIES if large_only_categories is None else large_only_categories
+        self.stats = {} # model -> ModelStats
+        self.band_stats = {} # (model, task, difficulty) -> ModelStats
+        self._eligible = 0
+        self._lock = threading.Lock() # Generation runs in worker threads
+
+    def _stats(self, model, task=None, difficulty=None, band=False):
+        with self._lock:
+            if band:
+                return self.band_stats.setdefault((model, task, difficulty), ModelStats())
+            return self.stats.setdefault(model, ModelStats())
+
+    def observe(self, model, task, difficulty=None, seconds=None, failed=False):
+        """Record one call; failed covers API errors and output that failed validation."""
+        stats, band = self._stats(model), self._stats(model, task, difficulty, band=True)
+        with self._lock:
+            stats.observe(seconds, failed)
+            band.observe(seconds, failed)
+
+    def _small_is_healthy(self, task, difficulty):
+        if self._stats(self.small_model).error_rate > MAX_ERROR_RATE:
+            return False
+        small = self._stats(self.small_model, task, difficulty, band=True)
+        large = self._stats(self.large_model, task, difficulty, band=True)
+        if min(small.calls, large.calls) >= MIN_CALLS_FOR_LATENCY and small.latency is not None \
+                and large.latency is not None and small.latency >= large.latency:
+            return False
+        return True
+
+    def choose(self, task, difficulty=None, categories=()):
+        """Model for a request; `difficulty` is the hardest item's and `categories` those of all items' patterns."""
+        if not self.small_model:
+            return self.large_model
+        if task not in SMALL_TASKS:
+            if difficulty is None or difficulty > self.small_max_difficulty:
+                return self.large_model
+            if any((c or "").lower() in self.large_only_categories for c in categories):
+                return self.large_model
+        healthy = self._small_is_healthy(task, difficulty)
+        with self._lock:
+            self._eligible += 1
+            probe = self._eligible % PROBE_EVERY == 0
+        return self.small_model if healthy != probe else self.large_model
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                model: {"calls": s.calls, "latency": s.latency, "error_rate": round(s.error_rate, 3), "bands": {}}
+                for model, s in self.stats.items()
+            }
+            for (model, task, difficulty), s in self.band_stats.items():
+                snapshot[model]["bands"][f"{task}:{difficulty}"] = {"calls": s.calls, "latency": s.latency}
+            return snapshot
@@ -0,0 +1,231 @@
+"""
+Offline bulk SRS rescheduling under new parameters.
+
+Streams user_progress through a server-side cursor, re-derives every row's
+easiness factor and interval under new scheduling parameters (from --params
+and the CLI overrides) with vectorized NumPy, and writes srs_interval /
+easiness_factor / next_review_at back in bulk.
+
+Only per-pattern aggregates are stored, so the easiness and interval
+constants can't be fitted from the data; they are chosen by hand. The one
+constant the data does pin down, fast_answer_seconds, only moves difficulty
+stepping, not the schedule, so fitting it is opt-in (--fit-speed).
+
+    python reschedule_srs.py --dry-run
+    python reschedule_srs.py --second-interval 4 --write-params srs_params.json
+
+Run with --dry-run first: it prints the same report without touching the DB.
+Set SRS_PARAMS_FILE to the file written by --write-params so the bot schedules
+new answers with the same parameters. A running bot caches progress rows in
+process and can't see this tool's writes: it keeps serving the old intervals
+for up to PROGRESS_CACHE_TTL seconds (900 by default) and, if a user answers
+in that window, writes the next review from the old row. Restart the bot
+after a real run, or run it while the bot is stopped.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from database.db_manager import db, load_srs_params, easiness_delta
+
+# handle_answer grades every answer as quality 5 (correct) or 2 (wrong)
+CORRECT_QUALITY = 5
+WRONG_QUALITY = 2
+INITIAL_EASINESS = 2.5
+
+STREAM_QUERY = """
+SELECT id, total_attempts, correct_attempts, srs_interval, easiness_factor,
+       avg_time_seconds, EXTRACT(EPOCH FROM last_practiced_at) as last_epoch
+FROM user_progress
+WHERE total_attempts > 0
+ORDER BY id
+"""
+
+UPDATE_QUERY = """
+UPDATE user_progress AS up SET
+    srs_interval = v.srs_interval,
+    easiness_factor = v.easiness_factor,
+    next_review_at = COALESCE(up.last_practiced_at, CURRENT_TIMESTAMP) + (v.srs_interval * interval '1 day')
+FROM (VALUES %s) AS v(id, srs_interval, easiness_factor)
+WHERE up.id = v.id
+"""
+
+
+def stream_chunks(conn, query, chunk_size):
+    """Yield lists of rows from a named (server-side) cursor."""
+    with conn.cursor(name="srs_reschedule") as cur:
+        cur.itersize = chunk_size
+        cur.execute(query)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def fit_params(conn, params, chunk_size, speed_quantile, min_attempts):
+    """Fit the fast-answer threshold from the observed answer times.
+
+    The threshold decides when a correct answer steps difficulty up; it
+    doesn't enter srs_interval or next_review_at. Note that the median
+    (--speed-quantile 0.5) puts half of all answers in the "fast" bucket.
+    """
+    times = []
+    for rows in stream_chunks(conn, STREAM_QUERY, chunk_size):
+        attempts = np.fromiter((r['total_attempts'] for r in rows), dtype=np.int64, count=len(rows))
+        avg = np.fromiter((r['avg_time_seconds'] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+        times.append(avg[(attempts >= min_attempts) & (avg > 0)])
+
+    fitted = dict(params)
+    samples = np.concatenate(times) if times else np.empty(0)
+    if samples.size:
+        fitted['fast_answer_seconds'] = round(float(np.quantile(samples, speed_quantile)), 1)
+    return fitted, int(samples.size)
+
+
+def expected_easiness(total, correct, params):
+    """Order-free SM-2 easiness after `total` answers, `correct` of them right.
+
+    The first answer of a pattern creates its row without an easiness update,
+    so only total - 1 updates are applied, split by the observed accuracy.
+    """
+    updates = np.maximum(total - 1, 0)
+    share = np.divide(updates, total, out=np.zeros(total.shape), where=total > 0)
+    drift = share * (correct * easiness_delta(CORRECT_QUALITY, params)
+                     + (total - correct) * easiness_delta(WRONG_QUALITY, params))
+    return np.maximum(params['min_easiness'], INITIAL_EASINESS + drift)
+
+
+def reschedule(chunk, old, new):
+    """Re-derive (interval, easiness) for one chunk of rows."""
+    total = chunk['total'].astype(np.float64)
+    correct = chunk['correct'].astype(np.float64)
+    old_ef = np.maximum(chunk['ef'], old['min_easiness'])
+    interval = np.maximum(chunk['interval'], 1).astype(np.float64)
+
+    # Shift the stored (history-dependent) easiness by how much the new
+    # constants move the expected easiness; unchanged constants = no change.
+    new_ef = np.maximum(new['min_easiness'],
+                        old_ef + expected_easiness(total, correct, new) - expected_easiness(total, correct, old))
+
+    # Growth-stage intervals were built by repeated multiplication with the
+    # easiness factor: recover the number of steps and replay them.
+    steps = np.log(interval) / np.log(old_ef)
+    new_interval = np.round(interval * (new_ef / old_ef) ** steps)
+
+    first = interval <= old['first_interval']
+    second = (interval == old['second_interval']) & (chunk['total'] == 2)
+    lapsed = (interval <= old['lapse_interval']) & (chunk['correct'] < chunk['total'])
+    new_interval = np.where(first, new['first_interval'], new_interval)
+    new_interval = np.where(second, new['second_interval'], new_interval)
+    new_interval = np.where(lapsed, new['lapse_interval'], new_interval)
+    return np.maximum(new_interval, 1).astype(np.int64), new_ef
+
+
+def to_arrays(rows, now):
+    n = len(rows)
+    return {
+        'id': np.fromiter((r['id'] for r in rows), dtype=np.int64, count=n),
+        'total': np.fromiter((r['total_attempts'] for r in rows), dtype=np.int64, count=n),
+        'correct': np.fromiter((r['correct_attempts'] for r in rows), dtype=np.int64, count=n),
+        'interval': np.fromiter((r['srs_interval'] or 1 for r in rows), dtype=np.int64, count=n),
+        'ef': np.fromiter((r['easiness_factor'] or INITIAL_EASINESS for r in rows), dtype=np.float64, count=n),
+        'last': np.fromiter((float(r['last_epoch']) if r['last_epoch'] is not None else now for r in rows), dtype=np.float64, count=n),
+    }
+
+
+def run(args):
+    old = load_srs_params(args.params)
+    overrides = {k: v for k, v in {
+        'first_interval': args.first_interval,
+        'second_interval': args.second_interval,
+        'lapse_interval': args.lapse_interval,
+        'min_easiness': args.min_easiness,
+    }.items() if v is not None}
+
+    read_conn = db.open_connection()
+    write_conn = None if args.dry_run else db.open_connection()
+    started = time.time()
+
+    new = dict(old, **overrides)
+    samples = 0
+    if args.fit:
+        new, samples = fit_params(read_conn, new, args.chunk_size, args.speed_quantile, args.min_attempts)
+        read_conn.commit()
+
+    now = time.time()
+    rows_seen = rows_changed = earlier = later = 0
+    due_before = due_after = 0
+    before_hist, after_hist = [], []
+
+    for rows in stream_chunks(read_conn, STREAM_QUERY, args.chunk_size):
+        chunk = to_arrays(rows, now)
+        new_interval, new_ef = reschedule(chunk, old, new)
+
+        changed = (new_interval != chunk['interval']) | ~np.isclose(new_ef, chunk['ef'])
+        rows_seen += len(rows)
+        rows_changed += int(changed.sum())
+        earlier += int((new_interval < chunk['interval']).sum())
+        later += int((new_interval > chunk['interval']).sum())
+        due_before += int((chunk['last'] + chunk['interval'] * 86400 <= now).sum())
+        due_after += int((chunk['last'] + new_interval * 86400 <= now).sum())
+        before_hist.append(chunk['interval'])
+        after_hist.append(new_interval)
+
+        if write_conn and changed.any():
+            values = list(zip(chunk['id'][changed].tolist(),
+                              new_interval[changed].tolist(),
+                              np.round(new_ef[changed], 4).tolist()))
+            with write_conn.cursor() as cur:
+                execute_values(cur, UPDATE_QUERY, values, page_size=args.chunk_size)
+            write_conn.commit()
+
+    read_conn.close()
+    if write_conn:
+        write_conn.close()
+
+    before = np.concatenate(before_hist) if before_hist else np.zeros(1)
+    after = np.concatenate(after_hist) if after_hist else np.zeros(1)
+
+    print("--- SRS Reschedule Report" + (" (DRY RUN)" if args.dry_run else "") + " ---")
+    print(f"Rows scanned: {rows_seen}  changed: {rows_changed}  earlier: {earlier}  later: {later}")
+    if args.fit:
+        print(f"Fitted fast_answer_seconds from {samples} rows: {old['fast_answer_seconds']} -> {new['fast_answer_seconds']}")
+    for key in sorted(new):
+        if new[key] != old[key]:
+            print(f"  {key}: {old[key]} -> {new[key]}")
+    print(f"Interval days (mean / p50 / p90): "
+          f"{before.mean():.1f} / {np.percentile(before, 50):.0f} / {np.percentile(before, 90):.0f} -> "
+          f"{after.mean():.1f} / {np.percentile(after, 50):.0f} / {np.percentile(after, 90):.0f}")
+    print(f"Due now: {due_before} -> {due_after}")
+    print(f"Elapsed: {time.time() - started:.1f}s")
+
+    if args.write_params:
+        with open(args.write_params, "w") as f:
+            json.dump(new, f, indent=2)
+        print(f"Parameters written to {args.write_params}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit SRS parameters and reschedule user_progress in bulk.")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, do not write to the database.")
+    parser.add_argument("--params", help="JSON file with the parameters the current schedules were built with.")
+    parser.add_argument("--write-params", help="Write the resulting parameters to this JSON file.")
+    parser.add_argument("--fit-speed", dest="fit", action="store_true",
+                        help="Also set fast_answer_seconds to --speed-quantile of per-pattern answer times. "
+                             "It only changes difficulty stepping, not review intervals.")
+    parser.add_argument("--speed-quantile", type=float, default=0.5)
+    parser.add_argument("--min-attempts", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--first-interval", type=int)
+    parser.add_argument("--second-interval", type=int)
+    parser.add_argument("--lapse-interval", type=int)
+    parser.add_argument("--min-easiness", type=float)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
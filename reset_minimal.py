@@ -7,6 +7,7 @@ def reset_and_seed_minimal():
     # user_added_patterns and user_progress must be cleared first due to FKs
     db.execute_query("DELETE FROM user_progress")
     db.execute_query("DELETE FROM user_added_patterns")
+    db.execute_query("DELETE FROM user_question_history")
     db.execute_query("DELETE FROM questions")
     db.execute_query("DELETE FROM patterns")
     db.execute_query("DELETE FROM topics")
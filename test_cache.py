@@ -0,0 +1,57 @@
+from utils import cache
+from utils.cache import TTLCache
+from database.db_manager import DatabaseManager
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set("a", 1)
+    now[0] = 104.9
+    assert c.get("a") == 1 and "a" in c
+    now[0] = 105.1
+    assert "a" not in c
+    assert c.get("a", "gone") == "gone"
+    assert c.hits == 1 and c.misses == 1
+
+def test_least_recently_used_entry_is_evicted():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a") # "b" is now the oldest
+    c.set("c", 3)
+    assert "b" not in c and c.get("a") == 1 and c.get("c") == 3
+    assert len(c) == 2
+
+def test_deferring_reviews_drops_their_cached_progress(monkeypatch):
+    manager = DatabaseManager()
+    manager.progress_cache.set((1, 7), {"next_review_at": "today"})
+    manager.progress_cache.set((1, 8), {"next_review_at": "today"})
+    monkeypatch.setattr(manager, "execute_query", lambda query, params=None, name=None:
+                        [{"id": 70, "user_id": 1, "pattern_id": 7}])
+    assert manager.defer_srs_backlog(1, 5) == 1
+    assert (1, 7) not in manager.progress_cache and (1, 8) in manager.progress_cache
+
+def test_progress_write_upserts_instead_of_trusting_a_cached_miss(monkeypatch):
+    manager = DatabaseManager()
+    manager.progress_cache.set((1, 7), None) # Another process has since written the row
+    manager.pattern_difficulty_cache.set(7, 2)
+    queries = []
+    stored = {"id": 70, "user_id": 1, "pattern_id": 7, "total_attempts": 4}
+    monkeypatch.setattr(manager, "execute_query", lambda query, params=None, name=None:
+                        queries.append((query, params)) or [stored])
+    manager.update_user_progress(1, 7, True, 5, time_taken=10.0)
+    [(query, params)] = queries
+    assert "ON CONFLICT (user_id, pattern_id) DO UPDATE" in query and "up.easiness_factor" in query
+    assert params["step"] == 1 and params["first_difficulty"] == 3
+    assert manager.progress_cache.get((1, 7)) == stored
+
+def test_due_reviews_are_ranked_the_same_way_when_queued_and_deferred(monkeypatch):
+    manager = DatabaseManager()
+    queries = []
+    monkeypatch.setattr(manager, "execute_query", lambda query, params=None, name=None: queries.append(query) or [])
+    manager.get_srs_due_patterns(1, 5)
+    manager.defer_srs_backlog(1, 5)
+    assert all("DESC, up.next_review_at, up.id" in query for query in queries) and len(queries) == 2
+    # No daily rate to spread the backlog at, and no division by zero
+    assert manager.defer_srs_backlog(1, 0) == 0 and len(queries) == 2
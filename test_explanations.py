@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from database.db_manager import db
+from handlers import question_pool
+from llm.generator import QuestionGenerator, generator
+from llm.providers import LocalProvider
+
+PATTERNS = [
+    {"id": 7, "topic_name": "Quant", "name": "Work and time", "description": "desc", "difficulty": 3},
+    {"id": 8, "topic_name": "Quant", "name": "Mixtures", "description": "desc", "difficulty": 2},
+]
+
+class PromptRecorder(LocalProvider):
+    def __init__(self):
+        super().__init__(seed=1)
+        self.system_prompts = []
+
+    def complete(self, system_prompt, prompt, model=None):
+        self.system_prompts.append(system_prompt)
+        return super().complete(system_prompt, prompt, model)
+
+def test_lazy_batches_skip_explanations_until_asked():
+    provider = PromptRecorder()
+    lazy = QuestionGenerator(provider, lazy_explanations=True)
+    questions, error = lazy.generate_batch(PATTERNS)
+    assert error is None and [q["explanation"] for q in questions] == [None, None]
+    assert '"explanation"' not in provider.system_prompts[-1]
+
+    text, error = lazy.generate_explanation(questions[0])
+    assert error is None and questions[0]["options"][questions[0]["correct_option_index"]] in text
+
+def test_concurrent_requests_share_one_explanation_call(monkeypatch):
+    calls, saved = [], []
+    def slow_explanation(question):
+        calls.append(question["id"])
+        time.sleep(0.1)
+        return "Because.", None
+    monkeypatch.setattr(generator, "generate_explanation", slow_explanation)
+    monkeypatch.setattr(db, "save_explanation", lambda qid, text: saved.append((qid, text)))
+
+    question = {"id": 5, "question_text": "Q", "options": ["1", "2", "3", "4"], "correct_option_index": 0,
+                "explanation": None}
+    async def scenario():
+        return await asyncio.gather(*(question_pool.explanation_for(dict(question)) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == [("Because.", None)] * 3
+    assert calls == [5] and saved == [(5, "Because.")]
+    assert asyncio.run(question_pool.explanation_for({**question, "explanation": "Stored."})) == ("Stored.", None)
+
+def test_failed_explanation_can_be_retried_at_once(monkeypatch):
+    from types import SimpleNamespace
+    from handlers import practice_handler
+    from utils.dedupe import is_duplicate_tap
+
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    async def failing(question):
+        return None, "rate limited"
+    monkeypatch.setattr(practice_handler, "explanation_for", failing)
+    query = SimpleNamespace(from_user=SimpleNamespace(id=42), data="explain_9",
+                            message=SimpleNamespace(message_id=1001, reply_text=reply_text))
+
+    assert not is_duplicate_tap(query)
+    assert is_duplicate_tap(query) # A double tap while the first is being handled
+    asyncio.run(practice_handler._send_explanation(query, {"id": 9}))
+    assert "try again" in replies[-1]
+    assert not is_duplicate_tap(query)
@@ -0,0 +1,31 @@
+from llm.generator import QuestionGenerator
+from llm.providers import LocalProvider
+
+AI_PATTERNS = [
+    {"id": 7, "topic_name": "Quant", "name": "Work and time", "description": "desc", "difficulty": 3},
+    {"id": 8, "topic_name": "Quant", "name": "Mixtures", "description": "desc", "difficulty": 2},
+]
+
+def test_local_provider_returns_schema_valid_batches():
+    generator = QuestionGenerator(LocalProvider(seed=1))
+    questions, error = generator.generate_batch(AI_PATTERNS + [
+        {"id": 9, "topic_name": "Quant", "name": "Mix fraction", "description": "desc", "difficulty": 2},
+    ])
+    assert error is None
+    assert sorted(q["pattern_id"] for q in questions) == [7, 8, 9]
+    for q in questions:
+        assert len(q["options"]) == 4
+        assert 0 <= q["correct_option_index"] < 4
+        assert q["question_text"] and q["explanation"]
+
+def test_same_seed_gives_same_questions():
+    first, _ = QuestionGenerator(LocalProvider(seed=5)).generate_batch(AI_PATTERNS)
+    second, _ = QuestionGenerator(LocalProvider(seed=5)).generate_batch(AI_PATTERNS)
+    assert first == second
+
+def test_malformed_output_and_rate_limits_surface_as_errors():
+    questions, error = QuestionGenerator(LocalProvider(seed=1, malformed_rate=1)).generate_batch(AI_PATTERNS)
+    assert questions == [] and error
+
+    result, error = QuestionGenerator(LocalProvider(seed=1, rate_limit_rate=1)).generate_mcq("Quant", "Mixtures", "desc", 3)
+    assert result is None and "Rate limit" in error
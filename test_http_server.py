@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from utils.http_server import HTTPServer, Response
+
+async def exchange(server, raw):
+    """Send raw bytes and read until the server closes or goes quiet."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(raw)
+    await writer.drain()
+    try:
+        return await asyncio.wait_for(reader.read(), 2)
+    finally:
+        writer.close()
+
+def serve(scenario, **kwargs):
+    async def run():
+        server = HTTPServer("127.0.0.1", 0, **kwargs)
+        received = []
+
+        async def echo(request):
+            received.append(request.body)
+            return Response(200, request.body)
+        server.route("POST", "/hook", echo)
+        await server.start()
+        try:
+            return await scenario(server), received
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+def test_body_is_read_up_to_the_cap():
+    reply, received = serve(lambda s: exchange(
+        s, b"POST /hook HTTP/1.1\r\nContent-Length: 5\r\nConnection: close\r\n\r\nhello"), max_body=5)
+    assert reply.startswith(b"HTTP/1.1 200") and reply.endswith(b"hello")
+    assert received == [b"hello"]
+
+def test_oversized_body_is_refused_unread():
+    reply, received = serve(lambda s: exchange(
+        s, b"POST /hook HTTP/1.1\r\nContent-Length: 6\r\n\r\nhello!"), max_body=5)
+    assert reply.startswith(b"HTTP/1.1 413") and b"Connection: close" in reply
+    assert received == []
+
+@pytest.mark.parametrize("header", [b"Content-Length: abc", b"Content-Length: -1", b"No colon here"])
+def test_malformed_headers_get_400(header):
+    reply, received = serve(lambda s: exchange(s, b"POST /hook HTTP/1.1\r\n" + header + b"\r\n\r\n"))
+    assert reply.startswith(b"HTTP/1.1 400")
+    assert received == []
+
+def test_slow_client_is_disconnected():
+    async def scenario(server):
+        started = asyncio.get_running_loop().time()
+        # Promises a body that never comes
+        reply = await exchange(server, b"POST /hook HTTP/1.1\r\nContent-Length: 5\r\n\r\nhe")
+        return reply, asyncio.get_running_loop().time() - started
+
+    (reply, waited), received = serve(scenario, read_timeout=0.2)
+    assert reply == b"" and waited < 1.5
+    assert received == []
+
+def test_webhook_mode_refuses_to_start_without_a_secret(monkeypatch):
+    import bot
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    with pytest.raises(SystemExit, match="WEBHOOK_SECRET"):
+        asyncio.run(bot.run_webhook(None))
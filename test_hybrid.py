@@ -1,4 +1,10 @@
+import random
+import threading
+
+import pytest
+
 from llm.generator import generator
+from llm.hybrid_gen import HybridGenerator
 
 def test_hybrid():
     print("--- Testing Hybrid Dispatcher ---")
@@ -31,5 +37,35 @@ def test_hybrid():
         source = "HYBRID" if "Memory" in r['explanation'] or "Divided by" in r['explanation'] or "find a common" in r['explanation'] else "AI"
         print(f"Pattern {p_id} ({source}): {q_text[:100]}...")
 
+def generate_seeded(method, seed, timeout=2):
+    """Run a generator method under a fixed seed; fail instead of hanging on a distractor loop that can't finish."""
+    result = {}
+
+    def run():
+        random.seed(seed)
+        try:
+            result["question"] = getattr(HybridGenerator(), method)()
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{method} still looking for distractors after {timeout}s"
+    if "error" in result:
+        raise result["error"]
+    return result["question"]
+
+# Seeds that reach each case the distractor loops used to get stuck or crash on
+@pytest.mark.parametrize("method, seed, correct", [
+    ("generate_mixed_fraction", 520, "1(1/2)"), # Denominator 2, whole 1: only three distractors possible
+    ("generate_percentage_equations", 96, "1:1:1"), # Shuffling equal terms gives nothing new
+    ("generate_base_comparisons", 26, "18"), # Distractor clamped to the int 1, which has no is_integer()
+    ("generate_applied_percentages", 116, "-7.101"), # Negative answer, distractors clamped to 0
+])
+def test_distractors_for_edge_cases(method, seed, correct):
+    q = generate_seeded(method, seed)
+    assert q["options"][q["correct_option_index"]] == correct
+    assert len(set(q["options"])) == 4
+
 if __name__ == "__main__":
     test_hybrid()
@@ -0,0 +1,19 @@
+from utils.keyboards import page_query, pattern_keyboard
+
+def callbacks(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+def test_page_tokens():
+    assert page_query("a40") == {"after_id": 40}
+    assert page_query("b41") == {"before_id": 41}
+    assert page_query(None) == {} and page_query("x1") == {}
+
+def test_pattern_page_keeps_selection_and_links_neighbour_pages():
+    page = {"items": [{"id": 41, "name": "Rates"}, {"id": 45, "name": "Mixtures"}], "has_prev": True, "has_next": True}
+    markup = pattern_keyboard(page, topic_id=7, selected_ids=[45, 3])
+    assert markup.inline_keyboard[1][0].text == "✅ Mixtures"
+    data = callbacks(markup)
+    # Toggles redraw this page; Prev/Next continue before the first / after the last row
+    assert data[:4] == ["togglepattern_41_7_a40", "togglepattern_45_7_a40", "ppage_7_b41", "ppage_7_a45"]
+    assert "start_practice_session" in data # Selections from other pages count
+    assert all(len(d.encode()) <= 64 for d in data)
@@ -0,0 +1,28 @@
+from llm.prompts import BATCH_SYSTEM, PromptBuilder
+
+def make_patterns(avoid_count, description_words=20):
+    return [
+        {"id": i, "topic_name": "Quant", "name": f"Pattern {i}", "difficulty": 3,
+         "description": " ".join(["word"] * description_words),
+         "avoid_questions": [f"Question {i}.{n} " + "x" * 180 for n in range(avoid_count)]}
+        for i in range(1, 6)
+    ]
+
+def test_prompt_within_budget_is_untouched():
+    prompt = PromptBuilder(token_budget=3000).batch(make_patterns(avoid_count=2))
+    assert prompt.system == BATCH_SYSTEM
+    assert prompt.trim_level == 0 and prompt.tokens <= 3000
+    assert "Question 5.1" in prompt.user
+
+def test_avoid_lists_are_trimmed_before_descriptions():
+    prompt = PromptBuilder(token_budget=2000).batch(make_patterns(avoid_count=50))
+    assert prompt.trimmed and prompt.tokens <= 2000
+    # Newest avoid items survive, and every pattern keeps its full description
+    assert "Question 3.0" in prompt.user and "Question 3.49" not in prompt.user
+    assert prompt.user.count(" ".join(["word"] * 20)) == 5
+    for i in range(1, 6):
+        assert f"PATTERN ID: {i}" in prompt.user
+
+def test_zero_budget_disables_trimming():
+    prompt = PromptBuilder(token_budget=0).batch(make_patterns(avoid_count=50))
+    assert prompt.trim_level == 0 and "Question 3.49" in prompt.user
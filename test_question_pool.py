@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from database.db_manager import db
+from handlers import question_pool
+from llm.generator import generator
+
+def test_missed_deadline_returns_early_and_banks_the_late_result(monkeypatch):
+    saved = []
+    monkeypatch.setattr(question_pool, "GENERATION_DEADLINE", 0.1)
+    monkeypatch.setattr(db, "save_question", lambda pattern_id, *args: saved.append(pattern_id) or len(saved))
+
+    def slow_batch(patterns_info, count=5):
+        time.sleep(0.3)
+        return [generator.generate_hybrid("Mix fraction") | {"pattern_id": 7}], None
+    monkeypatch.setattr(generator, "generate_batch", slow_batch)
+
+    async def scenario():
+        started = time.perf_counter()
+        questions, error = await question_pool.generate_batch([{"id": 7}], question_pool.generation_deadline(), "custom")
+        waited = time.perf_counter() - started
+        await asyncio.sleep(0.4) # Let the abandoned call finish
+        return questions, error, waited
+
+    questions, error, waited = asyncio.run(scenario())
+    assert questions == [] and "longer than" in error
+    assert waited < 0.25
+    assert saved == [7]
+
+def mock_fallback_sources(monkeypatch):
+    monkeypatch.setattr(db, "get_current_difficulty", lambda user_id, pattern_id: 3)
+    monkeypatch.setattr(db, "get_unseen_question", lambda user_id, pid, difficulty:
+                        ({"id": 100, "pattern_id": pid}, 0) if pid == 1 else (None, 0))
+    monkeypatch.setattr(db, "get_pattern_info", lambda pid: {"id": pid, "topic_id": 10 if pid == 2 else 20})
+    monkeypatch.setattr(db, "get_patterns", lambda topic_id:
+                        [{"id": 2, "name": "Word problems"}, {"id": 5, "name": "Mix fraction"}] if topic_id == 10 else [])
+    monkeypatch.setattr(db, "get_seen_question", lambda user_id, pid: {"id": 300, "pattern_id": pid} if pid == 3 else None)
+    monkeypatch.setattr(question_pool, "save_generated", lambda user_id, q, pid: q.update(id=200))
+
+def test_fallback_prefers_bank_then_same_topic_hybrid_then_seen(monkeypatch):
+    mock_fallback_sources(monkeypatch)
+    questions, missing = question_pool.fallback_questions(42, [1, 2, 3, 4], "custom")
+    assert [(q["id"], q["pattern_id"]) for q in questions] == [(100, 1), (200, 5), (300, 3)]
+    assert missing == [4]
+
+def test_daily_fallback_serves_the_due_patterns_own_question_before_a_siblings(monkeypatch):
+    mock_fallback_sources(monkeypatch)
+    monkeypatch.setattr(db, "get_seen_question", lambda user_id, pid: {"id": 300, "pattern_id": pid} if pid in (2, 3) else None)
+    questions, missing = question_pool.fallback_questions(42, [2, 3], "daily")
+    assert [(q["id"], q["pattern_id"]) for q in questions] == [(300, 2), (300, 3)]
+    # Nothing of its own: the sibling's hybrid question is still better than none
+    monkeypatch.setattr(db, "get_seen_question", lambda user_id, pid: None)
+    questions, missing = question_pool.fallback_questions(42, [2], "daily")
+    assert [(q["id"], q["pattern_id"]) for q in questions] == [(200, 5)] and missing == []
+
+def test_bank_serves_its_last_unseen_questions_and_tops_up_in_the_background(monkeypatch):
+    saved = []
+    monkeypatch.setattr(db, "get_current_difficulty", lambda user_id, pattern_id: 3)
+    left = {1: 2, 2: 0, 3: 5}
+    monkeypatch.setattr(db, "get_unseen_question", lambda user_id, pid, difficulty:
+                        ({"id": 100 + pid, "pattern_id": pid}, left[pid]) if pid != 4 else (None, 0))
+    monkeypatch.setattr(question_pool, "pattern_batch_info", lambda user_id, pid: {"id": pid, "name": f"P{pid}"})
+    monkeypatch.setattr(db, "save_question", lambda pattern_id, *args: saved.append(pattern_id) or len(saved))
+    monkeypatch.setattr(generator, "generate_batch", lambda patterns_info, count=5:
+                        ([{**generator.generate_hybrid("Mix fraction"), "pattern_id": p["id"]} for p in patterns_info], None))
+
+    async def scenario():
+        pool = []
+        to_generate = question_pool.take_from_bank(42, [1, 2, 3, 4], pool)
+        # A second session asking meanwhile doesn't start another top-up
+        question_pool.take_from_bank(43, [1], [])
+        await asyncio.gather(*question_pool._late_calls)
+        return pool, to_generate
+
+    pool, to_generate = asyncio.run(scenario())
+    assert [q["id"] for q in pool] == [101, 102, 103] and to_generate == [4]
+    assert saved == [1, 2] and not question_pool._topping_up
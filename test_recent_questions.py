@@ -0,0 +1,30 @@
+from database.recent_questions import RecentQuestionRing
+
+def test_warm_then_append_newest_first():
+    ring = RecentQuestionRing(size=3)
+    ring.append(7, "Ignored until warmed")
+    assert not ring.is_warm(7) and ring.recent(7) == []
+    ring.warm(7, ["Second", "First"])
+    ring.append(7, "Third")
+    assert ring.recent(7) == ["Third", "Second", "First"]
+    ring.append(7, "Fourth")
+    assert ring.recent(7) == ["Fourth", "Third", "Second"]
+    assert ring.recent(7, limit=1) == ["Fourth"]
+
+def test_saved_question_matches_its_warmed_excerpt():
+    ring = RecentQuestionRing(size=5, excerpt_chars=20)
+    text = "A train leaves the station at 9am travelling at 60 km/h"
+    # warm() is fed LEFT(question_text, excerpt_chars) by the DB
+    ring.warm(7, [text[:20]])
+    ring.append(7, text)
+    ring.append(7, "A train leaves the station at noon")
+    assert ring.recent(7) == [text[:20]]
+
+def test_least_recently_used_pattern_is_evicted():
+    ring = RecentQuestionRing(max_patterns=2)
+    ring.warm(1, ["One"])
+    ring.warm(2, ["Two"])
+    assert ring.is_warm(1) # Touch 1, so 2 is the oldest
+    ring.warm(3, ["Three"])
+    assert ring.is_warm(1) and ring.is_warm(3) and not ring.is_warm(2)
+    assert ring.recent(2) == []
@@ -0,0 +1,66 @@
+import argparse
+
+import numpy as np
+
+import reschedule_srs
+from database.db_manager import db, DEFAULT_SRS_PARAMS, easiness_delta
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCursor(list(self.rows))
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+def row(id, total, correct, interval, ef):
+    return {"id": id, "total_attempts": total, "correct_attempts": correct, "srs_interval": interval,
+            "easiness_factor": ef, "avg_time_seconds": 40.0, "last_epoch": 0}
+
+def test_expected_easiness_applies_one_update_less_than_the_answers():
+    params = DEFAULT_SRS_PARAMS
+    total, correct = np.array([0.0, 1.0, 3.0]), np.array([0.0, 1.0, 3.0])
+    ef = reschedule_srs.expected_easiness(total, correct, params)
+    assert ef[0] == ef[1] == 2.5
+    # 3 correct answers: 2 updates of +easiness_delta(5)
+    assert np.isclose(ef[2], 2.5 + 2 * easiness_delta(5, params))
+    # Always wrong bottoms out at min_easiness
+    assert reschedule_srs.expected_easiness(np.array([50.0]), np.array([0.0]), params)[0] == params["min_easiness"]
+
+def test_dry_run_reports_changes_without_writing(monkeypatch, capsys):
+    rows = [row(1, 1, 1, 1, 2.5), row(2, 2, 2, 6, 2.6), row(3, 5, 5, 40, 2.8)]
+    opened = []
+    monkeypatch.setattr(db, "open_connection", lambda: opened.append(1) or FakeConnection(rows))
+    args = argparse.Namespace(params=None, first_interval=None, second_interval=4, lapse_interval=None,
+                              min_easiness=None, dry_run=True, fit=False, chunk_size=2, speed_quantile=0.5,
+                              min_attempts=3, write_params=None)
+    reschedule_srs.run(args)
+
+    out = capsys.readouterr().out
+    assert "(DRY RUN)" in out
+    assert "Rows scanned: 3  changed: 1  earlier: 1  later: 0" in out
+    assert "second_interval: 6 -> 4" in out
+    assert "fast_answer_seconds" not in out
+    assert len(opened) == 1 # No write connection
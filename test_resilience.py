@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from llm.providers import Completion
+from llm.resilience import CircuitBreaker, CircuitOpenError, ResilientProvider
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class ScriptedProvider:
+    """Provider whose calls follow a script: an int raises that HTTP status,
+    a float sleeps that many seconds before answering."""
+    name = "scripted"
+    model = "large"
+    ready = True
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.calls = 0
+
+    def complete(self, system_prompt, prompt, model=None):
+        self.calls += 1
+        step = self.script.pop(0) if self.script else 0.0
+        if isinstance(step, int):
+            raise APIError(step)
+        time.sleep(step)
+        return Completion(f"answer {self.calls}", 10, 5)
+
+def make(provider, **kwargs):
+    return ResilientProvider(provider, sleep=lambda seconds: None, **kwargs)
+
+def test_retryable_errors_are_retried_and_others_raise_at_once():
+    resilient = make(ScriptedProvider([503, 429]))
+    assert resilient.complete("s", "p").content == "answer 3"
+    assert resilient.counts["retries"] == 2
+
+    provider = ScriptedProvider([400])
+    with pytest.raises(APIError):
+        make(provider).complete("s", "p")
+    assert provider.calls == 1
+
+def test_breaker_opens_then_half_open_trial_closes_it():
+    now = [0.0]
+    breaker = CircuitBreaker("large", error_rate=0.5, window=10, min_calls=4, cooldown=30, clock=lambda: now[0])
+    for ok in (True, False, False, False):
+        breaker.record(ok)
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 31
+    assert breaker.allow() and not breaker.allow() # One trial at a time
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_open_breaker_rejects_without_calling_the_api():
+    provider = ScriptedProvider([500] * 10)
+    resilient = make(provider, retries=0)
+    for _ in range(10):
+        with pytest.raises(APIError):
+            resilient.complete("s", "p")
+    with pytest.raises(CircuitOpenError):
+        resilient.complete("s", "p")
+    assert provider.calls == 10 and resilient.counts["rejected"] == 1
+
+def test_slow_request_is_hedged_and_the_hedge_wins():
+    provider = ScriptedProvider([0.0] * 20 + [1.0, 0.0])
+    resilient = make(provider, hedge_max_ratio=0.5)
+    for _ in range(20):
+        resilient.complete("s", "p")
+    started = time.perf_counter()
+    assert resilient.complete("s", "p").content == "answer 22"
+    assert time.perf_counter() - started < 0.5
+    assert resilient.counts["hedges"] == 1 and resilient.counts["hedge_wins"] == 1
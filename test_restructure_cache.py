@@ -0,0 +1,27 @@
+from database.db_manager import db
+from llm.restructure_cache import RestructureCache
+
+def test_exact_hits_ignore_case_punctuation_and_spacing(monkeypatch):
+    monkeypatch.setattr(db, "search_patterns", lambda text, limit=10, topic_id=None: [])
+    cache = RestructureCache(suggest_similarity=0)
+    assert cache.lookup("Pipes filling a tank", topic_id=3) == ("miss", None)
+    cache.store("Pipes filling a tank", {"name": "Pipes and Cisterns", "description": "d", "difficulty": 3})
+    outcome, restructured = cache.lookup("  pipes FILLING, a tank! ", topic_id=3)
+    assert outcome == "hit" and restructured["name"] == "Pipes and Cisterns"
+
+    cache.forget("pipes filling a tank")
+    assert cache.lookup("Pipes filling a tank")[0] == "miss"
+
+def test_similar_existing_pattern_is_suggested(monkeypatch):
+    searches = []
+
+    def search_patterns(text, limit=10, topic_id=None):
+        searches.append((text, limit, topic_id))
+        score = 0.7 if "mixture" in text else 0.3
+        return [{"id": 2, "name": "Mixtures and Alligations", "description": "d", "score": score}]
+    monkeypatch.setattr(db, "search_patterns", search_patterns)
+    cache = RestructureCache(suggest_similarity=0.5)
+    outcome, pattern = cache.lookup("mixture problems", topic_id=3)
+    assert outcome == "suggested" and pattern["id"] == 2
+    assert searches == [("mixture problems", 1, 3)]
+    assert cache.lookup("probability problems with dice", topic_id=3)[0] == "miss"
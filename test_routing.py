@@ -0,0 +1,68 @@
+from llm.generator import QuestionGenerator
+from llm.providers import Completion, LocalProvider
+from llm.routing import ModelRouter
+
+class RecordingProvider(LocalProvider):
+    """Local stand-in that remembers which model each call asked for and
+    returns truncated JSON from the models in `broken`."""
+
+    def __init__(self, broken=()):
+        super().__init__(seed=1)
+        self.broken = set(broken)
+        self.models = []
+
+    def complete(self, system_prompt, prompt, model=None):
+        self.models.append(model)
+        completion = super().complete(system_prompt, prompt, model)
+        if model in self.broken:
+            return Completion(completion.content[:20], completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+def make_generator(provider):
+    return QuestionGenerator(provider, router=ModelRouter("large", "small", small_max_difficulty=2, large_only_categories={"data insights"}))
+
+def test_easy_items_and_restructuring_use_the_small_model():
+    provider = RecordingProvider()
+    generator = make_generator(provider)
+    generator.generate_mcq("Quant", "Mixtures", "desc", 2)
+    generator.generate_mcq("Quant", "Mixtures", "desc", 4)
+    generator.generate_mcq("Table analysis", "Tables", "desc", 1, category_name="Data Insights")
+    generator.restructure_pattern("mixtures where u add water")
+    assert provider.models == ["small", "large", "large", "small"]
+
+def test_invalid_small_model_output_falls_back_to_large():
+    provider = RecordingProvider(broken={"small"})
+    generator = make_generator(provider)
+    questions, error = generator.generate_batch([
+        {"id": 7, "topic_name": "Quant", "name": "Work and time", "description": "desc", "difficulty": 1},
+        {"id": 8, "topic_name": "Quant", "name": "Mixtures", "description": "desc", "difficulty": 2},
+    ])
+    assert error is None and sorted(q["pattern_id"] for q in questions) == [7, 8]
+    assert provider.models == ["small", "large"]
+
+def test_unhealthy_small_model_is_skipped():
+    router = ModelRouter("large", "small")
+    for _ in range(5):
+        router.observe("small", "mcq", 1, failed=True)
+    assert [router.choose("mcq", difficulty=1) for _ in range(20)] == ["large"] * 19 + ["small"]
+    assert ModelRouter("large", "").choose("restructure") == "large"
+
+def test_small_model_latency_is_compared_on_the_same_task_and_difficulty():
+    router = ModelRouter("large", "small")
+    # Healthy: every PROBE_EVERY-th easy request times the large model on the same band
+    assert [router.choose("mcq", difficulty=1) for _ in range(20)] == ["small"] * 19 + ["large"]
+    for _ in range(10):
+        router.observe("small", "mcq", 1, seconds=3.0)
+        router.observe("large", "mcq", 1, seconds=2.0)
+        # Hard questions only the large model gets make its overall latency look slow
+        router.observe("large", "mcq", 4, seconds=20.0)
+    assert router.stats["small"].latency < router.stats["large"].latency
+    assert router.choose("mcq", difficulty=1) == "large"
+    # No large-model timings on restructuring yet, so nothing to compare with there
+    assert router.choose("restructure") == "small"
+
+def test_groq_provider_uses_the_configured_large_model(monkeypatch):
+    from llm import providers
+    monkeypatch.setenv("LLM_PROVIDER", "groq")
+    monkeypatch.setattr(providers, "LARGE_MODEL", "custom/large")
+    assert providers.provider_from_env().model == "custom/large"
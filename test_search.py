@@ -0,0 +1,13 @@
+from handlers.search_handler import render_results
+
+def test_results_list_patterns_with_practice_buttons_and_question_excerpts():
+    patterns = [{"id": 4, "topic_id": 2, "name": "Work <Rate>", "topic_name": "Arithmetic", "score": 0.9}]
+    questions = [{"id": 9, "pattern_id": 4, "question_text": "Pipe A fills a tank " * 10, "pattern_name": "Work <Rate>"}]
+    text, keyboard = render_results("work rate", patterns, questions)
+    assert "Work &lt;Rate&gt; <i>(Arithmetic)</i>" in text
+    assert "Pipe A fills a tank" in text and "…" in text
+    assert keyboard.inline_keyboard[0][0].callback_data == "togglepattern_4_2"
+
+def test_no_results():
+    text, keyboard = render_results("zzz", [], [])
+    assert "Nothing similar found" in text and keyboard is None
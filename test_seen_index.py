@@ -0,0 +1,80 @@
+import random
+import sys
+
+from database.db_manager import DatabaseManager
+from database.seen_index import SeenIndex, CHUNK_SHIFT, ARRAY_MAX
+
+CHUNK_BITS = 1 << CHUNK_SHIFT
+
+def test_seen_index_tracks_ids_across_chunks():
+    index = SeenIndex()
+    assert not index.is_loaded(1)
+    index.load(1, [3, CHUNK_BITS + 3, 10 * CHUNK_BITS])
+    assert index.contains(1, 3) and index.contains(1, CHUNK_BITS + 3) and index.contains(1, 10 * CHUNK_BITS)
+    assert not index.contains(1, 4) and not index.contains(1, CHUNK_BITS * 2 + 3)
+    index.add(1, 4)
+    assert index.contains(1, 4)
+    # Users who aren't loaded are left to the next load from the database
+    index.add(2, 4)
+    assert not index.is_loaded(2) and not index.contains(2, 4)
+
+def test_dense_chunk_switches_to_a_bitmap():
+    index = SeenIndex()
+    index.load(1, range(0, 2 * ARRAY_MAX + 2, 2))
+    assert isinstance(index._users[1][0], bytearray)
+    assert index.contains(1, 0) and index.contains(1, 2 * ARRAY_MAX) and not index.contains(1, 1)
+    index.load(2, range(0, 2 * ARRAY_MAX, 2))
+    assert not isinstance(index._users[2][0], bytearray)
+    index.add(2, 2 * ARRAY_MAX)
+    index.add(2, 2 * ARRAY_MAX) # Already there
+    assert isinstance(index._users[2][0], bytearray) and index.contains(2, 2 * ARRAY_MAX)
+
+def test_sparse_history_is_smaller_than_a_set():
+    # A few hundred answers scattered over a large bank
+    question_ids = random.Random(0).sample(range(1, 500_000), 300)
+    index = SeenIndex()
+    index.load(1, question_ids)
+    chunks = index._users[1]
+    size = sys.getsizeof(chunks) + sum(sys.getsizeof(chunk) for chunk in chunks.values())
+    as_set = set(question_ids)
+    assert size < sys.getsizeof(as_set) + sum(sys.getsizeof(qid) for qid in as_set)
+    assert all(index.contains(1, qid) for qid in question_ids)
+
+def test_seen_index_evicts_least_recently_used_user():
+    index = SeenIndex(max_users=2)
+    index.load(1, [1])
+    index.load(2, [2])
+    assert index.is_loaded(1) # Touch 1, so 2 is the oldest
+    index.load(3, [3])
+    assert index.is_loaded(1) and index.is_loaded(3) and not index.is_loaded(2)
+
+def make_db(monkeypatch, bank, history):
+    manager = DatabaseManager()
+    reads = []
+    def execute_query(query, params=None, name=None):
+        reads.append(query)
+        if "user_question_history" in query:
+            return [{"question_id": qid} for qid in history]
+        if "SELECT id FROM questions" in query:
+            return [{"id": qid} for qid in bank]
+        return [{"id": params[0], "pattern_id": 7, "question_text": f"Q{params[0]}"}]
+    monkeypatch.setattr(manager, "execute_query", execute_query)
+    return manager, reads
+
+def test_get_unseen_question_serves_until_none_are_left(monkeypatch):
+    manager, _ = make_db(monkeypatch, bank=[1, 2, 3, 4], history=[1, 2])
+    question, left = manager.get_unseen_question(42, 7, 3)
+    assert question["id"] in (3, 4) and left == 1
+    # Marked seen at once, so the next pick is the other one
+    other, left = manager.get_unseen_question(42, 7, 3)
+    assert {question["id"], other["id"]} == {3, 4} and left == 0
+    assert manager.get_unseen_question(42, 7, 3) == (None, 0)
+
+def test_bank_ids_are_loaded_once_and_bounded(monkeypatch):
+    monkeypatch.setenv("BANK_IDS_CACHE_SIZE", "1")
+    manager, reads = make_db(monkeypatch, bank=[1], history=[])
+    manager._get_bank_ids(7, 3)
+    manager._get_bank_ids(7, 3)
+    assert len(reads) == 1
+    manager._get_bank_ids(8, 3)
+    assert (7, 3) not in manager._bank_ids and len(manager._bank_ids) == 1
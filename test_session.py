@@ -0,0 +1,27 @@
+from database.db_manager import db
+from handlers.session import PracticeSession
+
+def test_pool_serves_bodies_without_reading_them_back(monkeypatch):
+    reads = []
+    monkeypatch.setattr(db, "execute_query", lambda query, params=None, name=None: reads.append(params) or [])
+    session = PracticeSession("custom", 20, pattern_ids=[7])
+    session.pool.extend([
+        {"id": 11, "pattern_id": 7, "question_text": "Saved", "options": ["a", "b"], "correct_option_index": 0},
+        {"pattern_id": 7, "question_text": "Unsaved", "options": ["a", "b"], "correct_option_index": 1},
+    ])
+
+    served = session.pool.next_question()
+    assert served["question_text"] == "Saved" and served["options"] == ["a", "b"]
+    session.show(served, 7, message_id=5, started_at=0)
+    assert session.current_question() is served
+
+    assert session.pool.next_question()["question_text"] == "Unsaved"
+    assert len(session.pool) == 0 and session.pool.next_question() is None
+    assert reads == []
+
+def test_sessions_share_the_record_of_a_stored_question():
+    first, second = PracticeSession("daily", 2), PracticeSession("daily", 2)
+    question = {"id": 12, "pattern_id": 7, "question_text": "Shared", "options": ["a"], "correct_option_index": 0}
+    first.pool.append(question)
+    second.pool.append(dict(question))
+    assert first.pool._items[0] is second.pool._items[0]
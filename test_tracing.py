@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from utils.tracing import Tracer
+
+class ListExporter:
+    def __init__(self):
+        self.traces = []
+
+    def submit(self, trace):
+        self.traces.append(trace)
+
+def test_spans_nest_across_threads_and_keep_slow_traces():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, slow_seconds=0.05, sample_rate=0)
+
+    def blocking_call():
+        with tracer.span("db.query", query="get_question"):
+            time.sleep(0.06)
+
+    async def handle():
+        with tracer.trace("update", user_id=1):
+            with tracer.span("fill_pool") as span:
+                span.set(pattern_ids=[1, 2])
+                await asyncio.to_thread(blocking_call)
+
+    asyncio.run(handle())
+    [trace] = exporter.traces
+    spans = {s.name: s for s in trace.spans}
+    assert spans["db.query"].parent_id == spans["fill_pool"].span_id
+    assert spans["fill_pool"].parent_id == spans["update"].span_id
+    assert spans["fill_pool"].attributes == {"pattern_ids": [1, 2]}
+
+def test_fast_traces_are_dropped_unless_they_fail():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, slow_seconds=10, sample_rate=0)
+
+    with tracer.trace("update"):
+        with tracer.span("db.query"):
+            pass
+    assert exporter.traces == []
+
+    try:
+        with tracer.trace("update"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    [trace] = exporter.traces
+    assert trace.error and trace.spans[0].error == "ValueError: boom"
+
+def test_spans_outside_a_trace_are_noops():
+    tracer = Tracer(ListExporter())
+    with tracer.span("db.query") as span:
+        span.set(rows=3)
+    assert tracer.current_span() is None
@@ -0,0 +1,26 @@
+from telegram import Bot, Update
+
+from tools.fake_telegram import FakeTelegram
+from utils.update_log import UpdateRecorder, read_log
+
+def test_log_is_anonymized_and_replayable(tmp_path):
+    path = str(tmp_path / "updates.jsonl.gz")
+    recorder = UpdateRecorder(path, salt="fixed")
+    fake, bot = FakeTelegram(), Bot("1:test")
+    for update in (
+        fake.message_update(42, "/start deep-link-payload"),
+        fake.message_update(42, "Daily Practice 🕒"),
+        fake.message_update(42, "percent problems about my salary"),
+        fake.callback_update(42, 7, "ans_2"),
+    ):
+        recorder.record(Update.de_json(dict(update, update_id=1), bot))
+    recorder.close()
+
+    entries = list(read_log(path))
+    assert [(e["k"], e["d"]) for e in entries] == [
+        ("m", "/start"),
+        ("m", "Daily Practice 🕒"),
+        ("m", "x" * len("percent problems about my salary")),
+        ("c", "ans_2"),
+    ]
+    assert {e["u"] for e in entries} == {recorder.pseudonym(42)} != {42}
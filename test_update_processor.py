@@ -0,0 +1,113 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from utils.update_processor import PerUserUpdateProcessor, DROPPED_TAP_TEXT
+
+def make_update(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None)
+
+async def _feed(processor, updates, handler):
+    # Mirrors Application: one task per update, created in arrival order
+    tasks = [asyncio.create_task(processor.process_update(u, handler(u, seq))) for seq, u in updates]
+    await asyncio.gather(*tasks)
+
+def test_per_user_order_is_preserved():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=32, max_pending_per_user=64)
+    seen = {}
+
+    async def handler(update, seq):
+        # Random delays would reorder updates without per-user serialization
+        await asyncio.sleep(random.uniform(0, 0.01))
+        seen.setdefault(update.effective_user.id, []).append(seq)
+
+    updates = [(seq, make_update(seq % 7)) for seq in range(210)]
+    asyncio.run(_feed(processor, updates, handler))
+
+    for user_id, seqs in seen.items():
+        assert seqs == sorted(seqs), f"user {user_id} saw {seqs}"
+    assert sum(len(s) for s in seen.values()) == 210
+    assert processor._queues == {}
+
+def test_one_users_slow_handler_does_not_block_others():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=32)
+    finished = []
+
+    async def handler(update, seq):
+        await asyncio.sleep(0.5 if update.effective_user.id == 1 else 0.01)
+        finished.append(update.effective_user.id)
+
+    updates = [(0, make_update(1))] + [(i, make_update(100 + i)) for i in range(1, 20)]
+    asyncio.run(_feed(processor, updates, handler))
+    assert finished[-1] == 1
+
+def test_throughput_with_200_simulated_users():
+    users, answers_per_user, handler_latency = 200, 5, 0.02
+    processor = PerUserUpdateProcessor(max_concurrent_updates=256)
+    active = 0
+    peak = 0
+
+    async def handler(update, seq):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(handler_latency) # Stands in for a generation/DB wait
+        active -= 1
+
+    updates = [(seq, make_update(u)) for seq in range(answers_per_user) for u in range(users)]
+    started = time.perf_counter()
+    asyncio.run(_feed(processor, updates, handler))
+    elapsed = time.perf_counter() - started
+
+    sequential = users * answers_per_user * handler_latency
+    print(f"\n200 users x {answers_per_user} updates: {elapsed:.2f}s "
+          f"({len(updates) / elapsed:.0f} updates/s, sequential would take {sequential:.0f}s, peak concurrency {peak})")
+    assert peak > 1
+    # Each user's 5 updates are serialized, so the floor is ~5 x latency
+    assert elapsed < sequential / 10
+
+def test_one_users_burst_holds_one_slot():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+    finished = []
+
+    async def handler(update, seq):
+        # User 1 taps through a slow generation; user 2 is quick
+        await asyncio.sleep(0.05 if update.effective_user.id == 1 else 0)
+        finished.append((update.effective_user.id, seq))
+
+    async def scenario():
+        burst = [asyncio.create_task(processor.process_update(make_update(1), handler(make_update(1), seq)))
+                 for seq in range(10)]
+        await asyncio.sleep(0.01)
+        other = asyncio.create_task(processor.process_update(make_update(2), handler(make_update(2), 99)))
+        await asyncio.wait_for(other, 0.2) # Would wait ~0.5s if the burst held every slot
+        done_before = [f for f in finished if f[0] == 1]
+        await asyncio.gather(*burst) # The first task drains the whole queue
+        return done_before
+
+    done_before = asyncio.run(scenario())
+    assert len(done_before) < 10
+    assert [seq for user, seq in finished if user == 1] == list(range(10))
+    assert processor._queues == {}
+
+def test_updates_past_the_per_user_cap_are_dropped():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=4, max_pending_per_user=2)
+    ran = []
+
+    async def handler(update, seq):
+        await asyncio.sleep(0.01)
+        ran.append(seq)
+
+    answered = []
+
+    async def answer(text=None):
+        answered.append(text)
+
+    updates = [(seq, make_update(1)) for seq in range(5)]
+    for seq, update in updates:
+        update.callback_query = SimpleNamespace(data=f"ans_{seq}", answer=answer)
+    asyncio.run(_feed(processor, updates, handler))
+    # One running plus two queued; the other two taps are answered so their spinners stop
+    assert ran == [0, 1, 2]
+    assert answered == [DROPPED_TAP_TEXT] * 2
@@ -0,0 +1,262 @@
+"""
+Time every DatabaseManager query method against synthetic data and record plans.
+
+Load one or more schemas with tools/synth_db.py first, then:
+
+    DATABASE_URL=postgresql://localhost/aptitude_test \\
+        python -m tools.bench_db run --schemas bench_small bench_medium bench_large --output main.json
+    python -m tools.bench_db compare branch.json --baseline main.json
+
+For each schema, every method runs once per sampled (user, pattern) pair with
+the in-process caches cleared first, so each call reaches Postgres. Reports
+p50/p95/p99 latency and queries per call, plus the EXPLAIN (ANALYZE, BUFFERS)
+plan of every statement from the first sample. Methods that write (progress
+updates, SRS deferral, added patterns) do write: only point this at a
+synthetic schema.
+
+`compare` exits with status 1 when a method's p95 grows past --threshold or a
+statement's plan switches to a sequential scan it did not use before.
+"""
+import argparse
+import inspect
+import json
+import os
+import random
+import sys
+import time
+
+import psycopg2
+
+from database.db_manager import DatabaseManager
+from tools.stats import summarize
+
+# Methods that never reach Postgres on their own, or manage the connection itself
+NOT_QUERIES = {"get_connection", "open_connection", "execute_query", "init_db", "clear_caches", "mark_question_seen"}
+
+# method -> call for one sample; `s` holds ids of a real (user, practised pattern) pair
+CASES = {
+    "get_user": lambda db, s: db.get_user(s["user_id"]),
+    "register_user": lambda db, s: db.register_user(s["user_id"], f"user{s['user_id']}", "Synthetic", None),
+    "get_categories": lambda db, s: db.get_categories(),
+    "get_topics": lambda db, s: db.get_topics(s["category_id"]),
+    "get_patterns": lambda db, s: db.get_patterns(s["topic_id"]),
+    "get_topics_page": lambda db, s: db.get_topics_page(s["category_id"], after_id=s["topic_id"]),
+    "get_patterns_page": lambda db, s: db.get_patterns_page(s["topic_id"], after_id=s["pattern_id"]),
+    "get_topic_category": lambda db, s: db.get_topic_category(s["topic_id"]),
+    "get_pattern_info": lambda db, s: db.get_pattern_info(s["pattern_id"]),
+    "unlock_pattern": lambda db, s: db.unlock_pattern(s["pattern_id"]),
+    "save_question": lambda db, s: db.save_question(
+        s["pattern_id"], f"Benchmark question {s['n']}", ["1", "2", "3", "4"], 0, "Benchmark.", s["difficulty"]),
+    "get_question": lambda db, s: db.get_question(s["question_id"]),
+    "get_unseen_question": lambda db, s: db.get_unseen_question(s["user_id"], s["pattern_id"], s["difficulty"]),
+    "record_question_attempt": lambda db, s: db.record_question_attempt(
+        s["user_id"], s["question_id"], s["pattern_id"], s["n"] % 2 == 0),
+    "get_review_question": lambda db, s: db.get_review_question(s["user_id"], s["pattern_id"], s["difficulty"]),
+    "get_seen_question": lambda db, s: db.get_seen_question(s["user_id"], s["pattern_id"]),
+    "get_recent_questions": lambda db, s: db.get_recent_questions(s["pattern_id"]),
+    "get_progress": lambda db, s: db.get_progress(s["user_id"], s["pattern_id"]),
+    "get_pattern_difficulty": lambda db, s: db.get_pattern_difficulty(s["pattern_id"]),
+    "update_user_progress": lambda db, s: db.update_user_progress(s["user_id"], s["pattern_id"], True, 4, 45.0),
+    "get_current_difficulty": lambda db, s: db.get_current_difficulty(s["user_id"], s["pattern_id"]),
+    "add_pattern": lambda db, s: db.add_pattern(
+        s["topic_id"], f"Benchmark pattern {s['run']}-{s['n']}", "Added by bench_db.", 3, s["user_id"]),
+    "record_pattern_addition": lambda db, s: db.record_pattern_addition(s["user_id"], s["pattern_id"]),
+    "sync_9_day_cycle": lambda db, s: db.sync_9_day_cycle(s["user_id"]),
+    "get_new_patterns_in_cycle": lambda db, s: db.get_new_patterns_in_cycle(s["user_id"]),
+    "get_profile_stats": lambda db, s: db.get_profile_stats(s["user_id"]),
+    "count_active_cycles": lambda db, s: db.count_active_cycles(s["user_id"]),
+    "get_weak_topics": lambda db, s: db.get_weak_topics(s["user_id"]),
+    "get_daily_goal": lambda db, s: db.get_daily_goal(s["user_id"]),
+    "get_srs_due_patterns": lambda db, s: db.get_srs_due_patterns(s["user_id"], 20),
+    "defer_srs_backlog": lambda db, s: db.defer_srs_backlog(s["user_id"], 20),
+    "get_unpracticed_patterns": lambda db, s: db.get_unpracticed_patterns(s["user_id"]),
+    # Synthetic names and question texts (tools/synth_db.py) give the search something to match
+    "search_patterns": lambda db, s: db.search_patterns(f"Pattern {s['pattern_id']}"),
+    "search_questions": lambda db, s: db.search_questions(f"What is {s['n'] % 90 + 10} x"),
+}
+
+
+class RecordingManager(DatabaseManager):
+    """DatabaseManager that keeps the statements each call sends."""
+
+    def __init__(self, schema):
+        super().__init__(schema)
+        self.statements = []
+
+    def _execute(self, query, params, retries):
+        self.statements.append((query, params))
+        return super()._execute(query, params, retries)
+
+
+def uncovered_methods():
+    public = {
+        name for name, _ in inspect.getmembers(DatabaseManager, inspect.isfunction)
+        if not name.startswith("_")
+    }
+    return sorted(public - set(CASES) - NOT_QUERIES)
+
+
+def pick_samples(db, count, rng):
+    """Random (user, practised pattern) pairs with the ids the cases need."""
+    db.execute_query("SELECT setseed(%s)", (rng.uniform(-1, 1),)) # Same --seed, same samples
+    rows = db.execute_query("""
+        SELECT up.user_id, up.pattern_id, p.topic_id, t.category_id, p.difficulty_level as difficulty,
+               (SELECT id FROM questions q WHERE q.pattern_id = up.pattern_id LIMIT 1) as question_id
+        FROM user_progress up
+        JOIN patterns p ON up.pattern_id = p.id
+        JOIN topics t ON p.topic_id = t.id
+        ORDER BY random()
+        LIMIT %s
+    """, (count,))
+    if not rows:
+        raise SystemExit(f"No user_progress rows in schema {db.schema}; load it with tools/synth_db.py")
+    run_id = rng.randrange(10 ** 6)
+    return [dict(row, n=n, run=run_id) for n, row in enumerate(rows)]
+
+
+def explain(db, query, params):
+    """EXPLAIN ANALYZE one statement inside a transaction that is rolled back."""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+            plan = cur.fetchone()
+            plan = plan["QUERY PLAN"][0] if isinstance(plan, dict) else plan[0][0]
+    except psycopg2.Error as e:
+        return {"error": str(e).strip()}
+    finally:
+        conn.rollback()
+    return {
+        "statement": " ".join(query.split()),
+        "execution_ms": plan.get("Execution Time"),
+        "nodes": sorted(set(node_types(plan["Plan"]))),
+        "seq_scans": sorted(set(seq_scans(plan["Plan"]))),
+        "plan": plan["Plan"],
+    }
+
+
+def node_types(node):
+    yield node["Node Type"]
+    for child in node.get("Plans", []):
+        yield from node_types(child)
+
+
+def seq_scans(node):
+    if node["Node Type"] == "Seq Scan":
+        yield node.get("Relation Name", "?")
+    for child in node.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def bench_schema(schema, samples, rng):
+    db = RecordingManager(schema)
+    if db.get_connection() is None:
+        raise SystemExit("Could not connect; check DATABASE_URL")
+    picked = pick_samples(db, samples, rng)
+    counts = {
+        table: db.execute_query(f"SELECT COUNT(*) as n FROM {table}")[0]["n"]
+        for table in ("users", "patterns", "questions", "user_progress", "user_question_history")
+    }
+    print(f"--- {schema}: " + ", ".join(f"{table} {n}" for table, n in counts.items()) + " ---")
+
+    methods = {}
+    for name, call in CASES.items():
+        timings, queries, plans = [], [], []
+        for sample in picked:
+            db.clear_caches()
+            db.statements = []
+            started = time.perf_counter()
+            call(db, sample)
+            timings.append(time.perf_counter() - started)
+            queries.append(len(db.statements))
+            if not plans:
+                plans = [explain(db, query, params) for query, params in db.statements]
+        stats = summarize(timings)
+        methods[name] = {
+            "p50_ms": round(stats["p50"] * 1000, 3),
+            "p95_ms": round(stats["p95"] * 1000, 3),
+            "p99_ms": round(stats["p99"] * 1000, 3),
+            "queries_per_call": round(sum(queries) / len(queries), 2),
+            "plans": plans,
+        }
+        scans = sorted({table for plan in plans for table in plan.get("seq_scans", [])})
+        print(f"{name:<28} p50={methods[name]['p50_ms']:>8}ms p95={methods[name]['p95_ms']:>8}ms "
+              f"queries={methods[name]['queries_per_call']:<5} {'seq scan: ' + ', '.join(scans) if scans else ''}")
+    return {"rows": counts, "methods": methods}
+
+
+def run(args):
+    missing = uncovered_methods()
+    if missing:
+        print(f"warning: no benchmark case for {', '.join(missing)}")
+    rng = random.Random(args.seed)
+    report = {"samples": args.samples, "schemas": {}}
+    for schema in args.schemas:
+        report["schemas"][schema] = bench_schema(schema, args.samples, rng)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Wrote {args.output}")
+    return report
+
+
+def compare_reports(current, baseline, threshold):
+    regressions = []
+    for schema, base in baseline["schemas"].items():
+        now = current["schemas"].get(schema)
+        if now is None:
+            continue
+        for name, old in base["methods"].items():
+            new = now["methods"].get(name)
+            if new is None:
+                continue
+            change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+            old_scans = {table for plan in old["plans"] for table in plan.get("seq_scans", [])}
+            new_scans = {table for plan in new["plans"] for table in plan.get("seq_scans", [])} - old_scans
+            worse = change > threshold or bool(new_scans)
+            note = f" new seq scan on {', '.join(sorted(new_scans))}" if new_scans else ""
+            print(f"{'REGRESSION' if worse else 'ok':<10} {schema:<16} {name:<28} "
+                  f"p95 {old['p95_ms']:>8} -> {new['p95_ms']:<8} ({change:+.1%}){note}")
+            if worse:
+                regressions.append(f"{schema} {name}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {threshold:.0%}")
+    return 0
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager queries on synthetic data.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--schemas", nargs="+", default=["bench_small"], help="Schemas loaded by tools/synth_db.py")
+    run_parser.add_argument("--samples", type=int, default=50, help="(user, pattern) pairs per method")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Write timings and plans as JSON")
+
+    compare_parser = sub.add_parser("compare", help="Compare a results file with a baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--baseline", required=True)
+    compare_parser.add_argument("--threshold", type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if not os.getenv("DATABASE_URL"):
+            parser.error("DATABASE_URL is not set")
+        run(args)
+        return
+    sys.exit(compare_reports(load(args.current), load(args.baseline), args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Measures what LAZY_EXPLANATIONS saves: batch latency and tokens with
+explanations generated up front versus on demand.
+
+Runs the same seeded batches through QuestionGenerator in both modes, then,
+for lazy mode, writes explanations for the --read-rate share of questions
+that users open. The offline stand-in's latency is --latency per call plus
+--token-latency per completion token (decode time); use --provider env to
+measure the configured API instead (LLM_PROVIDER / GROQ_API_KEY).
+
+Stand-in results follow from the stand-in's own explanation length, not a
+real model's; only `--provider env` runs say what lazy mode saves in
+production.
+
+    python -m tools.bench_explanations
+    python -m tools.bench_explanations --read-rate 0.5 --token-latency 0.002
+    python -m tools.bench_explanations --provider env --batches 10 --output explanations.json
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+
+from llm.generator import QuestionGenerator
+from llm.providers import LocalProvider, provider_from_env
+from llm.routing import ModelRouter
+from tools.stats import summarize
+
+
+class CountingProvider:
+    """Passes calls through and keeps each call's token usage."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.usage = []
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.provider.name
+
+    @property
+    def model(self):
+        return self.provider.model
+
+    @property
+    def ready(self):
+        return self.provider.ready
+
+    def complete(self, system_prompt, prompt, model=None):
+        completion = self.provider.complete(system_prompt, prompt, model=model)
+        with self._lock:
+            self.usage.append((completion.prompt_tokens or 0, completion.completion_tokens or 0))
+        return completion
+
+    def take(self):
+        """Usage since the last take: (prompt tokens, completion tokens)."""
+        with self._lock:
+            usage, self.usage = self.usage, []
+        return sum(u[0] for u in usage), sum(u[1] for u in usage)
+
+
+def make_patterns(batch, size):
+    return [
+        {"id": batch * size + i + 1, "topic_name": "Quant", "name": f"Word problems {i}",
+         "description": "Multi-step rate, ratio and mixture problems.", "difficulty": 3, "avoid_questions": []}
+        for i in range(size)
+    ]
+
+
+def make_provider(args):
+    if args.provider == "env":
+        return provider_from_env()
+    return LocalProvider(seed=args.seed, latency=args.latency, token_latency=args.token_latency)
+
+
+def run_mode(args, lazy):
+    provider = CountingProvider(make_provider(args))
+    # One model, so routing doesn't add noise between the modes
+    generator = QuestionGenerator(provider, router=ModelRouter(provider.model, ""), lazy_explanations=lazy)
+    batch_seconds, batch_tokens, questions = [], [], []
+    for batch in range(args.batches):
+        started = time.perf_counter()
+        generated, error = generator.generate_batch(make_patterns(batch, args.batch_size))
+        if error:
+            raise SystemExit(f"Batch {batch} failed: {error}")
+        batch_seconds.append(time.perf_counter() - started)
+        batch_tokens.append(provider.take())
+        questions += generated
+
+    result = {
+        "batch_seconds": summarize(batch_seconds),
+        "prompt_tokens_per_batch": sum(t[0] for t in batch_tokens) / len(batch_tokens),
+        "completion_tokens_per_batch": sum(t[1] for t in batch_tokens) / len(batch_tokens),
+        "questions": len(questions),
+    }
+    if lazy:
+        rng = random.Random(args.seed)
+        opened = rng.sample(questions, math.ceil(args.read_rate * len(questions)))
+        explain_seconds = []
+        for q in opened:
+            started = time.perf_counter()
+            text, error = generator.generate_explanation(q)
+            if error:
+                raise SystemExit(f"Explanation failed: {error}")
+            explain_seconds.append(time.perf_counter() - started)
+        prompt_tokens, completion_tokens = provider.take()
+        result["explain_seconds"] = summarize(explain_seconds)
+        result["explain_prompt_tokens"] = prompt_tokens / max(1, len(opened))
+        result["explain_completion_tokens"] = completion_tokens / max(1, len(opened))
+    return result
+
+
+def report(eager, lazy, args):
+    per_batch = args.batch_size
+    lines = [f"{'':<22}{'eager':>12}{'lazy':>12}{'change':>10}"]
+
+    def row(name, a, b, fmt="{:12.0f}"):
+        change = f"{(b - a) / a:+10.0%}" if a else f"{'':>10}"
+        lines.append(f"{name:<22}" + fmt.format(a) + fmt.format(b) + change)
+
+    row("batch p50 (ms)", eager["batch_seconds"]["p50"] * 1000, lazy["batch_seconds"]["p50"] * 1000)
+    row("batch p95 (ms)", eager["batch_seconds"]["p95"] * 1000, lazy["batch_seconds"]["p95"] * 1000)
+    row("completion tok/batch", eager["completion_tokens_per_batch"], lazy["completion_tokens_per_batch"])
+    row("prompt tok/batch", eager["prompt_tokens_per_batch"], lazy["prompt_tokens_per_batch"])
+
+    # Total tokens per question, counting explanations written for the share of questions opened
+    explain_total = lazy["explain_prompt_tokens"] + lazy["explain_completion_tokens"]
+    eager_total = (eager["prompt_tokens_per_batch"] + eager["completion_tokens_per_batch"]) / per_batch
+    lazy_batch = (lazy["prompt_tokens_per_batch"] + lazy["completion_tokens_per_batch"]) / per_batch
+    row(f"tok/question @{args.read_rate:.0%} read", eager_total, lazy_batch + args.read_rate * explain_total)
+    lines.append(f"on-demand explanation: p50 {lazy['explain_seconds']['p50'] * 1000:.0f}ms, "
+                 f"{explain_total:.0f} tokens each")
+    if explain_total:
+        lines.append(f"lazy uses fewer tokens while under {(eager_total - lazy_batch) / explain_total:.0%} "
+                     "of explanations are opened")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare eager and lazy explanation generation.")
+    parser.add_argument("--batches", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--read-rate", type=float, default=0.3, help="Share of questions whose explanation is opened")
+    parser.add_argument("--provider", choices=["local", "env"], default="local")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stand-in seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Stand-in seconds per completion token")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    eager = run_mode(args, lazy=False)
+    lazy = run_mode(args, lazy=True)
+    print(report(eager, lazy, args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "eager": eager, "lazy": lazy}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Benchmarks for the hybrid (template) question generators.
+
+For every HybridGenerator.generate_* method, across several seeds, measures
+throughput, p50/p99 latency, distractor-loop iterations and rejections (loop
+passes beyond the three distractors a question needs) and the peak memory
+allocated per call. QuestionGenerator.generate_batch is measured the same way
+over a batch made only of hybrid patterns, so dispatch overhead shows up too.
+Timings come from the fastest of --repeat passes over the same seeded calls.
+
+    python -m tools.bench_hybrid run                        # print results
+    python -m tools.bench_hybrid run --output current.json
+    python -m tools.bench_hybrid run --save-baseline        # refresh tools/baselines/hybrid.json
+    python -m tools.bench_hybrid compare current.json --threshold 0.25
+
+`compare` (or `run --compare`) exits with status 1 when any benchmark is
+slower, rejects more distractors or allocates more than the baseline by more
+than the threshold. Each benchmark also times a fixed calibration loop
+between its timing passes, and its timings are compared relative to that,
+so a baseline recorded on another machine (or under other load) still
+applies; only the speed of the generators against plain Python is compared.
+"""
+import argparse
+import ast
+import inspect
+import json
+import os
+import random
+import signal
+import sys
+import time
+import tracemalloc
+
+from llm import hybrid_gen
+from llm.generator import QuestionGenerator
+from llm.hybrid_gen import HybridGenerator
+from llm.providers import LocalProvider
+from tools.stats import percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "hybrid.json")
+DISTRACTORS = 3
+# A distractor loop this long almost certainly can't find enough distinct options
+RUNAWAY_ITERATIONS = 10000
+# Wall-clock budget per benchmark, so a generator that never returns fails instead of hanging the run
+BUDGET_SECONDS = 300
+# Draws in the calibration loop; about as many as 2000 generator calls make
+CALIBRATION_ROUNDS = 20000
+
+# Pattern names dispatched to each hybrid method by QuestionGenerator._get_hybrid_type
+HYBRID_PATTERN_NAMES = [
+    "Mix fraction", "Fraction subtraction", "Per to fraction and vice versa", "Basic fraction to per",
+    "Find original number", "Fraction to decimal", "Swap of percentage", "Breakdown percentage",
+    "Percentage equations and ratios", "Base comparisons and successive chains",
+    "Applied scenarios and complex calculations",
+]
+
+
+class RunawayLoop(Exception):
+    pass
+
+
+def _distractor_loop_lines():
+    """Line numbers of the `while len(options) < 4` loops in hybrid_gen.py."""
+    tree = ast.parse(inspect.getsource(hybrid_gen))
+    return {
+        node.lineno for node in ast.walk(tree)
+        if isinstance(node, ast.While) and "options" in ast.unparse(node.test)
+    }
+
+
+class LoopCounter:
+    """Counts distractor-loop condition checks with sys.settrace (only used in
+    the counting pass, never while timing)."""
+
+    def __init__(self):
+        self.lines = _distractor_loop_lines()
+        self.filename = hybrid_gen.__file__
+        self.checks = 0
+
+    def _local(self, frame, event, arg):
+        if event == "line" and frame.f_lineno in self.lines:
+            self.checks += 1
+            if self.checks > RUNAWAY_ITERATIONS:
+                raise RunawayLoop(f"{frame.f_code.co_name} looped {self.checks} times")
+        return self._local
+
+    def _global(self, frame, event, arg):
+        return self._local if frame.f_code.co_filename == self.filename else None
+
+    def iterations(self, func):
+        """Loop passes made by one call (each loop checks its condition once more than it runs)."""
+        self.checks = 0
+        sys.settrace(self._global)
+        try:
+            func()
+        finally:
+            sys.settrace(None)
+        return max(0, self.checks - 1)
+
+
+def benchmarks():
+    hybrid = HybridGenerator()
+    cases = {
+        name: getattr(hybrid, name)
+        for name, _ in inspect.getmembers(HybridGenerator, inspect.isfunction)
+        if name.startswith("generate_")
+    }
+    generator = QuestionGenerator(LocalProvider(seed=0))
+    patterns = [
+        {"id": i, "topic_name": "Quant", "name": name, "description": "", "difficulty": 3, "avoid_questions": []}
+        for i, name in enumerate(HYBRID_PATTERN_NAMES, start=1)
+    ]
+    cases["QuestionGenerator.generate_batch[all hybrid]"] = lambda: generator.generate_batch(patterns)
+    return cases
+
+
+def calibrate():
+    """Nanoseconds for a fixed pure-Python workload like the generators' (random
+    draws, arithmetic, string formatting)."""
+    rng = random.Random(0)
+    options = []
+    started = time.perf_counter_ns()
+    for i in range(CALIBRATION_ROUNDS):
+        a, b = rng.randint(2, 99), rng.randint(2, 99)
+        options.append(f"{a * b / (i % 7 + 1):.2f}")
+        if len(options) > DISTRACTORS:
+            options.clear()
+    return time.perf_counter_ns() - started
+
+
+def _out_of_budget(signum, frame):
+    raise RunawayLoop(f"did not finish within {BUDGET_SECONDS}s")
+
+
+def measure(name, func, seeds, iterations, repeat, counter):
+    signal.signal(signal.SIGALRM, _out_of_budget)
+    signal.alarm(BUDGET_SECONDS)
+    try:
+        return _measure(name, func, seeds, iterations, repeat, counter)
+    finally:
+        signal.alarm(0)
+
+
+def _measure(name, func, seeds, iterations, repeat, counter):
+    random.seed(0)
+    for _ in range(max(1, iterations // 10)):
+        func() # warm-up, untimed
+    # Like timeit, keep the fastest repeat: slower ones measure other load on the machine.
+    # Percentiles too are the lowest any repeat saw, as one interrupt-heavy pass skews the tail.
+    timings = None
+    p50s, p99s = [], []
+    # Timed next to the passes, so both see the same machine and load
+    calibrations = [calibrate()]
+    for _ in range(repeat):
+        attempt = []
+        for seed in seeds:
+            random.seed(seed)
+            for _ in range(iterations):
+                started = time.perf_counter_ns()
+                func()
+                attempt.append(time.perf_counter_ns() - started)
+        p50s.append(percentile(attempt, 50))
+        p99s.append(percentile(attempt, 99))
+        if timings is None or sum(attempt) < sum(timings):
+            timings = attempt
+        calibrations.append(calibrate())
+
+    loop_iterations = []
+    peaks = []
+    samples = max(1, iterations // 10)
+    is_batch = name.startswith("QuestionGenerator")
+    tracemalloc.start()
+    try:
+        for seed in seeds:
+            random.seed(seed)
+            for _ in range(samples):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                func()
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    if not is_batch:
+        for seed in seeds:
+            random.seed(seed)
+            loop_iterations += [counter.iterations(func) for _ in range(samples)]
+
+    total_seconds = sum(timings) / 1e9
+    result = {
+        "calls": len(timings),
+        "calls_per_second": round(len(timings) / total_seconds, 1),
+        "p50_us": round(min(p50s) / 1000, 2),
+        "p99_us": round(min(p99s) / 1000, 2),
+        "alloc_peak_bytes": round(sum(peaks) / len(peaks)),
+        "calibration_ns": min(calibrations),
+    }
+    if loop_iterations:
+        rejections = [max(0, n - DISTRACTORS) for n in loop_iterations]
+        result.update({
+            "loop_iterations_mean": round(sum(loop_iterations) / len(loop_iterations), 2),
+            "loop_iterations_max": max(loop_iterations),
+            "rejections_mean": round(sum(rejections) / len(rejections), 2),
+        })
+    return result
+
+
+def run(args):
+    counter = LoopCounter()
+    results = {}
+    print(f"{'benchmark':<46} {'calls/s':>10} {'p50 us':>8} {'p99 us':>8} {'loop avg':>8} "
+          f"{'loop max':>8} {'rejects':>8} {'peak B':>8}")
+    for name, func in benchmarks().items():
+        try:
+            result = measure(name, func, args.seeds, args.iterations, args.repeat, counter)
+        except Exception as e:
+            # A crashing or runaway generator is a result too; compare flags it
+            result = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{name:<46} FAILED: {result['error']}")
+        else:
+            print(f"{name:<46} {result['calls_per_second']:>10} {result['p50_us']:>8} {result['p99_us']:>8} "
+                  f"{result.get('loop_iterations_mean', '-'):>8} {result.get('loop_iterations_max', '-'):>8} "
+                  f"{result.get('rejections_mean', '-'):>8} {result['alloc_peak_bytes']:>8}")
+        results[name] = result
+
+    report = {"python": sys.version.split()[0], "seeds": args.seeds, "iterations": args.iterations, "results": results}
+    for path in filter(None, [args.output, BASELINE_PATH if args.save_baseline else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {path}")
+    if args.compare:
+        return compare_reports(report, load(args.compare), args.threshold)
+    return 0
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# metric -> True when higher is better
+COMPARED = {
+    "calls_per_second": True,
+    "p99_us": False,
+    "rejections_mean": False,
+    "alloc_peak_bytes": False,
+}
+# Metrics scaled by the calibration loop before comparing: time per call, or its inverse
+TIMED = {"calls_per_second": -1, "p99_us": 1}
+
+
+def compare_reports(current, baseline, threshold):
+    for key in ("python", "seeds", "iterations"):
+        if current.get(key) != baseline.get(key):
+            print(f"warning: {key} differs from the baseline ({current.get(key)} vs {baseline.get(key)})")
+    uncalibrated = False
+    regressions = []
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None or "error" in base:
+            continue
+        if "error" in now:
+            regressions.append(f"{name}: {now['error']}")
+            continue
+        # How much slower the machine ran the calibration loop than the baseline's did
+        scale = 1.0
+        if base.get("calibration_ns") and now.get("calibration_ns"):
+            scale = now["calibration_ns"] / base["calibration_ns"]
+        else:
+            uncalibrated = True
+        for metric, higher_is_better in COMPARED.items():
+            if metric not in base or metric not in now:
+                continue
+            old, new = base[metric], now[metric]
+            if metric in TIMED:
+                # As if measured on the baseline's machine
+                new = round(new / scale ** TIMED[metric], 2)
+            if old == 0:
+                # e.g. rejections going from none to a few; allow small absolute noise
+                worse = new > 0.5 if not higher_is_better else False
+                change = new
+            else:
+                change = (new - old) / old
+                worse = -change > threshold if higher_is_better else change > threshold
+            marker = "REGRESSION" if worse else "ok"
+            print(f"{marker:<10} {name:<46} {metric:<18} {old:>10} -> {new:<10} ({change:+.1%})")
+            if worse:
+                regressions.append(f"{name} {metric}")
+
+    if uncalibrated:
+        print("\nwarning: some timings have no calibration and were compared as measured; "
+              "regenerate the baseline on this machine (run --save-baseline) before trusting them")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hybrid question generators.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3, 4, 5])
+    run_parser.add_argument("--iterations", type=int, default=2000, help="Calls per generator per seed")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Timing passes; the fastest is kept")
+    run_parser.add_argument("--output", help="Write results as JSON")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"Also write {BASELINE_PATH}")
+    run_parser.add_argument("--compare", metavar="BASELINE", help="Compare against a baseline afterwards")
+    run_parser.add_argument("--threshold", type=float, default=0.25)
+
+    compare_parser = sub.add_parser("compare", help="Compare a results file with a baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--baseline", default=BASELINE_PATH)
+    compare_parser.add_argument("--threshold", type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run(args))
+    sys.exit(compare_reports(load(args.current), load(args.baseline), args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Serves POST /openai/v1/chat/completions with well-formed question JSON so the
+generator can run without network access or API cost. Latency, server errors
+and malformed responses are configurable to exercise the failure paths.
+
+    python -m tools.fake_llm --port 8082 --llm-latency 1.5 --llm-jitter 0.5 --llm-failure-rate 0.05
+    GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:8082 python bot.py
+
+For in-process use without HTTP, set LLM_PROVIDER=local instead (llm/providers.py).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from llm.providers import LocalProvider, estimate_tokens
+from utils.http_server import HTTPServer, Response
+
+
+class FakeLLM:
+    def __init__(self, host="127.0.0.1", port=8082, latency=0.5, jitter=0.0,
+                 failure_rate=0.0, malformed_rate=0.0, seed=None):
+        self.server = HTTPServer(host, port)
+        self.server.route("POST", "/openai/v1/chat/completions", self._completions)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        # Question content comes from the same seeded stand-in the generator can use in-process
+        self.provider = LocalProvider(seed=seed)
+        self.calls = Counter()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.server.port}"
+
+    async def start(self):
+        await self.server.start()
+        return self
+
+    async def stop(self):
+        await self.server.stop()
+
+    async def _completions(self, request):
+        body = json.loads(request.body)
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        prompt = next((m["content"] for m in messages if m["role"] == "user"), "")
+
+        await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        if self.rng.random() < self.failure_rate:
+            self.calls["failed"] += 1
+            return Response(503, json.dumps({"error": {"message": "Fake overload", "type": "server_error"}}),
+                            content_type="application/json")
+
+        task, payload = self.provider.respond(system, prompt)
+        self.calls[task] += 1
+        content = json.dumps(payload)
+        if self.rng.random() < self.malformed_rate:
+            self.calls["malformed"] += 1
+            content = content[:len(content) // 2]
+
+        prompt_tokens = estimate_tokens(system) + estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+        payload = {
+            "id": f"chatcmpl-fake-{sum(self.calls.values())}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+        return Response(200, json.dumps(payload), content_type="application/json")
+
+
+def add_arguments(parser):
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Base seconds per completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Extra uniform random seconds")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0, help="Share of truncated JSON responses")
+    parser.add_argument("--seed", type=int)
+
+
+def from_args(args, host="127.0.0.1", port=8082):
+    return FakeLLM(host, port, args.llm_latency, args.llm_jitter, args.llm_failure_rate,
+                   args.llm_malformed_rate, args.seed)
+
+
+async def serve(args):
+    fake = await from_args(args, args.host, args.port).start()
+    print(f"Fake LLM listening, start the bot with GROQ_BASE_URL={fake.base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Groq chat completions stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
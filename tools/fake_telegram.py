@@ -0,0 +1,250 @@
+"""
+Local stand-in for the Telegram Bot API.
+
+Answers the Bot API methods the bot uses (getMe, getUpdates, setWebhook,
+sendMessage, editMessageText, ...) and delivers synthetic updates either
+through getUpdates (polling) or by POSTing them to the bot's webhook.
+
+As a script it measures end-to-end update latency: the time from handing an
+update to the bot until the bot's reply reaches the stand-in.
+
+    # terminal 1 (polling)
+    TELEGRAM_BOT_TOKEN=1:fake TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot python bot.py
+    # terminal 2
+    python -m tools.fake_telegram --mode polling --updates 200
+
+    # webhook: start the bot with BOT_MODE=webhook WEBHOOK_SECRET=local instead, then
+    python -m tools.fake_telegram --mode webhook --webhook-url http://127.0.0.1:10000/telegram --webhook-secret local
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from urllib.parse import parse_qs
+
+import httpx
+
+from utils.http_server import HTTPServer, Response
+from tools.stats import format_summary
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def _decode_params(request):
+    if not request.body:
+        return dict(request.query)
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(request.body)
+    params = {k: v[0] for k, v in parse_qs(request.body.decode("utf-8")).items()}
+    # PTB sends non-string values JSON-encoded inside the form
+    for key, value in params.items():
+        if key != "text" and (value[:1] in ("{", "[") or value.lstrip("-").isdigit()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                pass
+    return params
+
+
+class FakeTelegram:
+    def __init__(self, host="127.0.0.1", port=8081, webhook_url=None, webhook_secret=None,
+                 update_sink=None, on_message=None):
+        """`update_sink` (async callable) receives updates instead of getUpdates or
+        the webhook, e.g. an Application's update_queue.put; `on_message` is called
+        with (chat_id, message) for every message the bot sends or edits."""
+        self.server = HTTPServer(host, port)
+        self.server.route_prefix("POST", "/bot", self._dispatch)
+        self.server.route_prefix("GET", "/bot", self._dispatch)
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.update_sink = update_sink
+        self.on_message = on_message
+        self.calls = Counter()
+        self.last_message = {}
+        self.bot_ready = asyncio.Event()
+        self._updates = []
+        self._updates_event = asyncio.Event()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._reply_waiters = defaultdict(list)
+        self._client = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.server.port}/bot"
+
+    async def start(self):
+        await self.server.start()
+        self._client = httpx.AsyncClient(timeout=30)
+        return self
+
+    async def stop(self):
+        await self.server.stop()
+        if self._client:
+            await self._client.aclose()
+
+    # --- Synthetic updates -------------------------------------------------
+
+    def _new_message_id(self):
+        self._next_message_id += 1
+        return self._next_message_id
+
+    @staticmethod
+    def _user(chat_id):
+        return {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}", "username": f"user{chat_id}"}
+
+    def message_update(self, chat_id, text):
+        message = {
+            "message_id": self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"},
+            "from": self._user(chat_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"message": message}
+
+    def callback_update(self, chat_id, message_id, data):
+        return {"callback_query": {
+            "id": str(self._new_message_id()),
+            "from": self._user(chat_id),
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "",
+            },
+        }}
+
+    async def deliver(self, update):
+        """Hand an update to the bot via getUpdates or its webhook."""
+        update = dict(update, update_id=self._next_update_id)
+        self._next_update_id += 1
+        if self.update_sink:
+            await self.update_sink(update)
+        elif self.webhook_url:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook_secret} if self.webhook_secret else {}
+            await self._client.post(self.webhook_url, json=update, headers=headers)
+        else:
+            self._updates.append(update)
+            self._updates_event.set()
+        return update
+
+    def expect_reply(self, chat_id):
+        """Future resolved with the next message the bot sends or edits in `chat_id`."""
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters[chat_id].append(future)
+        return future
+
+    # --- Bot API -----------------------------------------------------------
+
+    def _record_message(self, chat_id, params, message_id=None):
+        message = {
+            "message_id": message_id or self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        markup = params.get("reply_markup")
+        # Only inline keyboards belong on a Message; reply keyboards are kept for inspection
+        if isinstance(markup, dict) and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        self.last_message[chat_id] = dict(message, reply_markup=markup)
+        if self.on_message:
+            self.on_message(chat_id, self.last_message[chat_id])
+        for future in self._reply_waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_result(message)
+        return message
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), timeout=float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    async def _dispatch(self, request):
+        method = request.path.rsplit("/", 1)[-1]
+        params = _decode_params(request)
+        self.calls[method] += 1
+
+        if method == "getMe":
+            self.bot_ready.set()
+            result = BOT_USER
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "getWebhookInfo":
+            result = {"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": 0}
+        elif method == "sendMessage":
+            result = self._record_message(int(params["chat_id"]), params)
+        elif method == "editMessageText":
+            result = self._record_message(int(params["chat_id"]), params, message_id=int(params["message_id"]))
+        else:
+            # setWebhook, deleteWebhook, deleteMessage, answerCallbackQuery, ...
+            result = True
+        return Response(200, json.dumps({"ok": True, "result": result}), content_type="application/json")
+
+
+async def measure_latency(args):
+    webhook_url = args.webhook_url if args.mode == "webhook" else None
+    fake = await FakeTelegram(args.host, args.port, webhook_url, args.webhook_secret).start()
+    print(f"Fake Telegram listening, start the bot with TELEGRAM_API_BASE_URL={fake.base_url}")
+    await fake.bot_ready.wait()
+    if args.mode == "polling":
+        # Give the bot a moment to delete the webhook and start long polling
+        await asyncio.sleep(1)
+
+    async def one_user(chat_id, count):
+        latencies = []
+        for _ in range(count):
+            reply = fake.expect_reply(chat_id)
+            started = time.perf_counter()
+            await fake.deliver(fake.message_update(chat_id, args.text))
+            await asyncio.wait_for(reply, timeout=args.timeout)
+            latencies.append(time.perf_counter() - started)
+            if args.interval:
+                await asyncio.sleep(args.interval)
+        return latencies
+
+    per_user = max(1, args.updates // args.users)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one_user(args.base_chat_id + i, per_user) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    latencies = [value for user in results for value in user]
+
+    print(f"--- {args.mode} end-to-end latency ({args.text!r}) ---")
+    print(format_summary("update -> reply", latencies))
+    print(f"Throughput: {len(latencies) / elapsed:.1f} updates/s over {elapsed:.1f}s")
+    print(f"Bot API calls: {dict(fake.calls)}")
+    await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Telegram Bot API stand-in and latency probe.")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:10000/telegram")
+    parser.add_argument("--webhook-secret")
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--base-chat-id", type=int, default=900000)
+    parser.add_argument("--text", default="/start")
+    parser.add_argument("--interval", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(measure_latency(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Load test: N simulated students driving the real Application and handlers.
+
+Each user runs /start, the daily plan and a daily session, then a custom
+practice session (category -> topic -> pattern -> start), answering questions
+with random options. Telegram and Groq are replaced by the local stand-ins in
+tools/fake_telegram.py and tools/fake_llm.py; the database is whatever
+DATABASE_URL points at, so use a local, seeded Postgres.
+
+    DATABASE_URL=postgresql://localhost/aptitude_test \\
+        python -m tools.loadtest --users 50 --answers 5 --llm-latency 1.5 --llm-failure-rate 0.05
+
+Reports throughput, p50/p95/p99 per step, and DB query, LLM and Bot API call
+counts. --output writes the same numbers as JSON for comparing releases.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+
+from telegram import Update
+
+from tools import fake_llm
+from tools.fake_telegram import FakeTelegram
+from tools.stats import format_summary, summarize
+
+TERMINAL_MARKERS = ("Complete", "Failed", "Error", "clear")
+
+
+def buttons(message):
+    markup = message.get("reply_markup") or {}
+    return [b.get("callback_data", "") for row in markup.get("inline_keyboard", []) for b in row]
+
+
+def is_question(message):
+    return any(data.startswith("ans_") for data in buttons(message))
+
+
+def is_terminal(message):
+    return any(marker in message.get("text", "") for marker in TERMINAL_MARKERS)
+
+
+class StepTimeout(Exception):
+    pass
+
+
+class SimulatedUser:
+    def __init__(self, fake, chat_id, args, timings, rng):
+        self.fake = fake
+        self.chat_id = chat_id
+        self.args = args
+        self.timings = timings
+        self.rng = rng
+        self.inbox = asyncio.Queue()
+
+    async def step(self, name, update, predicate):
+        """Deliver `update` and wait for the first bot message matching `predicate`."""
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+        started = time.perf_counter()
+        await self.fake.deliver(update)
+        deadline = started + self.args.timeout
+        while True:
+            try:
+                message = await asyncio.wait_for(self.inbox.get(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                raise StepTimeout(name)
+            if predicate(message):
+                self.timings[name].append(time.perf_counter() - started)
+                return message
+
+    async def think(self):
+        if self.args.think_time:
+            await asyncio.sleep(self.rng.uniform(0, self.args.think_time))
+
+    def tap(self, message, data):
+        return self.fake.callback_update(self.chat_id, message["message_id"], data)
+
+    def choose(self, message, prefix):
+        options = [data for data in buttons(message) if data.startswith(prefix)]
+        return self.rng.choice(options) if options else None
+
+    async def answer_questions(self, flow, question):
+        for _ in range(self.args.answers):
+            if not is_question(question):
+                return
+            await self.think()
+            question = await self.step(
+                f"{flow}_answer", self.tap(question, self.choose(question, "ans_")),
+                lambda m: is_question(m) or is_terminal(m)
+            )
+
+    async def run(self):
+        await self.step("start", self.fake.message_update(self.chat_id, "/start"), lambda m: True)
+
+        await self.think()
+        plan = await self.step(
+            "daily_plan", self.fake.message_update(self.chat_id, "Daily Practice 🕒"),
+            lambda m: "start_daily_session" in buttons(m) or is_terminal(m)
+        )
+        if "start_daily_session" in buttons(plan):
+            question = await self.step(
+                "daily_first_question", self.tap(plan, "start_daily_session"),
+                lambda m: is_question(m) or is_terminal(m)
+            )
+            await self.answer_questions("daily", question)
+
+        await self.think()
+        menu = await self.step(
+            "custom_menu", self.fake.message_update(self.chat_id, "Custom Practice 🛠️"),
+            lambda m: self.choose(m, "cat_") is not None
+        )
+        topics = await self.step("custom_topics", self.tap(menu, self.choose(menu, "cat_")), lambda m: True)
+        if not self.choose(topics, "topic_"):
+            return
+        patterns = await self.step("custom_patterns", self.tap(topics, self.choose(topics, "topic_")), lambda m: True)
+        if not self.choose(patterns, "togglepattern_"):
+            return
+        selected = await self.step(
+            "custom_select", self.tap(patterns, self.choose(patterns, "togglepattern_")),
+            lambda m: "start_practice_session" in buttons(m)
+        )
+        question = await self.step(
+            "custom_first_question", self.tap(selected, "start_practice_session"),
+            lambda m: is_question(m) or is_terminal(m)
+        )
+        await self.answer_questions("custom", question)
+
+
+def _call_counts(metrics, name, label):
+    counts = Counter()
+    for labels, count in metrics.histogram_counts(name).items():
+        counts[dict(labels).get(label, "")] += count
+    return counts
+
+
+async def start_environment(args, on_message):
+    """Start the Telegram and LLM stand-ins and build the bot's Application against them."""
+    application = None
+
+    async def enqueue(update):
+        await application.update_queue.put(Update.de_json(update, application.bot))
+
+    fake = await FakeTelegram(port=0, update_sink=enqueue, on_message=on_message).start()
+    llm = await fake_llm.from_args(args, port=0).start()
+
+    # The generator builds its Groq client at import, so point it at the stand-ins first
+    os.environ["TELEGRAM_API_BASE_URL"] = fake.base_url
+    os.environ["GROQ_BASE_URL"] = llm.base_url
+    os.environ.setdefault("GROQ_API_KEY", "loadtest")
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "1:loadtest")
+    os.environ.pop("UPDATE_LOG_PATH", None) # Never record synthetic traffic
+    bot = importlib.import_module("bot")
+    application = bot.build_application()
+    return fake, llm, application
+
+
+def call_report(fake, llm, steps):
+    from utils.metrics import metrics
+    db_calls = _call_counts(metrics, "db_query_seconds", "query")
+    return {
+        "db_queries": sum(db_calls.values()),
+        "db_queries_per_step": round(sum(db_calls.values()) / max(1, steps), 2),
+        "db_queries_by_method": dict(db_calls.most_common()),
+        "llm_calls": dict(llm.calls),
+        "bot_api_calls": dict(fake.calls),
+    }
+
+
+def print_call_report(report):
+    print(f"DB queries: {report['db_queries']} ({report['db_queries_per_step']} per step)")
+    for method, count in list(report["db_queries_by_method"].items())[:10]:
+        print(f"  {method:<32} {count}")
+    print(f"LLM calls: {report['llm_calls']}")
+    print(f"Bot API calls: {report['bot_api_calls']}")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    users = {}
+
+    def route_message(chat_id, message):
+        if chat_id in users:
+            users[chat_id].inbox.put_nowait(message)
+
+    fake, llm, application = await start_environment(args, route_message)
+    timings = defaultdict(list)
+    errors = Counter()
+
+    async def one_user(index):
+        await asyncio.sleep(args.ramp * index / max(1, args.users))
+        chat_id = args.base_chat_id + index
+        user = users[chat_id] = SimulatedUser(fake, chat_id, args, timings, random.Random(rng.random()))
+        try:
+            await user.run()
+        except StepTimeout as e:
+            errors[f"timeout:{e}"] += 1
+        except Exception as e:
+            errors[type(e).__name__] += 1
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(one_user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    await fake.stop()
+    await llm.stop()
+
+    steps = sum(len(values) for values in timings.values())
+    report = {
+        "users": args.users,
+        "elapsed_seconds": round(elapsed, 3),
+        "steps_per_second": round(steps / elapsed, 2) if elapsed else 0.0,
+        "steps": {name: summarize(values) for name, values in sorted(timings.items())},
+        "errors": dict(errors),
+        **call_report(fake, llm, steps),
+    }
+
+    print(f"--- load test: {args.users} users, {args.answers} answers per session ---")
+    for name, values in sorted(timings.items()):
+        print(format_summary(name, values))
+    print(f"Throughput: {report['steps_per_second']} steps/s over {elapsed:.1f}s")
+    print(f"Errors: {dict(errors) or 'none'}")
+    print_call_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot's handlers with simulated users.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--answers", type=int, default=5, help="Answers per practice session")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which users join")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between steps")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a step counts as failed")
+    parser.add_argument("--base-chat-id", type=int, default=700000)
+    parser.add_argument("--output", help="Write the report as JSON")
+    fake_llm.add_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
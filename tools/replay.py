@@ -0,0 +1,155 @@
+"""
+Replay a recorded update log through the real handlers.
+
+Feeds a log written with UPDATE_LOG_PATH (see utils/update_log.py) back into
+the bot's Application, preserving each user's order and the gaps between
+updates, scaled by --speed (1 = real time, 10 = ten times faster, 0 = as fast
+as possible). Telegram and Groq are the local stand-ins used by
+tools/loadtest.py; the database is whatever DATABASE_URL points at.
+
+    DATABASE_URL=postgresql://localhost/aptitude_test \\
+        python -m tools.replay updates.jsonl.gz --speed 20 --output replay.json
+
+Latency is measured from handing an update to the Application until its last
+handler group has run, grouped by command, menu text or callback prefix.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from tools import fake_llm
+from tools.loadtest import buttons, call_report, print_call_report, start_environment
+from tools.stats import format_summary, summarize
+from utils.update_log import read_log
+
+CALLBACK_ID_RE = re.compile(r"_?-?\d.*$")
+
+
+def label(record):
+    if record["k"] == "c":
+        return "cb:" + (CALLBACK_ID_RE.sub("", record["d"]) or record["d"])
+    if record["d"].startswith("/") or not set(record["d"]) <= {"x"}:
+        return record["d"]
+    return "text"
+
+
+async def replay(args):
+    records = sorted(read_log(args.log), key=lambda r: r["t"])
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("Log is empty")
+        return {}
+
+    chat_ids = {}
+    # chat -> callback data -> id of the latest bot message carrying that button
+    button_messages = defaultdict(dict)
+    last_message_id = {}
+
+    def on_message(chat_id, message):
+        last_message_id[chat_id] = message["message_id"]
+        for data in buttons(message):
+            button_messages[chat_id][data] = message["message_id"]
+
+    fake, llm, application = await start_environment(args, on_message)
+
+    pending = {}
+    timings = defaultdict(list)
+    finished_all = asyncio.Event()
+
+    async def finished(update, context):
+        entry = pending.pop(update.update_id, None)
+        if entry:
+            name, started = entry
+            timings[name].append(time.perf_counter() - started)
+        if not pending and delivered_all:
+            finished_all.set()
+
+    # Runs after every other handler group, so it marks the end of processing
+    application.add_handler(TypeHandler(Update, finished), group=1000)
+    delivered_all = False
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        first_t = records[0]["t"]
+        for record in records:
+            if args.speed > 0:
+                due = (record["t"] - first_t) / 1000 / args.speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            chat_id = chat_ids.setdefault(record["u"], args.base_chat_id + len(chat_ids))
+            if record["k"] == "c":
+                message_id = button_messages[chat_id].get(record["d"]) or last_message_id.get(chat_id, 1)
+                update = fake.callback_update(chat_id, message_id, record["d"])
+            else:
+                update = fake.message_update(chat_id, record["d"])
+
+            delivered_at = time.perf_counter()
+            # Queueing doesn't yield to the loop, so the update can't finish before it is registered
+            delivered = await fake.deliver(update)
+            pending[delivered["update_id"]] = (label(record), delivered_at)
+
+        delivered_all = True
+        if pending:
+            try:
+                await asyncio.wait_for(finished_all.wait(), args.timeout)
+            except asyncio.TimeoutError:
+                print(f"{len(pending)} updates still running after {args.timeout}s")
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    await fake.stop()
+    await llm.stop()
+
+    processed = sum(len(values) for values in timings.values())
+    recorded_span = (records[-1]["t"] - first_t) / 1000
+    report = {
+        "updates": len(records),
+        "users": len(chat_ids),
+        "speed": args.speed,
+        "recorded_seconds": round(recorded_span, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "updates_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+        "unfinished": len(pending),
+        "latency": {name: summarize(values) for name, values in sorted(timings.items())},
+        "all": summarize([v for values in timings.values() for v in values]),
+        **call_report(fake, llm, processed),
+    }
+
+    print(f"--- replay: {len(records)} updates from {len(chat_ids)} users, "
+          f"{recorded_span:.0f}s recorded, speed {args.speed or 'max'} ---")
+    for name, values in sorted(timings.items(), key=lambda item: -len(item[1])):
+        print(format_summary(name, values))
+    print(format_summary("all updates", [v for values in timings.values() for v in values]))
+    print(f"Throughput: {report['updates_per_second']} updates/s over {elapsed:.1f}s")
+    print_call_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded update log against local stand-ins.")
+    parser.add_argument("log", help="File written via UPDATE_LOG_PATH (.jsonl or .jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression; 0 replays as fast as possible")
+    parser.add_argument("--limit", type=int, help="Only replay the first N updates")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for stragglers")
+    parser.add_argument("--base-chat-id", type=int, default=800000)
+    parser.add_argument("--output", help="Write the report as JSON")
+    fake_llm.add_arguments(parser)
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Memory held per active user by practice-session state, and what it costs in
+DB reads: the old user_data layout (pooled question dicts, the current
+question and loose counters) against PracticeSession, whose pool keeps
+question bodies as PooledQuestion records shared between sessions holding
+the same stored question.
+
+Sessions are filled through QuestionPool.append and served through
+next_question, as the handlers do, and measured with tracemalloc. Serving
+counts the DB reads it makes (none are expected). Each layout runs twice:
+with every question unique to its session, as freshly generated ones are,
+and with questions drawn from a bank of --bank-size stored questions, as
+bank hits are (the old layout kept a copy per user either way).
+
+    python -m tools.session_memory
+    python -m tools.session_memory --sessions 10000 --pool-size 5 --explanation-chars 0
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from database.db_manager import db
+from handlers.session import PracticeSession
+
+
+def make_question(question_id, args):
+    return {
+        "id": question_id,
+        "pattern_id": question_id % 500 + 1,
+        "question_text": f"Q{question_id} " + "x" * args.question_chars,
+        "options": [f"Option {i} for {question_id}" for i in range(4)],
+        "correct_option_index": question_id % 4,
+        "explanation": f"E{question_id} " + "y" * args.explanation_chars,
+        "difficulty": 3,
+    }
+
+
+def question_ids(user, args, bank):
+    """Ids of the user's pooled questions and the one on screen."""
+    count = args.pool_size + 1
+    if bank:
+        return random.Random(user).sample(range(1, args.bank_size + 1), count)
+    return range(user * count, (user + 1) * count)
+
+
+def old_layout(user, args, bank):
+    """user_data as the handlers kept it before PracticeSession."""
+    *pooled, current = question_ids(user, args, bank)
+    return {
+        "session_patterns": [user % 500 + i for i in range(5)],
+        "session_score": 0,
+        "session_total_target": 20,
+        "session_current_index": 0,
+        "custom_pool": [make_question(qid, args) for qid in pooled],
+        "current_question": make_question(current, args),
+        "current_pattern_id": user % 500,
+        "q_start_time": time.time(),
+        "current_question_message_id": 1000 + user,
+    }
+
+
+def new_layout(user, args, bank):
+    """A session with --pool-size questions pooled and one on screen, built as the handlers do."""
+    session = PracticeSession("custom", 20, pattern_ids=[user % 500 + i for i in range(5)])
+    session.pool.extend(make_question(qid, args) for qid in question_ids(user, args, bank))
+    question = session.pool.next_question()
+    session.show(question, question["pattern_id"], 1000 + user, time.time())
+    return {"session": session}
+
+
+def measure(build, args, bank):
+    """Bytes allocated to build --sessions users' state, and the state itself."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = [build(user, args, bank) for user in range(args.sessions)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, users
+
+
+def serve(users, args):
+    """Answer every session's questions in turns, as users do. Returns DB reads per question served."""
+    reads = 0
+
+    def execute_query(query, params=None, retries=1, name=None):
+        nonlocal reads
+        reads += 1
+        return [make_question(params[0], args)]
+
+    db.execute_query = execute_query
+    try:
+        served = 0
+        for _ in range(args.pool_size):
+            for user in users:
+                session = user["session"]
+                session.current_question() # Answer checking
+                question = session.pool.next_question() # Rendering the next one
+                session.show(question, question["pattern_id"], session.message_id, time.time())
+                served += 1
+        return reads / served
+    finally:
+        del db.execute_query
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-user session memory and DB reads of the old and new layouts.")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--pool-size", type=int, default=5, help="Questions buffered per session")
+    parser.add_argument("--question-chars", type=int, default=400)
+    parser.add_argument("--explanation-chars", type=int, default=1200)
+    parser.add_argument("--bank-size", type=int, default=20000, help="Stored questions sessions draw from")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions, {args.pool_size} pooled questions + 1 on screen each")
+    print(f"{'':<40}{'B/user':>8}{'MiB':>8}{'change':>8}  DB reads per question")
+    for bank, source in ((False, "unique questions"), (True, f"bank of {args.bank_size}")):
+        old_bytes, _ = measure(old_layout, args, bank)
+        new_bytes, users = measure(new_layout, args, bank)
+        read_rate = serve(users, args)
+        del users
+        for label, size, rate in ((f"user_data dicts, {source}", old_bytes, None),
+                                  (f"PracticeSession, {source}", new_bytes, read_rate)):
+            change = f"{size / old_bytes - 1:+8.0%}" if size != old_bytes else f"{'':>8}"
+            reads = f"{rate:.2f}" if rate is not None else "0.00"
+            print(f"{label:<40}{size / args.sessions:>8.0f}{size / 2**20:>8.1f}{change}  {reads}")
+
+
+if __name__ == "__main__":
+    main()
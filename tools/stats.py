@@ -0,0 +1,25 @@
+import math
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (pct in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+def format_summary(name, values, unit_scale=1000.0, unit="ms"):
+    s = summarize(values)
+    return (f"{name:<28} n={s['count']:<6} mean={s['mean'] * unit_scale:8.1f}{unit} "
+            f"p50={s['p50'] * unit_scale:8.1f}{unit} p95={s['p95'] * unit_scale:8.1f}{unit} "
+            f"p99={s['p99'] * unit_scale:8.1f}{unit}")
@@ -0,0 +1,242 @@
+"""
+Bulk-load synthetic users, progress and questions into a Postgres schema.
+
+Builds the bot's tables (database/schema.sql) in a separate schema and fills
+them with COPY, so a scale of 100k users x 500 patterns loads in minutes:
+
+    DATABASE_URL=postgresql://localhost/aptitude_test python -m tools.synth_db --scale large
+    DATABASE_URL=... python -m tools.synth_db --users 20000 --patterns 200 --schema bench_custom
+
+Each user practises a long-tailed number of patterns (a few for most, many for
+a few), with review dates spread around today, added-pattern rows for the
+9-day cycle and an answer history per practised pattern. The same --seed gives
+the same data. Point the bot or tools/bench_db.py at the result with
+DB_SCHEMA=<schema>.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2 import sql
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "database", "schema.sql")
+
+# name -> (users, patterns); each scale loads into schema bench_<name>
+SCALES = {
+    "small": (1000, 100),
+    "medium": (10000, 300),
+    "large": (100000, 500),
+}
+
+CATEGORIES = ["Quant", "Reasoning", "Data Insights"]
+PATTERNS_PER_TOPIC = 10
+
+# Loaded tables in dependency order, with the serial column whose sequence needs moving past the copied ids
+TABLES = [
+    ("users", None),
+    ("topics", "id"),
+    ("patterns", "id"),
+    ("questions", "id"),
+    ("user_progress", "id"),
+    ("user_added_patterns", "id"),
+    ("user_question_history", None),
+]
+
+
+class RowStream:
+    """File-like view of a row iterator in COPY text format, for copy_expert."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ""
+        self.count = 0
+
+    @staticmethod
+    def _field(value):
+        # Generated text never contains tabs, newlines or backslashes, so no escaping is needed
+        return "\\N" if value is None else str(value)
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += "\t".join(map(self._field, row)) + "\n"
+            self.count += 1
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+class Synthesizer:
+    def __init__(self, users, patterns, questions_per_pattern=40, mean_practised=30, history_per_pattern=3, seed=0):
+        self.users = users
+        self.patterns = patterns
+        self.questions_per_pattern = questions_per_pattern
+        self.mean_practised = mean_practised
+        self.history_per_pattern = history_per_pattern
+        self.seed = seed
+        self.now = datetime.now(timezone.utc)
+        self.topics = max(1, patterns // PATTERNS_PER_TOPIC)
+        self.first_user_id = 10 ** 9 # Well clear of real Telegram ids in a shared database
+
+    def _rng(self, table):
+        # One stream per table keeps each table's rows stable when another's generation changes
+        return random.Random(f"{self.seed}:{table}")
+
+    def _at(self, days):
+        return (self.now + timedelta(days=days)).isoformat()
+
+    def user_ids(self):
+        return range(self.first_user_id, self.first_user_id + self.users)
+
+    def rows_users(self):
+        rng = self._rng("users")
+        for user_id in self.user_ids():
+            yield (user_id, f"user{user_id}", "Synthetic", None, self._at(-rng.uniform(0, 365)),
+                   rng.choice([5, 10, 10, 10, 15, 20]), rng.random() < 0.05)
+
+    def rows_topics(self):
+        for topic_id in range(1, self.topics + 1):
+            # Category ids follow the INSERT order in schema.sql
+            yield (topic_id, (topic_id - 1) % len(CATEGORIES) + 1, f"Topic {topic_id}", "Synthetic topic")
+
+    def rows_patterns(self):
+        rng = self._rng("patterns")
+        for pattern_id in range(1, self.patterns + 1):
+            topic_id = (pattern_id - 1) % self.topics + 1
+            yield (pattern_id, topic_id, f"Pattern {pattern_id}", f"Synthetic pattern {pattern_id}",
+                   rng.randint(1, 5), rng.random() < 0.8, None)
+
+    def rows_questions(self):
+        rng = self._rng("questions")
+        question_id = 0
+        for pattern_id in range(1, self.patterns + 1):
+            for _ in range(self.questions_per_pattern):
+                question_id += 1
+                a, b = rng.randint(2, 99), rng.randint(2, 99)
+                options = json.dumps([str(a * b + d) for d in (0, 1, -1, 10)])
+                yield (question_id, pattern_id, f"What is {a} x {b}? ({pattern_id}/{question_id})", options,
+                       0, f"{a} x {b} = {a * b}.", rng.randint(1, 5), self._at(-rng.uniform(0, 180)))
+
+    def question_id(self, pattern_id, index):
+        return (pattern_id - 1) * self.questions_per_pattern + index + 1
+
+    def practised(self):
+        """(user_id, [pattern ids]) per user; a Pareto draw gives the long tail of heavy users."""
+        rng = self._rng("practised")
+        for user_id in self.user_ids():
+            count = min(self.patterns, int(rng.paretovariate(1.5) * self.mean_practised / 3))
+            yield user_id, rng.sample(range(1, self.patterns + 1), count)
+
+    def rows_user_progress(self):
+        rng = self._rng("user_progress")
+        row_id = 0
+        for user_id, pattern_ids in self.practised():
+            for pattern_id in pattern_ids:
+                row_id += 1
+                total = rng.randint(1, 40)
+                correct = rng.randint(0, total)
+                interval = rng.choice([1, 1, 6, 6, 15, 30, 60])
+                last = rng.uniform(0, 60)
+                yield (row_id, user_id, pattern_id, round(correct / total, 3), total, correct, self._at(-last),
+                       self._at(interval - last), interval, round(rng.uniform(1.3, 2.8), 2),
+                       round(rng.uniform(20, 180), 1), rng.randint(1, 5))
+
+    def rows_user_added_patterns(self):
+        rng = self._rng("user_added_patterns")
+        row_id = 0
+        for user_id, pattern_ids in self.practised():
+            for pattern_id in pattern_ids:
+                row_id += 1
+                yield (row_id, user_id, pattern_id, self._at(-rng.uniform(0, 60)))
+
+    def rows_user_question_history(self):
+        rng = self._rng("user_question_history")
+        for user_id, pattern_ids in self.practised():
+            for pattern_id in pattern_ids:
+                count = min(self.history_per_pattern, self.questions_per_pattern)
+                for index in rng.sample(range(self.questions_per_pattern), count):
+                    yield (user_id, self.question_id(pattern_id, index), pattern_id, rng.randint(1, 3),
+                           rng.random() < 0.7, self._at(-rng.uniform(0, 60)))
+
+    def rows(self, table):
+        return getattr(self, f"rows_{table}")()
+
+
+COLUMNS = {
+    "users": "user_id, username, first_name, last_name, joined_at, daily_goal, is_premium",
+    "topics": "id, category_id, name, description",
+    "patterns": "id, topic_id, name, description, difficulty_level, is_unlocked, prompt_guideline",
+    "questions": "id, pattern_id, question_text, options, correct_option_index, explanation, difficulty, created_at",
+    "user_progress": ("id, user_id, pattern_id, mastery_score, total_attempts, correct_attempts, last_practiced_at, "
+                      "next_review_at, srs_interval, easiness_factor, avg_time_seconds, last_difficulty_level"),
+    "user_added_patterns": "id, user_id, pattern_id, added_at",
+    "user_question_history": "user_id, question_id, pattern_id, attempts, last_correct, answered_at",
+}
+
+
+def load(conn_url, schema, synth):
+    conn = psycopg2.connect(conn_url)
+    try:
+        with conn.cursor() as cur:
+            name = sql.Identifier(schema)
+            cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(name))
+            cur.execute(sql.SQL("CREATE SCHEMA {}").format(name))
+            cur.execute(sql.SQL("SET search_path TO {}, public").format(name))
+            with open(SCHEMA_PATH) as f:
+                cur.execute(f.read())
+            conn.commit()
+
+            for table, serial in TABLES:
+                started = time.perf_counter()
+                stream = RowStream(synth.rows(table))
+                cur.copy_expert(f"COPY {table} ({COLUMNS[table]}) FROM STDIN", stream, size=1 << 16)
+                if serial:
+                    cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{serial}'), "
+                                f"(SELECT COALESCE(MAX({serial}), 0) + 1 FROM {table}), false)")
+                conn.commit()
+                print(f"{table:<24} {stream.count:>10} rows in {time.perf_counter() - started:.1f}s")
+
+            # Planner statistics, so benchmark plans match what production would choose
+            conn.autocommit = True
+            cur.execute("VACUUM ANALYZE")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic data into a Postgres schema.")
+    parser.add_argument("--scale", choices=sorted(SCALES), help="Preset users x patterns, loaded into bench_<scale>")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--patterns", type=int)
+    parser.add_argument("--questions-per-pattern", type=int, default=40)
+    parser.add_argument("--mean-practised", type=int, default=30, help="Average patterns practised per user")
+    parser.add_argument("--history-per-pattern", type=int, default=3, help="Answered questions per practised pattern")
+    parser.add_argument("--schema", help="Target schema (dropped and recreated)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    users, patterns = SCALES.get(args.scale, (1000, 100))
+    users, patterns = args.users or users, args.patterns or patterns
+    schema = args.schema or f"bench_{args.scale or f'{users}x{patterns}'}"
+    if schema == "aptitude_practice":
+        parser.error("refusing to overwrite the bot's own schema")
+
+    conn_url = os.getenv("DATABASE_URL")
+    if not conn_url:
+        parser.error("DATABASE_URL is not set")
+    synth = Synthesizer(users, patterns, args.questions_per_pattern, args.mean_practised,
+                        args.history_per_pattern, args.seed)
+    print(f"Loading {users} users x {patterns} patterns into schema {schema}")
+    load(conn_url, schema, synth)
+    print(f"Done; use DB_SCHEMA={schema}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from utils.metrics import metrics
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after being set.
+
+    `maxsize` caps the number of entries, so memory stays proportional to it;
+    the least recently used entry is evicted first. Thread-safe, since the
+    handlers also touch it from generation worker threads.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if name:
+            metrics.register_cache(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
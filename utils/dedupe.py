@@ -0,0 +1,37 @@
+import os
+from utils.cache import TTLCache
+from utils.metrics import metrics
+
+# Answer buttons already handled, per (user, question message). Kept long enough
+# to cover Telegram redelivering a callback and users tapping an old question.
+_answered = TTLCache(maxsize=50000, ttl=int(os.getenv("ANSWER_DEDUPE_TTL", 600)), name="answer_dedupe")
+# Session-start buttons only need to absorb double taps
+_tapped = TTLCache(maxsize=10000, ttl=int(os.getenv("BUTTON_DEDUPE_TTL", 30)), name="button_dedupe")
+
+def _message_id(query):
+    return query.message.message_id if query.message else None
+
+def is_duplicate_answer(query, current_message_id):
+    """True if this answer tap must be dropped: the question message was already
+    answered, or it isn't the question currently being asked."""
+    message_id = _message_id(query)
+    key = (query.from_user.id, message_id)
+    stale = current_message_id is not None and message_id != current_message_id
+    if stale or key in _answered:
+        metrics.inc("callback_duplicates_suppressed_total", kind="answer")
+        return True
+    _answered.set(key, True)
+    return False
+
+def is_duplicate_tap(query):
+    """True if the same button on the same message was pressed moments ago."""
+    key = (query.from_user.id, _message_id(query), query.data)
+    if key in _tapped:
+        metrics.inc("callback_duplicates_suppressed_total", kind=query.data)
+        return True
+    _tapped.set(key, True)
+    return False
+
+def forget_tap(query):
+    """Let the same button be pressed again at once, e.g. to retry after a failure."""
+    _tapped.pop((query.from_user.id, _message_id(query), query.data))
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+STATUS_TEXT = {200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden",
+               404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+MAX_HEADERS = 100
+
+class BadRequest(Exception):
+    def __init__(self, status=400):
+        super().__init__(STATUS_TEXT[status])
+        self.status = status
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+class Response:
+    def __init__(self, status=200, body=b"", content_type="text/plain; charset=utf-8"):
+        self.status = status
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.content_type = content_type
+
+class HTTPServer:
+    """Minimal HTTP/1.1 server running inside the current asyncio event loop.
+
+    Just enough for the Telegram webhook, health checks and local stand-ins:
+    exact-path and prefix routes, Content-Length bodies and keep-alive.
+    Handlers are `async def handler(request) -> Response`.
+
+    The port is public in webhook mode, so bodies over `max_body` bytes get
+    413 without being read, malformed requests get 400, and a client that
+    takes longer than `read_timeout` seconds to send a request (or to start
+    the next one on a kept-alive connection) is disconnected.
+    """
+
+    def __init__(self, host="0.0.0.0", port=10000, max_body=1024 * 1024, read_timeout=10):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.read_timeout = read_timeout
+        self._routes = {}
+        self._prefix_routes = []
+        self._server = None
+        self._writers = set()
+
+    def route(self, method, path, handler):
+        self._routes[(method, path)] = handler
+
+    def route_prefix(self, method, prefix, handler):
+        self._prefix_routes.append((method, prefix, handler))
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _find_handler(self, method, path):
+        lookup = "GET" if method == "HEAD" else method
+        handler = self._routes.get((lookup, path))
+        if handler:
+            return handler
+        for route_method, prefix, prefix_handler in self._prefix_routes:
+            if route_method == lookup and path.startswith(prefix):
+                return prefix_handler
+        return None
+
+    async def _read_request(self, reader):
+        """The next request on the connection, or None once the client is done."""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise BadRequest()
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, sep, value = line.decode("latin-1").partition(":")
+            if not sep or len(headers) >= MAX_HEADERS:
+                raise BadRequest()
+            headers[name.strip().lower()] = value.strip()
+
+        raw_length = headers.get("content-length", "0") or "0"
+        if not raw_length.isdigit():
+            raise BadRequest()
+        length = int(raw_length)
+        if length > self.max_body:
+            raise BadRequest(413)
+        body = await reader.readexactly(length) if length else b""
+        return method, target, version, headers, body
+
+    async def _handle_connection(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    parsed = await asyncio.wait_for(self._read_request(reader), self.read_timeout)
+                except BadRequest as e:
+                    # The rest of the stream can't be trusted, so answer and hang up
+                    self._write_response(writer, Response(e.status, str(e)), keep_alive=False)
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, ValueError):
+                    # Too slow, or a line over the reader's limit
+                    break
+                if parsed is None:
+                    break
+                method, target, version, headers, body = parsed
+                request = Request(method, target, headers, body)
+
+                handler = self._find_handler(method, request.path)
+                if handler is None:
+                    response = Response(404, "Not Found")
+                else:
+                    try:
+                        response = await handler(request)
+                    except Exception:
+                        logging.exception(f"HTTP handler failed for {method} {request.path}")
+                        response = Response(500, "Internal Server Error")
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                self._write_response(writer, response, keep_alive, with_body=method != "HEAD")
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _write_response(writer, response, keep_alive, with_body=True):
+        head = (
+            f"HTTP/1.1 {response.status} {STATUS_TEXT.get(response.status, '')}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Content-Length: {len(response.body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+        if with_body:
+            writer.write(response.body)
@@ -13,29 +13,58 @@ def category_keyboard(categories):
         keyboard.append([InlineKeyboardButton(cat['name'], callback_data=f"cat_{cat['id']}")])
     return InlineKeyboardMarkup(keyboard)
 
-def topic_keyboard(topics):
+def page_query(token):
+    """Keyword arguments for DatabaseManager.get_*_page from a page token:
+    "a<id>" is the page after that id, "b<id>" the page before it."""
+    if token and token[0] in "ab" and token[1:].isdigit():
+        return {"after_id" if token[0] == "a" else "before_id": int(token[1:])}
+    return {}
+
+def page_anchor(page):
+    """Token that redraws the same page, e.g. after a toggle."""
+    return f"a{page['items'][0]['id'] - 1}" if page['items'] else "a0"
+
+def _page_nav_row(prefix, parent_id, page):
+    row = []
+    if page['has_prev'] and page['items']:
+        row.append(InlineKeyboardButton("◀️ Prev", callback_data=f"{prefix}_{parent_id}_b{page['items'][0]['id']}"))
+    if page['has_next'] and page['items']:
+        row.append(InlineKeyboardButton("Next ▶️", callback_data=f"{prefix}_{parent_id}_a{page['items'][-1]['id']}"))
+    return row
+
+def topic_keyboard(page, category_id):
+    """One page of a category's topics (from db.get_topics_page)."""
     keyboard = []
-    for topic in topics:
+    for topic in page['items']:
         keyboard.append([InlineKeyboardButton(topic['name'], callback_data=f"topic_{topic['id']}")])
+    nav = _page_nav_row("tpage", category_id, page)
+    if nav:
+        keyboard.append(nav)
     keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="back_to_cats")])
     return InlineKeyboardMarkup(keyboard)
 
-def pattern_keyboard(patterns, selected_ids=None):
+def pattern_keyboard(page, topic_id, selected_ids=None):
+    """One page of a topic's patterns (from db.get_patterns_page). Selection
+    is kept in user_data, so it covers every page and topic."""
     if selected_ids is None:
         selected_ids = []
     
     keyboard = []
-    for p in patterns:
+    anchor = page_anchor(page)
+    for p in page['items']:
         is_selected = p['id'] in selected_ids
         btn_text = f"{'✅ ' if is_selected else ''}{p['name']}"
-        keyboard.append([InlineKeyboardButton(btn_text, callback_data=f"togglepattern_{p['id']}_{patterns[0]['topic_id']}")])
+        keyboard.append([InlineKeyboardButton(btn_text, callback_data=f"togglepattern_{p['id']}_{topic_id}_{anchor}")])
+    nav = _page_nav_row("ppage", topic_id, page)
+    if nav:
+        keyboard.append(nav)
     
     # Selection Controls
     if selected_ids:
-        keyboard.append([InlineKeyboardButton("🚀 Generate 20 Questions", callback_data="start_practice_session")])
+        keyboard.append([InlineKeyboardButton(f"🚀 Generate 20 Questions ({len(selected_ids)} selected)", callback_data="start_practice_session")])
         keyboard.append([InlineKeyboardButton("➕ Add More Topics", callback_data="back_to_cats")])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back to Topic", callback_data=f"back_to_topics_{patterns[0]['topic_id'] if patterns else ''}")])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Topic", callback_data=f"back_to_topics_{topic_id}")])
     return InlineKeyboardMarkup(keyboard)
 
 def session_complete_keyboard():
@@ -45,6 +74,9 @@ def session_complete_keyboard():
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def explanation_keyboard(question_id):
+    return InlineKeyboardMarkup([[InlineKeyboardButton("💡 Show explanation", callback_data=f"explain_{question_id}")]])
+
 def question_keyboard(options):
     keyboard = []
     labels = ['A', 'B', 'C', 'D']
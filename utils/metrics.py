@@ -0,0 +1,165 @@
+import os
+import time
+import bisect
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers DB round trips up to slow LLM batches
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+SIZE_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms in Prometheus text format.
+
+    Set METRICS_ENABLED=0 to turn instrumentation into no-ops: `timed`
+    returns the function unchanged and `timer` skips the clock reads.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._caches = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def counter_value(self, name, **labels):
+        return self._counters.get(self._key(name, labels), 0)
+
+    def histogram_count(self, name, **labels):
+        hist = self._histograms.get(self._key(name, labels))
+        return hist.count if hist else 0
+
+    def histogram_counts(self, name):
+        """Observation count per label set of one histogram."""
+        with self._lock:
+            return {key[1]: hist.count for key, hist in self._histograms.items() if key[0] == name}
+
+    def register_cache(self, cache):
+        """Report hits, misses and hit ratio of a named cache on every scrape."""
+        self._caches.append(cache)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator recording the latency of a sync or async function."""
+        def decorator(func):
+            if not self.enabled:
+                return func
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _labels(pairs, extra=None):
+        pairs = list(pairs) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        body = ",".join(f'{k}="{escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            hist_snapshot = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in histograms]
+
+        cache_counters, cache_gauges = [], []
+        for cache in self._caches:
+            label = (("cache", cache.name),)
+            cache_counters.append((("cache_hits_total", label), cache.hits))
+            cache_counters.append((("cache_misses_total", label), cache.misses))
+            cache_gauges.append((("cache_hit_ratio", label), round(cache.hit_ratio, 4)))
+            cache_gauges.append((("cache_entries", label), len(cache)))
+        all_counters = counters + cache_counters
+        for name in sorted({k[0] for k, _ in all_counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{self._labels(k[1])} {v}" for k, v in all_counters if k[0] == name]
+
+        all_gauges = gauges + cache_gauges
+        for name in sorted({k[0] for k, _ in all_gauges}):
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f"{name}{self._labels(k[1])} {v}" for k, v in all_gauges if k[0] == name]
+
+        for name in sorted({k[0] for k, *_ in hist_snapshot}):
+            lines.append(f"# TYPE {name} histogram")
+            for key, counts, total, count, buckets in hist_snapshot:
+                if key[0] != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{self._labels(key[1], ('le', bound))} {cumulative}")
+                lines.append(f"{name}_bucket{self._labels(key[1], ('le', '+Inf'))} {count}")
+                lines.append(f"{name}_sum{self._labels(key[1])} {total}")
+                lines.append(f"{name}_count{self._labels(key[1])} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(enabled=os.getenv("METRICS_ENABLED", "1") == "1")
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import queue
+import random
+import secrets
+import logging
+import threading
+import asyncio
+import functools
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from telegram.request import HTTPXRequest
+
+# Export destinations; tracing is off unless one of them is set
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT") # e.g. http://localhost:4318
+# Tail sampling: traces slower than this or with an error are always kept,
+# the rest with probability TRACE_SAMPLE_RATE
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", 2))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "error")
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.error = False
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class _Exporter:
+    """Writes kept traces from a background thread so handlers never block on I/O."""
+
+    def __init__(self, path=None, otlp_endpoint=None):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint.rstrip("/") + "/v1/traces" if otlp_endpoint else None
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass # Dropping a trace is better than slowing an update down
+
+    def flush(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                if self.path:
+                    self._write_jsonl(trace)
+                if self.otlp_endpoint:
+                    self._post_otlp(trace)
+            except Exception as e:
+                logging.error(f"Trace export failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write_jsonl(self, trace):
+        lines = [json.dumps(span.to_dict(), default=str) for span in trace.spans]
+        with open(self.path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _post_otlp(self, trace):
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": value if isinstance(value, str) else json.dumps(value)}}
+
+        spans = [{
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [attribute(k, v) for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        } for span in trace.spans]
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", "aptitude-practice-bot")]},
+            "scopeSpans": [{"scope": {"name": "utils.tracing"}, "spans": spans}],
+        }]}
+        request = urllib.request.Request(
+            self.otlp_endpoint,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+
+class Tracer:
+    """Per-update traces built from nested spans.
+
+    The current span lives in a context variable, so spans opened in
+    `asyncio.to_thread` workers and tasks nest under the update that started
+    them. Spans are only recorded inside a trace; without an exporter every
+    call returns a no-op span.
+    """
+
+    def __init__(self, exporter=None, slow_seconds=TRACE_SLOW_SECONDS, sample_rate=TRACE_SAMPLE_RATE):
+        self.exporter = exporter
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    @staticmethod
+    def current_span():
+        return _current_span.get()
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Open the root span of a new trace; kept or dropped when it ends."""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        if parent is not None:
+            attributes["parent_trace_id"] = parent.trace.trace_id
+        root = Span(Trace(), name, None, attributes)
+        try:
+            with self._activate(root):
+                yield root
+        finally:
+            if self._keep(root):
+                self.exporter.submit(root.trace)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Open a child of the current span; a no-op outside a trace."""
+        parent = _current_span.get() if self.enabled else None
+        if parent is None:
+            yield NOOP_SPAN
+            return
+        with self._activate(Span(parent.trace, name, parent.span_id, attributes)) as span:
+            yield span
+
+    def traced(self, name):
+        """Decorator running a sync or async function inside a child span."""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def annotate(self, **attributes):
+        """Add attributes to the current span, if any."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def record_error(self, error):
+        """Mark the current trace as failed, e.g. from the PTB error handler."""
+        span = _current_span.get()
+        if span is not None:
+            span.error = span.error or f"{type(error).__name__}: {error}"
+            span.trace.error = True
+
+    @contextmanager
+    def _activate(self, span):
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            span.trace.error = True
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            span.trace.spans.append(span)
+
+    def _keep(self, root):
+        if root.trace.error or root.duration >= self.slow_seconds:
+            return True
+        return random.random() < self.sample_rate
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """Bot API transport that records each outbound call as a span."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        with tracer.span("telegram." + url.rsplit("/", 1)[-1], http_method=method) as span:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+            span.set(status=status)
+            return status, payload
+
+def _default_exporter():
+    if TRACE_FILE or TRACE_OTLP_ENDPOINT:
+        return _Exporter(TRACE_FILE, TRACE_OTLP_ENDPOINT)
+    return None
+
+tracer = Tracer(_default_exporter())
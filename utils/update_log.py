@@ -0,0 +1,79 @@
+import os
+import gzip
+import hmac
+import json
+import time
+import hashlib
+import threading
+from utils.keyboards import main_menu_keyboard
+
+# Reply-keyboard texts are kept verbatim; any other free text is masked
+MENU_TEXTS = {button.text for row in main_menu_keyboard().keyboard for button in row}
+
+def _open(path, mode):
+    # A ".gz" log is a stream of gzip members, which is still appendable
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+class UpdateRecorder:
+    """Append-only log of incoming updates for replay benchmarks.
+
+    One compact JSON line per update:
+        {"t": epoch ms, "u": pseudonymous user, "k": "m" | "c", "d": text or callback data}
+    User ids are replaced by a keyed hash and names are never written. Commands
+    keep only the command word, menu buttons are kept verbatim and other text
+    (e.g. a pattern description typed into /add_topic) becomes "x" * length so
+    prompt sizes survive replay.
+    """
+
+    def __init__(self, path, salt=None):
+        self.path = path
+        self.salt = (salt or os.urandom(16).hex()).encode()
+        self._lock = threading.Lock()
+        self._file = _open(path, "a")
+
+    def pseudonym(self, user_id):
+        digest = hmac.new(self.salt, str(user_id).encode(), hashlib.blake2b).digest()
+        return int.from_bytes(digest[:6], "big")
+
+    @staticmethod
+    def _mask(text):
+        if text.startswith("/"):
+            return text.split()[0]
+        if text in MENU_TEXTS:
+            return text
+        return "x" * len(text)
+
+    def entry(self, update):
+        user = update.effective_user
+        if user is None:
+            return None
+        if update.callback_query:
+            kind, data = "c", update.callback_query.data or ""
+        elif update.message and update.message.text:
+            kind, data = "m", self._mask(update.message.text)
+        else:
+            return None
+        return {"t": int(time.time() * 1000), "u": self.pseudonym(user.id), "k": kind, "d": data}
+
+    def record(self, update):
+        entry = self.entry(update)
+        if entry is None:
+            return
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    async def handle(self, update, context):
+        """TypeHandler callback; registered in a group ahead of the real handlers."""
+        self.record(update)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def read_log(path):
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,109 @@
+import time
+import logging
+from collections import deque
+from telegram.ext import BaseUpdateProcessor
+from utils.metrics import metrics
+from utils.tracing import tracer
+
+# Answer to a button tap dropped because the user's queue is full, so its spinner stops
+DROPPED_TAP_TEXT = "Still working on your earlier taps, please slow down a little."
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently, but one at a time per user.
+
+    Updates from different users run in parallel (up to
+    `max_concurrent_updates`), while each user's updates run in the order they
+    arrived, so callbacks like `ans_` and `togglepattern_` apply in order.
+
+    PTB takes one of the `max_concurrent_updates` slots before calling
+    do_process_update. So that a user tapping through a slow handler can't
+    hold more than one slot, the first update of a user runs that user's
+    queue to the end and later updates only join the queue and return,
+    freeing their slot at once. A user's queue holds at most
+    `max_pending_per_user` updates; taps beyond that are dropped, and
+    answered with DROPPED_TAP_TEXT so the button doesn't spin until
+    Telegram times it out.
+    """
+
+    def __init__(self, max_concurrent_updates=64, max_pending_per_user=20):
+        super().__init__(max_concurrent_updates)
+        self.max_pending_per_user = max_pending_per_user
+        # key -> deque of (update, coroutine, queued_at) still to run
+        self._queues = {}
+
+    @staticmethod
+    def _key(update):
+        user = getattr(update, "effective_user", None)
+        if user:
+            return user.id
+        chat = getattr(update, "effective_chat", None)
+        return ("chat", chat.id) if chat else None
+
+    @staticmethod
+    def _describe(update):
+        """Trace attributes that identify the update without its text."""
+        attributes = {"update_id": getattr(update, "update_id", None)}
+        user = getattr(update, "effective_user", None)
+        if user:
+            attributes["user_id"] = user.id
+        query = getattr(update, "callback_query", None)
+        message = getattr(update, "message", None)
+        if query and query.data:
+            attributes["callback"] = query.data.split("_")[0]
+        elif message and message.text:
+            attributes["kind"] = "command" if message.text.startswith("/") else "message"
+        return attributes
+
+    async def do_process_update(self, update, coroutine):
+        key = self._key(update)
+        queued_at = time.perf_counter()
+        if key is None:
+            await self._run(update, coroutine, queued_at)
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            # The task running this user's queue will get to it
+            if len(queue) >= self.max_pending_per_user:
+                coroutine.close()
+                metrics.inc("updates_dropped_total", reason="user_queue_full")
+                await self._answer_dropped(update)
+                return
+            queue.append((update, coroutine, queued_at))
+            return
+
+        queue = self._queues[key] = deque([(update, coroutine, queued_at)])
+        try:
+            while queue:
+                await self._run(*queue.popleft())
+        finally:
+            del self._queues[key]
+            # Only left over if this task was cancelled (shutdown)
+            for _, pending, _ in queue:
+                pending.close()
+
+    @staticmethod
+    async def _answer_dropped(update):
+        query = getattr(update, "callback_query", None)
+        if query is None:
+            return
+        try:
+            await query.answer(DROPPED_TAP_TEXT)
+        except Exception as e:
+            # Typically the query is already too old to answer
+            logging.debug(f"Couldn't answer dropped callback query: {e}")
+
+    async def _run(self, update, coroutine, queued_at):
+        try:
+            with tracer.trace("update", **self._describe(update)) as span:
+                span.set(queue_wait_ms=round((time.perf_counter() - queued_at) * 1000, 3))
+                await coroutine
+        except Exception:
+            # Handler errors already went to the error handlers; don't let one stop the user's queue
+            logging.exception("Update processing failed")
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass